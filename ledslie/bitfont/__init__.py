@@ -0,0 +1,69 @@
+import glob
+import os
+from importlib import import_module
+
+
+class _FontMapping(object):
+    """
+    I map font names to fonts. Fonts are only loaded when they are first asked for. Next to the built in fonts, I know
+    all BDF and PCF fonts in the BITFONT_DIRECTORIES of the configuration, by their file name without extensions.
+    """
+    builtin = {
+        '8x8': ('ledslie.bitfont.font8x8', 'font8x8'),
+        '6x7': ('ledslie.bitfont.font6x7', 'font6x7'),
+        '7x6': ('ledslie.bitfont.font6x7', 'font6x7'),
+    }
+
+    def __init__(self):
+        self._fonts = {}
+        self._installed = None
+
+    def installed(self) -> dict:
+        """
+        I return a dict with the names and paths of the installed bitmap fonts.
+        """
+        if self._installed is None:
+            from ledslie.config import Config
+            from ledslie.bitfont.compiled import FONT_EXTENSIONS, FontName
+            self._installed = {}
+            for directory in Config()['BITFONT_DIRECTORIES']:
+                for extension in FONT_EXTENSIONS:
+                    for path in sorted(glob.glob(os.path.join(directory, '*' + extension))):
+                        self._installed.setdefault(FontName(path), path)
+        return self._installed
+
+    def forget(self) -> None:
+        """
+        I forget the installed fonts and the fonts that were loaded, so they're found again in changed directories.
+        """
+        self._fonts = {}
+        self._installed = None
+
+    def __getitem__(self, name: str):
+        try:
+            return self._fonts[name]
+        except KeyError:
+            pass
+        if name in self.builtin:
+            module_name, font_name = self.builtin[name]
+            font = getattr(import_module(module_name), font_name)
+        elif name in self.installed():
+            from ledslie.config import Config
+            from ledslie.bitfont.compiled import LoadBitFont
+            font = LoadBitFont(self.installed()[name], Config()['BITFONT_CACHE_DIRECTORY'])
+        else:
+            raise KeyError(name)
+        self._fonts[name] = font
+        return font
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.builtin or name in self.installed()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self) -> list:
+        return list(self.builtin) + [name for name in self.installed() if name not in self.builtin]
+
+
+FontMapping = _FontMapping()
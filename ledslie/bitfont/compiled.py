@@ -0,0 +1,311 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# Bitmap fonts in the BDF and PCF formats are compiled once into a compact binary cache file. The cache is memory-mapped
+# when the font is used, and glyphs are only decoded when they are asked for.
+#
+# Layout of the cache file, all in the byte order of the machine that compiled it:
+#   header    : see HEADER_FORMAT, padded to a multiple of 4 bytes.
+#   codepoints: count unsigned 32 bit ints, sorted.
+#   extents   : count times 3 bytes; the first ink column, the ink width and the advance of the glyph.
+#   glyphs    : count times height rows of row_bytes each. The rows are little endian, bit x is column x.
+
+import gzip
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from bisect import bisect_left
+
+from .generic import GenericFont
+
+CACHE_MAGIC = b'LSBF'
+CACHE_VERSION = 1
+HEADER_FORMAT = '=4sBBHHBBIdQ'  # magic, version, little endian, width, height, spacing, row bytes, count, mtime, size
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+INDEX_START = HEADER_SIZE + (-HEADER_SIZE % 4)
+FONT_EXTENSIONS = ('.bdf', '.pcf', '.bdf.gz', '.pcf.gz')
+
+
+class FontCacheError(ValueError):
+    pass
+
+
+def _open_font_file(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def ReadBDF(path: str) -> dict:
+    """
+    I read the glyphs of a BDF font.
+    :return: Dict with the codepoint as key and a tuple with the advance, bounding box relative to the base line and the
+    image of the glyph as value.
+    :rtype: dict
+    """
+    from PIL.BdfFontFile import bdf_char
+    glyphs = {}
+    with _open_font_file(path) as f:
+        while True:
+            char = bdf_char(f)
+            if char is None:
+                break
+            name, codepoint, ((advance, dwy), dst, src), im = char
+            if codepoint >= 0:  # Glyphs without an encoding can't be used.
+                glyphs[codepoint] = (advance, dst, im)
+    return glyphs
+
+
+def ReadPCF(path: str) -> dict:
+    """
+    I read the glyphs of a PCF font. Only the glyphs of the ISO-8859-1 character set are read.
+    :return: Same as ReadBDF.
+    :rtype: dict
+    """
+    from PIL.PcfFontFile import PcfFontFile
+    with _open_font_file(path) as f:
+        font_file = PcfFontFile(f)
+    glyphs = {}
+    for codepoint, glyph in enumerate(font_file.glyph):
+        if glyph is not None:
+            (advance, dwy), dst, src, im = glyph
+            glyphs[codepoint] = (advance, dst, im)
+    return glyphs
+
+
+def GlyphsToFont(glyphs: dict) -> GenericFont:
+    """
+    I turn glyphs read from a font file into a GenericFont. All glyphs are placed on a common base line.
+    """
+    if not glyphs:
+        raise FontCacheError("Font has no glyphs.")
+    ascent = max([-dst[1] for advance, dst, im in glyphs.values()])
+    descent = max([dst[3] for advance, dst, im in glyphs.values()])
+    width = max([max(advance, dst[2]) for advance, dst, im in glyphs.values()])
+    height = ascent + descent
+    characters = {}
+    for codepoint, (advance, dst, im) in glyphs.items():
+        rows = [0] * height
+        pixels = im.load()
+        for y in range(im.size[1]):
+            row_nr = ascent + dst[1] + y
+            if not 0 <= row_nr < height:
+                continue
+            for x in range(im.size[0]):
+                column = dst[0] + x
+                if 0 <= column < width and pixels[x, y]:
+                    rows[row_nr] |= 1 << column
+        characters[codepoint] = rows
+    return GenericFont(width, height, characters)
+
+
+def WriteFontCache(font: GenericFont, cache_path: str, source_mtime: float=0.0, source_size: int=0) -> None:
+    """
+    I write font to cache_path in the binary cache format.
+    :param font: The font to write.
+    :type font: GenericFont
+    :param cache_path: Where to write the cache.
+    :type cache_path: str
+    :param source_mtime: Modification time of the font file the cache was made from.
+    :param source_size: Size of the font file the cache was made from.
+    """
+    codepoints = sorted(font.keys())
+    row_bytes = int((font.width + 7) / 8)
+    data = bytearray(struct.pack(HEADER_FORMAT, CACHE_MAGIC, CACHE_VERSION, sys.byteorder == 'little',
+                                 font.width, font.height, font.spacing, row_bytes, len(codepoints),
+                                 source_mtime, source_size))
+    data.extend(bytes(INDEX_START - HEADER_SIZE))
+    data.extend(struct.pack('=%dI' % len(codepoints), *codepoints))
+    for codepoint in codepoints:
+        data.extend(font.extent(chr(codepoint)))
+    for codepoint in codepoints:
+        rows = list(font[codepoint]) + [0] * (font.height - len(font[codepoint]))
+        for row in rows:
+            data.extend(row.to_bytes(row_bytes, 'little'))
+    tmp_path = "%s.%d.tmp" % (cache_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, cache_path)  # Readers never see a half written cache.
+
+
+class _MappedExtents(object):
+    """
+    I look up the extents of glyphs in the extents table of a MappedFont.
+    """
+    def __init__(self, font):
+        self._font = font
+
+    def get(self, codepoint: int, default=None):
+        nr = self._font._glyph_nr(codepoint)
+        if nr is None:
+            return default
+        start = self._font._extents_start + nr * 3
+        return tuple(self._font._data[start:start+3])
+
+
+class MappedFont(GenericFont):
+    def __init__(self, cache_path: str):
+        """
+        I'm a font read from a memory-mapped cache file. Glyphs are decoded when they are first used.
+
+        :param cache_path: The path to the cache file.
+        :type cache_path: str
+        """
+        dict.__init__(self)  # Holds the glyphs decoded so far.
+        with open(cache_path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._data = memoryview(self._mmap)
+        header = ReadCacheHeader(self._data)
+        if header is None:
+            raise FontCacheError("'%s' is not a font cache of this version and machine." % cache_path)
+        magic, version, little_endian, width, height, spacing, row_bytes, count, mtime, size = header
+        self.width = width
+        self.height = height
+        self.spacing = spacing
+        self._row_bytes = row_bytes
+        self._count = count
+        self._codepoints = self._data[INDEX_START:INDEX_START + 4 * count].cast('I')
+        self._extents_start = INDEX_START + 4 * count
+        self._glyphs_start = self._extents_start + 3 * count
+        self._columns = {}
+        self._extents = _MappedExtents(self)
+        self._fallback_extent = self._extents.get(ord("?"), self._glyph_extent([]))
+
+    def _glyph_nr(self, codepoint: int):
+        nr = bisect_left(self._codepoints, codepoint)
+        if nr < self._count and self._codepoints[nr] == codepoint:
+            return nr
+        return None
+
+    def __missing__(self, codepoint: int) -> list:
+        nr = self._glyph_nr(codepoint)
+        if nr is None:
+            raise KeyError(codepoint)
+        row_bytes = self._row_bytes
+        start = self._glyphs_start + nr * self.height * row_bytes
+        rows = []
+        for row_nr in range(self.height):
+            row_start = start + row_nr * row_bytes
+            rows.append(int.from_bytes(self._data[row_start:row_start+row_bytes], 'little'))
+        self[codepoint] = rows
+        return rows
+
+    def __contains__(self, codepoint) -> bool:
+        return self._glyph_nr(codepoint) is not None
+
+    def keys(self):
+        return list(self._codepoints)
+
+    def __len__(self):
+        return self._count
+
+
+def ReadCacheHeader(data):
+    """
+    I return the header fields of a font cache. None when data isn't a font cache that this machine can use.
+    """
+    if len(data) < INDEX_START:
+        return None
+    header = struct.unpack_from(HEADER_FORMAT, data)
+    magic, version, little_endian = header[:3]
+    if magic != CACHE_MAGIC or version != CACHE_VERSION or bool(little_endian) != (sys.byteorder == 'little'):
+        return None
+    return header
+
+
+def FontName(path: str) -> str:
+    """
+    I return the name a font file is known by, that is the file name without extensions.
+    """
+    name = os.path.basename(path)
+    for extension in FONT_EXTENSIONS:
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return name
+
+
+def CompileFont(source_path: str, cache_path: str) -> None:
+    """
+    I compile the BDF or PCF font at source_path into a cache file.
+    """
+    if '.pcf' in os.path.basename(source_path):
+        glyphs = ReadPCF(source_path)
+    else:
+        glyphs = ReadBDF(source_path)
+    stat = os.stat(source_path)
+    WriteFontCache(GlyphsToFont(glyphs), cache_path, stat.st_mtime, stat.st_size)
+
+
+def _cache_is_current(cache_path: str, source_path: str) -> bool:
+    try:
+        with open(cache_path, 'rb') as f:
+            header = ReadCacheHeader(f.read(INDEX_START))
+    except OSError:
+        return False
+    if header is None:
+        return False
+    stat = os.stat(source_path)
+    return header[-2:] == (stat.st_mtime, stat.st_size)
+
+
+def CachePath(source_path: str, cache_directory: str) -> str:
+    """
+    I return the path of the cache of the font at source_path. The name has a hash of the full path, the size and the
+    modification time of the font file, so fonts with the same name never share a cache.
+    """
+    source_path = os.path.abspath(source_path)
+    stat = os.stat(source_path)
+    key = ("%s:%d:%r" % (source_path, stat.st_size, stat.st_mtime)).encode('utf-8', 'surrogateescape')
+    return os.path.join(cache_directory, "%s-%s.lsbf" % (FontName(source_path), hashlib.sha1(key).hexdigest()[:16]))
+
+
+def CacheDirectory(cache_directory: str=None) -> str:
+    """
+    I return the directory for the font caches, made when it isn't there yet. It's only for the current user, as the
+    caches are memory-mapped as they are. Defaults to a directory in the cache directory of the user.
+    :raises FontCacheError: When the directory can be changed by other users.
+    """
+    if cache_directory is None:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        cache_directory = os.path.join(cache_home, 'ledslie', 'bitfonts')
+    os.makedirs(cache_directory, mode=0o700, exist_ok=True)
+    stat = os.stat(cache_directory)
+    if stat.st_uid != os.getuid() or stat.st_mode & 0o022:
+        raise FontCacheError("'%s' can be changed by other users." % cache_directory)
+    return cache_directory
+
+
+def LoadBitFont(source_path: str, cache_directory: str=None) -> MappedFont:
+    """
+    I load the bitmap font at source_path. The font is compiled into the cache the first time and whenever the font
+    file has changed since.
+
+    :param source_path: Path to the BDF or PCF font.
+    :type source_path: str
+    :param cache_directory: Directory with the compiled fonts, see CacheDirectory.
+    :type cache_directory: str
+    :return: The font
+    :rtype: MappedFont
+    :raises FontCacheError: When the cache directory can be changed by other users.
+    """
+    cache_path = CachePath(source_path, CacheDirectory(cache_directory))
+    if not _cache_is_current(cache_path, source_path):
+        CompileFont(source_path, cache_path)
+    return MappedFont(cache_path)
@@ -16,7 +16,7 @@
 #
 
 class GenericFont(dict):
-    def __init__(self, width, height, characters):
+    def __init__(self, width, height, characters, spacing=1):
         """
         I'm a generic representation of a Bit Font for led display.
 
@@ -27,7 +27,151 @@ class GenericFont(dict):
         :param characters: Dict with the font characters. THe key is the Unicode number and value a list with one entry
         per row.
         :type characters: dict
+        :param spacing: Number of empty columns between two characters of proportional text.
+        :type spacing: int
         """
         super().__init__(characters)
         self.width = width
         self.height = height
+        self.spacing = spacing
+        self._columns = {}  # Cache with the rendered columns of glyphs.
+        self._extents = {}  # For each codepoint, the first column with ink, the width of the ink and the advance.
+        for codepoint, glyph in self.items():
+            self._extents[codepoint] = self._glyph_extent(glyph)
+        self._fallback_extent = self._extents.get(ord("?"), self._glyph_extent([]))
+
+    def _glyph_extent(self, glyph: list) -> tuple:
+        ink = 0
+        for glyph_line in glyph:
+            ink |= glyph_line
+        ink &= (1 << self.width) - 1
+        if not ink:  # Blank glyphs, like space, take half the width of the font.
+            return 0, 0, max(1, int(self.width / 2))
+        left = (ink & -ink).bit_length() - 1  # The lowest bit set is the leftmost column.
+        ink_width = ink.bit_length() - left
+        return left, ink_width, ink_width + self.spacing
+
+    def extent(self, char: str, proportional: bool=True) -> tuple:
+        """
+        I return where the glyph of char is placed in a line of text.
+
+        :param char: The character
+        :type char: str
+        :param proportional: When False, every character has the full font width.
+        :type proportional: bool
+        :return: Tuple of the first glyph column to show, the number of columns to show and the advance, the number of
+        columns the next character is placed further.
+        :rtype: tuple
+        """
+        if not proportional:
+            return 0, self.width, self.width
+        return self._extents.get(ord(char), self._fallback_extent)
+
+    def text_width(self, text: str, proportional: bool=True) -> int:
+        """
+        I return the number of columns the text takes up, without rendering it.
+        """
+        if not proportional:
+            return len(text) * self.width
+        extents, fallback = self._extents, self._fallback_extent
+        return sum([extents.get(ord(c), fallback)[2] for c in text])
+
+    def fit(self, text: str, max_width: int, proportional: bool=True) -> int:
+        """
+        I return the number of characters from the start of text that fit in max_width columns.
+        """
+        if not proportional:
+            return min(len(text), int((max_width + self.spacing) / self.width))
+        extents, fallback, spacing = self._extents, self._fallback_extent, self.spacing
+        pos = 0
+        for nr, c in enumerate(text):
+            advance = extents.get(ord(c), fallback)[2]
+            if pos + advance - spacing > max_width:  # The spacing after the last character may fall off.
+                return nr
+            pos += advance
+        return len(text)
+
+    def wrap(self, text: str, max_width: int, proportional: bool=True):
+        """
+        I break text into lines that fit in max_width columns. Lines are broken at spaces and words too long for a line
+        are broken where the line is full. Newlines in text always start a new line. Every character is measured just
+        once, so wrapping takes time linear to the length of the text.
+
+        :param text: The text to wrap.
+        :type text: str
+        :param max_width: The number of columns a line can take.
+        :type max_width: int
+        :param proportional: Measure the text as proportional text.
+        :type proportional: bool
+        :return: Generator of the lines.
+        :rtype: Iterable
+        """
+        spacing = self.spacing
+        for paragraph in text.split("\n"):
+            line_start = 0  # Index in the paragraph where the current line begins.
+            line_width = 0
+            last_space = -1  # Index of the last space on the current line.
+            width_after_space = 0  # Width of the characters on the line after the last space.
+            for i, c in enumerate(paragraph):
+                advance = self.extent(c, proportional)[2]
+                if c == " ":
+                    last_space = i
+                    width_after_space = 0
+                    line_width += advance
+                    continue
+                while line_width + advance - spacing > max_width and i > line_start:
+                    if last_space >= line_start:  # Break at the space.
+                        yield paragraph[line_start:last_space].rstrip()
+                        line_start = last_space + 1
+                        line_width = width_after_space
+                    else:  # The word is too long for a line, break it here.
+                        yield paragraph[line_start:i]
+                        line_start = i
+                        line_width = 0
+                    last_space = -1
+                    width_after_space = line_width
+                line_width += advance
+                width_after_space += advance
+            yield paragraph[line_start:].rstrip()
+
+    def glyph(self, char: str) -> list:
+        """
+        I return the rows of the glyph for char. Characters missing in the font are shown as a question mark, or left
+        empty when the font has no question mark either.
+        """
+        for codepoint in (ord(char), ord("?")):
+            try:
+                return self[codepoint]
+            except KeyError:
+                pass
+        return [0] * self.height
+
+    def columns(self, char: str, scale: int=1, proportional: bool=False) -> list:
+        """
+        I return the glyph for char as a list of columns, left to right. Each column is a bytes object of height*scale
+        pixels and every glyph column is repeated scale times. The columns are rendered once and then cached.
+
+        :param char: The character to render.
+        :type char: str
+        :param scale: The number of LEDs for each pixel of the glyph.
+        :type scale: int
+        :param proportional: Only give the columns of the advance of the character.
+        :type proportional: bool
+        :return: List with the columns.
+        :rtype: list
+        """
+        key = (char, scale, proportional)
+        try:
+            return self._columns[key]
+        except KeyError:
+            pass
+        glyph = self.glyph(char)
+        left, ink_width, advance = self.extent(char, proportional)
+        columns = []
+        for x in range(left, left + advance):
+            column = bytearray()
+            for glyph_line in glyph:
+                column.extend([0xff if glyph_line & (1 << x) else 0x00] * scale)
+            columns.extend([bytes(column)] * scale)
+        self._columns[key] = columns
+        return columns
@@ -0,0 +1,48 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I mark up lines of text in a bitmap font as rows of LEDs. The content producers that draw their own frames use me
+# without loading the typesetter and its TrueType fonts.
+
+from ledslie.config import Settings
+from ledslie.bitfont.generic import GenericFont
+
+
+def LineHeight(font: GenericFont) -> int:
+    return max(8, font.height)  # Lines are at least 8 LEDs high, so three lines fill the display.
+
+
+def MarkupLine(image: bytearray, line: str, font: GenericFont, proportional: bool=False):
+    display_width = Settings().DISPLAY_WIDTH
+    line_image = bytearray(display_width * LineHeight(font))  # Bytes of the line.
+    xpos = 0  # Horizontal Position in the line.
+    for c in line[:font.fit(line, display_width, proportional)]:  # Look at each character that fits on the line
+        glyph = font.glyph(c)
+        left, ink_width, advance = font.extent(c, proportional)
+        for n, glyph_line in enumerate(glyph):  # Look at each row of the glyph (is just a byte)
+            row_start = xpos + n * display_width - left
+            for x in range(left, left + ink_width):  # Look at the bits
+                if testBit(glyph_line, x) != 0:
+                    line_image[row_start + x] = 0xff
+        xpos += advance
+    image.extend(line_image)
+
+
+def testBit(int_type, offset):
+    mask = 1 << offset
+    return (int_type & mask)
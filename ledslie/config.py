@@ -1,12 +1,217 @@
-from flask import Config as FlaskConfig
+"""
+I hold the configuration of a process. Config() is the configuration as it's loaded from ledslie.defaults and the file
+in LEDSLIE_CONFIG. Settings() is a frozen snapshot of it with the settings as attributes, for the code that runs for
+every frame or line. A snapshot is taken again when the configuration changed.
+
+The configuration is loaded without Flask, so the services don't have to import it. It reads the same files.
+"""
+
+import errno
+import os
+import types
+from importlib import import_module
+
+import ledslie.defaults as defaults
 
 _Config_instance = None
+_Settings_instance = None
+_Subscribers = []
+
+
+class ConfigError(ValueError):
+    pass
+
+
+class LedslieConfig(dict):
+    """
+    I am the configuration. I count the changes, so Settings() knows when its snapshot is out of date. Like the
+    configuration of Flask, I take the uppercase names of objects and Python files.
+    """
+    generation = 0
+
+    def __init__(self, root_path: str='.', defaults: dict=None):
+        super().__init__(defaults or {})
+        self.root_path = root_path
+
+    def from_object(self, obj) -> None:
+        """
+        I take the uppercase attributes of obj, or of the module named obj.
+        """
+        if isinstance(obj, str):
+            obj = import_module(obj)
+        for key in dir(obj):
+            if key.isupper():
+                self[key] = getattr(obj, key)
+
+    def from_pyfile(self, filename: str, silent: bool=False) -> bool:
+        """
+        I take the uppercase names of the Python file filename, relative to root_path.
+        :return: True when the file was read.
+        """
+        filename = os.path.join(self.root_path, filename)
+        module = types.ModuleType('config')
+        module.__file__ = filename
+        try:
+            with open(filename, mode='rb') as config_file:
+                exec(compile(config_file.read(), filename, 'exec'), module.__dict__)
+        except OSError as exc:
+            if silent and exc.errno in (errno.ENOENT, errno.EISDIR, errno.ENOTDIR):
+                return False
+            exc.strerror = "Unable to load configuration file (%s)" % exc.strerror
+            raise
+        self.from_object(module)
+        return True
+
+    def from_envvar(self, variable_name: str, silent: bool=False) -> bool:
+        """
+        I read the Python file named in the environment variable variable_name.
+        :return: True when the file was read.
+        """
+        filename = os.environ.get(variable_name)
+        if not filename:
+            if silent:
+                return False
+            raise RuntimeError("The environment variable %r is not set to a configuration file." % variable_name)
+        return self.from_pyfile(filename, silent=silent)
+
+    def from_mapping(self, mapping: dict=None, **kwargs) -> bool:
+        """
+        I take the uppercase keys of mapping.
+        """
+        for key, value in dict(mapping or {}, **kwargs).items():
+            if key.isupper():
+                self[key] = value
+        return True
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.generation += 1
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.generation += 1
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.generation += 1
+
+
+def _LoadConfig(envvar_silent: bool, overrides: dict=None) -> LedslieConfig:
+    config = LedslieConfig('.')
+    config.from_object('ledslie.defaults')
+    config.from_envvar('LEDSLIE_CONFIG', silent=envvar_silent)
+    if overrides:
+        config.from_mapping(overrides)
+    DeriveConfig(config)
+    problems = CheckConfig(config)
+    if problems:
+        raise ConfigError("Configuration is wrong: %s" % "; ".join(problems))
+    return config
 
-def Config(envvar_silent=True) -> FlaskConfig:
+
+def DeriveConfig(config: dict) -> None:
+    """
+    I set the settings that follow from others, like DISPLAY_SIZE from the width and height of the display.
+    """
+    config['DISPLAY_SIZE'] = config['DISPLAY_WIDTH'] * config['DISPLAY_HEIGHT']
+    if config['MQTT_BROKER_CONN_STRING'] == defaults.MQTT_BROKER_CONN_STRING:  # Not set by itself.
+        config['MQTT_BROKER_CONN_STRING'] = 'tcp:%s:%s' % (config['MQTT_BROKER_URL'], config['MQTT_BROKER_PORT'])
+
+
+def CheckConfig(config: dict) -> list:
+    """
+    I return what's wrong with config: settings of another type than their default, and values that can't work.
+    """
+    problems = []
+    for key in dir(defaults):
+        if not key.isupper() or key not in config:
+            continue
+        default, value = getattr(defaults, key), config[key]
+        if default is None:
+            continue
+        if isinstance(default, bool):
+            expected = (bool,)
+        elif isinstance(default, (int, float)):
+            expected = (int, float)
+        elif isinstance(default, (list, tuple)):
+            expected = (list, tuple)
+        else:
+            expected = (type(default),)
+        if not isinstance(value, expected) or isinstance(value, bool) and not isinstance(default, bool):
+            problems.append("%s is a %s, not a %s" % (key, type(value).__name__, type(default).__name__))
+    if problems:
+        return problems
+    for key in ('DISPLAY_WIDTH', 'DISPLAY_HEIGHT'):
+        if not isinstance(config[key], int) or config[key] <= 0:
+            problems.append("%s must be a whole number above 0" % key)
+    if not 1 <= config['PUBLISH_WINDOW'] <= 16:
+        problems.append("PUBLISH_WINDOW must be between 1 and 16")
+    if not 0 <= config['TRACE_SAMPLE_RATE'] <= 1:
+        problems.append("TRACE_SAMPLE_RATE must be between 0 and 1")
+    return problems
+
+
+def Config(envvar_silent=True) -> LedslieConfig:
     global  _Config_instance
     if _Config_instance is None:
-        _Config_instance = FlaskConfig('.')
-        _Config_instance.from_object('ledslie.defaults')
-        _Config_instance.from_envvar('LEDSLIE_CONFIG', silent=envvar_silent)
+        _Config_instance = _LoadConfig(envvar_silent)
     return _Config_instance
 
+
+class ConfigSnapshot(object):
+    """
+    I am the configuration at one moment, with the settings as attributes that can't be changed. The settings that are
+    derived from others are derived again, so they're right even when the others were changed later.
+    """
+    def __init__(self, config: LedslieConfig):
+        values = dict(config)
+        DeriveConfig(values)
+        self.__dict__.update(values)
+        self.__dict__['generation'] = config.generation
+        self.__dict__['DISPLAY_LAST_ROW_START'] = values['DISPLAY_WIDTH'] * (values['DISPLAY_HEIGHT'] - 1)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("The settings can't be changed, change Config() instead.")
+
+    def __getitem__(self, key):
+        return self.__dict__[key]
+
+
+def Settings() -> ConfigSnapshot:
+    """
+    I return a snapshot of Config(), taken again when Config() was changed since the last one.
+    """
+    global _Settings_instance
+    config = Config()
+    if _Settings_instance is None or _Settings_instance.generation != config.generation:
+        _Settings_instance = ConfigSnapshot(config)
+    return _Settings_instance
+
+
+def SubscribeConfig(callback) -> None:
+    """
+    I call callback(changed_keys) after ReloadConfig() changed settings.
+    """
+    _Subscribers.append(callback)
+
+
+def UnsubscribeConfig(callback) -> None:
+    if callback in _Subscribers:
+        _Subscribers.remove(callback)
+
+
+def ReloadConfig(overrides: dict=None) -> set:
+    """
+    I load the configuration again from ledslie.defaults and LEDSLIE_CONFIG, with overrides on top, and tell the
+    subscribers which settings changed. When the new configuration is wrong nothing changes.
+    :raises ConfigError: When the new configuration is wrong.
+    :return: The keys of the settings that changed.
+    """
+    config = Config()
+    fresh = _LoadConfig(True, overrides)
+    changed = set([key for key in fresh if key not in config or config[key] != fresh[key]])
+    if changed:
+        config.update([(key, fresh[key]) for key in changed])
+        for callback in list(_Subscribers):
+            callback(changed)
+    return changed
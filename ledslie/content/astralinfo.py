@@ -17,13 +17,10 @@
 import os
 from datetime import datetime
 
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from twisted.internet.defer import DeferredList
 from twisted.logger import Logger
 
-import pytz
-from astral import Astral
-
 from ledslie.config import Config
 from ledslie.content.generic import GenericContent, CreateContent
 from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_1LINE
@@ -31,17 +28,17 @@ from ledslie.messages import TextSingleLineLayout
 
 
 class AstralContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
+        from astral import Astral
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.astral = Astral()
         self.astral.solar_depression = 'civil'
         self.city = self.astral['Amsterdam']
         self.publish_task = None
 
     def onBrokerConnected(self):
-        self.publish_task = task.LoopingCall(self.publish_astral)
-        self.publish_task.start(60, now=True)
+        self.publish_task = self.repeating.repeat(self.publish_astral, 60)
 
     def publish_astral(self, now=None):
         """I am called every minute."""
@@ -81,6 +78,7 @@ class AstralContent(GenericContent):
         return self.publish(topic=LEDSLIE_TOPIC_TYPESETTER_1LINE, message=msg)
 
     def _now(self, dt=None):
+        import pytz
         dt = datetime.now() if dt is None else dt
         dt = pytz.timezone('Europe/Amsterdam').localize(dt)
         return dt
@@ -21,9 +21,7 @@ from datetime import datetime
 from twisted.internet.defer import Deferred
 from twisted.logger import Logger
 
-from twisted.internet import reactor, task
-from twisted.web.client import readBody
-import treq
+from twisted.internet import reactor
 
 from ledslie.config import Config
 from ledslie.content.generic import GenericContent, CreateContent
@@ -32,21 +30,20 @@ from ledslie.messages import TextTripleLinesLayout
 
 
 class CoinsContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.task = None
 
     def onBrokerConnected(self):
-        self.task = task.LoopingCall(self.createCoinsInfo)
-        self.task.start(self.config['COINS_UPDATE_FREQ'], now=True)
+        self.task = self.repeating.repeat(self.createCoinsInfo, lambda: self.config['COINS_UPDATE_FREQ'])
 
     def _logFailure(self, failure):
         self.log.debug("reported failure: {message}", message=failure.getErrorMessage())
         return failure
 
     def createCoinsInfo(self):
-        d = treq.get(self.config["COINS_PRICE_SOURCE"])
+        d = self.http_get(self.config["COINS_PRICE_SOURCE"])
         d.addCallbacks(self.grab_http_response, self._logFailure)
         d.addCallbacks(self.parse_page, self._logFailure)
         d.addCallbacks(self.create_coins_info, self._logFailure)
@@ -60,6 +57,7 @@ class CoinsContent(GenericContent):
         return lines
 
     def grab_http_response(self, response):
+        from twisted.web.client import readBody
         if response.code != 200:
             raise RuntimeError("Status is not 200 but '%s'" % response.code)
         return readBody(response)
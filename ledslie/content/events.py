@@ -16,16 +16,12 @@
 
 import os
 
-import bs4
-from dateutil.parser import parser as date_parser
 from datetime import date, datetime
 
 from twisted.internet.defer import Deferred
 from twisted.logger import Logger
 
-from twisted.internet import reactor, task
-from twisted.web.client import readBody
-import treq
+from twisted.internet import reactor
 
 from ledslie.config import Config
 from ledslie.content.generic import GenericContent, CreateContent
@@ -47,14 +43,13 @@ def create_date_string(event_date, now=None):
 
 
 class EventsContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.task = None
 
     def onBrokerConnected(self):
-        self.task = task.LoopingCall(self.createEventsInfo)
-        self.task.start(self.config['EVENTS_UPDATE_FREQ'], now=True)
+        self.task = self.repeating.repeat(self.createEventsInfo, lambda: self.config['EVENTS_UPDATE_FREQ'])
 
     def _logFailure(self, failure):
         self.log.debug("reported failure: {message}", message=failure.getErrorMessage())
@@ -62,7 +57,7 @@ class EventsContent(GenericContent):
 
     def createEventsInfo(self):
         self.log.debug("Getting the eventsInfo")
-        d = treq.get(self.config["EVENTS_DATA_SOURCE"])
+        d = self.http_get(self.config["EVENTS_DATA_SOURCE"])
         d.addCallbacks(self.grab_http_response, self._logFailure)
         d.addCallbacks(self.parse_page, self._logFailure)
         d.addCallbacks(self.create_event_info, self._logFailure)
@@ -76,11 +71,14 @@ class EventsContent(GenericContent):
         return lines
 
     def grab_http_response(self, response):
+        from twisted.web.client import readBody
         if response.code != 200:
             raise RuntimeError("Status is not 200 but '%s'" % response.code)
         return readBody(response)
 
     def parse_page(self, content):
+        import bs4
+        from dateutil.parser import parser as date_parser
         html = bs4.BeautifulSoup(content, "html.parser")
         events = []
         table = html.find('table', {"class": "wikitable"})
@@ -99,6 +97,7 @@ class EventsContent(GenericContent):
         msg.line_duration = self.config["EVENTS_LINE_DURATION"]
         msg.program = 'events'
         msg.size = '6x7'
+        msg.wrap = True
         d = self.publish(topic=LEDSLIE_TOPIC_TYPESETTER_3LINES, message=msg, qos=1)
         d.addCallbacks(_logAll, self._logFailure)
         return d
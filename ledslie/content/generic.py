@@ -14,28 +14,38 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import copy
 import sys
 
 import os
 from mqtt.client.factory import MQTTFactory
 from twisted.application.internet import ClientService
-from twisted.internet.defer import inlineCallbacks
+from twisted.internet.defer import inlineCallbacks, gatherResults, Deferred
 from twisted.internet.endpoints import clientFromString
-from twisted.internet import reactor
+from twisted.internet import reactor, task
 
 from twisted.logger import Logger, LogLevel, globalLogBeginner, textFileLogObserver, \
     FilteringLogObserver, LogLevelFilterPredicate
+from twisted.python.failure import Failure
 
 # ----------------
 # Global variables
 # ----------------
-from ledslie.config import Config
-from ledslie.definitions import LEDSLIE_TOPIC_STATS_BASE, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS
+from ledslie.config import Config, ConfigError, SubscribeConfig
+from ledslie.definitions import LEDSLIE_TOPIC_STATS_BASE, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_CONFIG, \
+    LEDSLIE_ERROR
+from ledslie.messages import FrameSequence, SequencePayloads
+from ledslie.metrics import Registry
+from ledslie.publishing import PublishQueue
+from ledslie.reloading import ReloadFromMessage, ReloadOnSignal, RepeatingCalls
+from ledslie.tracing import StartTrace, STAGE_CONTENT
 
 logLevelFilterPredicate = LogLevelFilterPredicate(defaultLogLevel=LogLevel.info)
 
 log = Logger(__file__.split(os.sep)[-1])
 
+_http_pool = None
+
 # -----------------
 # Utility Functions
 # -----------------
@@ -67,6 +77,19 @@ def setLogLevel(namespace=None, levelStr='info'):
     logLevelFilterPredicate.setLogLevelForNamespace(namespace=namespace, level=level)
 
 
+def HttpPool():
+    '''
+    I return the pool of HTTP connections that all content producers in the process share. CONTENT_HTTP_MAX_PER_HOST
+    connections to each host are kept open between requests.
+    '''
+    global _http_pool
+    if _http_pool is None:
+        from twisted.web.client import HTTPConnectionPool
+        _http_pool = HTTPConnectionPool(reactor, persistent=True)
+        _http_pool.maxPersistentPerHost = Config()['CONTENT_HTTP_MAX_PER_HOST']
+    return _http_pool
+
+
 def CreateContent(contentCls):
     config = Config()
     startLogging()
@@ -76,10 +99,11 @@ def CreateContent(contentCls):
     setLogLevel(namespace='mqtt', levelStr=log_level)
     setLogLevel(namespace=contentCls.__name__, levelStr=log_level)
 
-    factory = MQTTFactory(profile=MQTTFactory.PUBLISHER)
+    factory = MQTTFactory(profile=MQTTFactory.PUBLISHER | MQTTFactory.SUBSCRIBER)  # Subscribed to the config topic.
     myEndpoint = clientFromString(reactor, Config().get('MQTT_BROKER_CONN_STRING'))
     serv = contentCls(myEndpoint, factory)
     serv.startService(contentCls.__name__)
+    ReloadOnSignal(reactor)
     return serv
 
 
@@ -92,6 +116,18 @@ class GenericContent(ClientService):
         self.config = Config()
         self.protocol = None
         self._system_name = None
+        self.metrics = Registry()
+        self._sent = self.metrics.counter('messages_sent')
+        self._sent_bytes = self.metrics.counter('bytes_sent')
+        self._http_requests = self.metrics.counter('http_requests')
+        self._http_failures = self.metrics.counter('http_failures')
+        self._http_time = self.metrics.histogram('http_time')
+        self.stats_task = None
+        self._stats_last = None
+        self._offline = False  # From (re-)connecting until the broker accepted the connection.
+        self.publish_queue = PublishQueue(self._send, self._can_send, self.reactor, self.metrics, self.config)
+        self.repeating = RepeatingCalls(self.reactor)
+        self._config_subscribed = False
 
     def startService(self, name):
         log.info("starting MQTT Content Publisher Service")
@@ -105,37 +141,147 @@ class GenericContent(ClientService):
         '''
         Connect to MQTT broker
         '''
+        self._offline = True
         self.protocol = protocol
+        self.protocol.onPublish = self._onPublish
         self.protocol.onDisconnection = self.onDisconnection
-        self.protocol.setWindowSize(3)
+        self.protocol.setWindowSize(self.config['PUBLISH_WINDOW'])
+        self.start_vital_stats()
+        if not self._config_subscribed:
+            SubscribeConfig(self.config_changed)
+            self._config_subscribed = True
         try:
             yield self.protocol.connect(self._system_name, keepalive=60)
+            yield self.protocol.subscribe(LEDSLIE_TOPIC_CONFIG, 1)
         except Exception as e:
             self.log.error("Connecting to {broker} raised {excp!s}",
                       broker=self.config.get('MQTT_BROKER_CONN_STRING'), excp=e)
         else:
             self.log.info("Connected to {broker}", broker=self.config.get('MQTT_BROKER_CONN_STRING'))
+            self._offline = False
+            self.publish_queue.restart()
             self.reactor.callLater(0, self.onBrokerConnected)
-        self_name = self.__class__.__name__
-        self.publish(topic=LEDSLIE_TOPIC_STATS_BASE+self_name, message="%s now (re-)connected" % self_name)
+        self.metrics.counter('connects').inc()  # Published with the other stats.
 
     def onBrokerConnected(self):
         log.info("onBrokerConnected called")
 
+    def _onPublish(self, topic, payload, qos, dup, retain, msgId):
+        if topic == LEDSLIE_TOPIC_CONFIG:
+            self.reload_config(payload)
+
+    def reload_config(self, payload):
+        """
+        I apply the settings of a message on the config topic, see ledslie.reloading.
+        """
+        try:
+            changed = ReloadFromMessage(payload)
+        except ConfigError as exc:
+            log.error("Configuration not reloaded: {exc}", exc=exc)
+            self.publish(LEDSLIE_ERROR + "/config", ("%s: %s" % (self.__class__.__name__, exc)).encode())
+        else:
+            log.info("Configuration reloaded, changed: {keys}", keys=", ".join(sorted(changed)) or "nothing")
+
+    def config_changed(self, changed: set):
+        """
+        I'm called with the keys of the settings that changed when the configuration was reloaded. Running calls follow
+        their new interval.
+        """
+        if any([key.startswith('PUBLISH_') for key in changed]):
+            self.publish_queue.configure(self.config)
+            if self.protocol is not None:
+                self.protocol.setWindowSize(self.config['PUBLISH_WINDOW'])
+            self.publish_queue.pump()
+        if 'STATS_INTERVAL' in changed:
+            if self.stats_task is not None and self.stats_task.running:
+                self.stats_task.stop()
+            self.start_vital_stats()
+        self.repeating.reschedule()
+        self.onConfigChanged(changed)
+
+    def onConfigChanged(self, changed: set):
+        """
+        I let a content producer forget what it derived from the settings in changed.
+        """
+        pass
+
     def onDisconnection(self, reason):
         '''
         get notfied of disconnections
         and get a deferred for a new protocol object (next retry)
         '''
         log.debug("<Connection was lost !> <reason={r}>", r=reason)
+        self._offline = True
         self.whenConnected().addCallback(self.connectToBroker)
 
     def publish(self, topic, message, qos=0, retain=False):
+        """
+        I queue message for topic, see ledslie.publishing. The Deferred I return fires when the broker has it.
+        Large sequences are sent in chunks. A message without a trace gets a new one, on a copy so the message of the
+        caller stays as it is.
+        """
+        if getattr(message, 'trace', False) is None:
+            message = copy.copy(message)
+            message.trace = StartTrace(STAGE_CONTENT)
+        if isinstance(message, FrameSequence) and not getattr(self.protocol, 'carries_objects', False):
+            payloads = SequencePayloads(topic, message)
+            if len(payloads) > 1:  # Sent in chunks, that are never retained.
+                return gatherResults([self.publish_queue.put(chunk_topic, chunk, qos)
+                                      for chunk_topic, chunk in payloads])
+            topic, message = payloads[0]
+        return self.publish_queue.put(topic, message, qos, retain)
+
+    def _can_send(self):
+        return self.protocol is not None and not self._offline
+
+    def _send(self, topic, message, qos, retain):
+        self._sent.inc()
         if hasattr(message, 'serialize'):
+            if getattr(self.protocol, 'carries_objects', False):  # Handed over as it is, see ledslie.processors.bus.
+                return self.protocol.publish(topic, message, qos, retain)
             message = message.serialize()
         self.log.debug("To '{topic}', Published: '{data}'", topic=topic, data=message)
+        self._sent_bytes.inc(len(message))
         return self.protocol.publish(topic, message, qos, retain)
 
+    def http_get(self, url: str, **kwargs) -> Deferred:
+        """
+        I GET url with treq over the HTTP connections of HttpPool, and count the requests and the seconds they took.
+        """
+        import treq
+        self._http_requests.inc()
+        d = treq.get(url, pool=HttpPool(), **kwargs)
+        d.addBoth(self._http_done, self.reactor.seconds())
+        return d
+
+    def _http_done(self, result, started):
+        self._http_time.observe(self.reactor.seconds() - started)
+        if isinstance(result, Failure):
+            self._http_failures.inc()
+        return result
+
+    def start_vital_stats(self):
+        """
+        I start publishing the metrics every STATS_INTERVAL seconds, when that isn't 0.
+        """
+        interval = self.config['STATS_INTERVAL']
+        if not interval or (self.stats_task is not None and self.stats_task.running):
+            return
+        self.stats_task = task.LoopingCall(self.publish_vital_stats)
+        self.stats_task.clock = self.reactor
+        self.stats_task.start(interval, now=False)
+
+    def publish_vital_stats(self):
+        """
+        I publish the metrics. How much later than planned I'm called is the lag of the reactor.
+        """
+        now = self.reactor.seconds()
+        if self._stats_last is not None:
+            lag = now - self._stats_last - self.stats_task.interval
+            self.metrics.histogram('reactor_lag').observe(max(0, lag))
+        self._stats_last = now
+        self.publish(LEDSLIE_TOPIC_STATS_BASE + self.__class__.__name__, self.metrics.serialize())
+
     def remove_display(self, program_name):
         """
         Remove the program from the display.
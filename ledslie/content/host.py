@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ============
+#
+# I run the content producers of CONTENT_HOST_PLUGINS as plugins in one process, instead of one process each. They
+# share the reactor, one connection to the MQTT broker and the HTTP connections of HttpPool. The plugins publish on a
+# TopicBus, and all they publish goes out to the broker over my connection. Messages on the config topic are handled
+# once by me; the plugins are told what changed like any service in the process.
+#
+# The plugins are kept apart as far as a shared reactor allows:
+#   - A plugin that can't be loaded, or fails when it starts, is reported and left out; the others run.
+#   - The calls the reactor makes for a plugin are run by its Plugin. The calls that fail are counted, and when
+#     CONTENT_HOST_MAX_FAILURES calls fail in a row the plugin is stopped. Calls that keep the reactor busy longer
+#     than CONTENT_HOST_SLOW_CALL seconds are logged, as they hold up all plugins.
+#   - Each plugin publishes its own stats, with the CPU time and the calls the reactor made for it. My stats have the
+#     state and usage of all plugins in "plugins". The work done in the callbacks of HTTP requests isn't counted.
+#
+# This replaces the ledslie-<content> services of the plugins; don't run those next to me.
+
+import importlib
+import time
+from collections import OrderedDict
+
+from twisted.internet import reactor
+from twisted.logger import Logger
+from twisted.python.failure import Failure
+
+from ledslie.config import Config, SubscribeConfig, UnsubscribeConfig
+from ledslie.definitions import LEDSLIE_ERROR
+from ledslie.processors.bus import TopicBus, BusProtocol, BusBridge
+from ledslie.processors.service import CreateService
+
+log = Logger()
+
+RUNNING = 'running'
+FAILED = 'failed'  # Couldn't be loaded or started.
+STOPPED = 'stopped'
+
+
+class PluginClock(object):
+    def __init__(self, reactor, plugin):
+        """
+        I am the reactor of a plugin. The calls it schedules are run by plugin, everything else is left to reactor.
+        """
+        self._reactor = reactor
+        self._plugin = plugin
+        self._calls = []  # The DelayedCalls of the plugin, some of them done.
+
+    def callLater(self, delay, func, *args, **kwargs):
+        call = self._reactor.callLater(delay, self._plugin.run, func, *args, **kwargs)
+        self._calls = [pending for pending in self._calls if pending.active()]
+        self._calls.append(call)
+        return call
+
+    def seconds(self) -> float:
+        return self._reactor.seconds()
+
+    def pending_calls(self) -> list:
+        return [call for call in self._calls if call.active()]
+
+    def cancel_calls(self) -> None:
+        for call in self.pending_calls():
+            call.cancel()
+        self._calls = []
+
+    def __getattr__(self, name):
+        return getattr(self._reactor, name)
+
+
+class PluginProtocol(BusProtocol):
+    def __init__(self, bus: TopicBus, plugin):
+        """
+        I connect a plugin to the bus. The messages for it are run by plugin.
+        """
+        super().__init__(bus)
+        self.plugin = plugin
+
+    def _deliver(self, topic, payload, qos, dup, retain, msgId):
+        self.plugin.run(super()._deliver, topic, payload, qos, dup, retain, msgId)
+
+
+class Plugin(object):
+    def __init__(self, dotted_name: str, host):
+        """
+        I run the content producer named by dotted_name, like 'ledslie.content.rain.RainContent', for host.
+        """
+        self.dotted_name = dotted_name
+        self.name = dotted_name.rsplit('.', 1)[-1]
+        self.host = host
+        self.config = host.config
+        self.state = None
+        self.service = None
+        self.protocol = None
+        self.clock = PluginClock(host.reactor, self)
+        self.failures_in_row = 0
+        self.cpu_seconds = 0
+        self.calls = 0
+        self.failures = 0
+        self.slow_calls = 0
+
+    def start(self, bus: TopicBus) -> bool:
+        """
+        I load the producer and connect it to bus.
+        :return: True when it's running.
+        """
+        try:
+            module_name, class_name = self.dotted_name.rsplit('.', 1)
+            content_cls = getattr(importlib.import_module(module_name), class_name)
+            self.service = content_cls(None, None, reactor=self.clock)
+        except Exception:
+            self.state = FAILED
+            self.host.plugin_failed(self, Failure(), "can't be loaded")
+            return False
+        self.state = RUNNING
+        metrics = self.service.metrics
+        metrics.gauge('host_cpu_seconds', lambda: round(self.cpu_seconds, 6))
+        metrics.gauge('host_calls', lambda: self.calls)
+        metrics.gauge('host_failures', lambda: self.failures)
+        metrics.gauge('host_pending_calls', lambda: len(self.clock.pending_calls()))
+        self.service.repeating.failed = self.failed
+        self.service._system_name = self.name
+        self.service._config_subscribed = True  # Told about changes through me, so its failures are counted.
+        SubscribeConfig(self.config_changed)
+        self.protocol = PluginProtocol(bus, self)
+        d = self.run(self.service.connectToBroker, self.protocol)
+        if d is not None:
+            d.addErrback(self.failed)
+        return self.state == RUNNING
+
+    def run(self, func, *args, **kwargs):
+        """
+        I call func for the plugin, and count the time it took. A failure is kept from the reactor and the other
+        plugins.
+        """
+        if self.state != RUNNING:
+            return None
+        started, started_cpu = time.perf_counter(), time.process_time()
+        failures = self.failures
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.failed(Failure())
+            return None
+        else:
+            if self.failures == failures:  # Nothing failed that was caught within the call, like by a LoopingCall.
+                self.failures_in_row = 0
+            return result
+        finally:
+            self.calls += 1
+            self.cpu_seconds += time.process_time() - started_cpu
+            busy = time.perf_counter() - started
+            if busy > self.config['CONTENT_HOST_SLOW_CALL']:
+                self.slow_calls += 1
+                log.warn("{plugin} kept the reactor busy for {seconds:.3f} seconds", plugin=self.name, seconds=busy)
+
+    def config_changed(self, changed: set) -> None:
+        self.run(self.service.config_changed, changed)
+
+    def failed(self, failure: Failure) -> None:
+        """
+        I count a failed call, and stop the plugin when too many failed in a row.
+        """
+        self.failures += 1
+        self.failures_in_row += 1
+        log.failure("{plugin} failed", failure, plugin=self.name)
+        if self.state == RUNNING and self.failures_in_row >= self.config['CONTENT_HOST_MAX_FAILURES']:
+            self.stop()
+            self.host.plugin_failed(self, failure, "stopped after %d failures in a row" % self.failures_in_row)
+
+    def stop(self) -> None:
+        """
+        I stop the calls of the plugin and disconnect it from the bus.
+        """
+        if self.state == RUNNING:
+            self.state = STOPPED
+        if self.service is None:
+            return
+        self.service.repeating.stop()
+        if self.service.stats_task is not None and self.service.stats_task.running:
+            self.service.stats_task.stop()
+        self.clock.cancel_calls()
+        UnsubscribeConfig(self.config_changed)
+        if self.protocol is not None:
+            self.protocol.bus.unsubscribe(self.protocol)
+
+    def usage(self) -> dict:
+        usage = {'state': self.state, 'cpu_seconds': round(self.cpu_seconds, 6), 'calls': self.calls,
+                 'failures': self.failures, 'slow_calls': self.slow_calls,
+                 'pending_calls': len(self.clock.pending_calls())}
+        if self.service is not None:
+            for name in ('messages_sent', 'bytes_sent', 'http_requests', 'http_failures'):
+                usage[name] = self.service.metrics.counter(name).value
+        return usage
+
+
+class ContentHost(BusBridge):
+    def __init__(self, endpoint, factory, reactor=None):
+        """
+        I connect the plugins to the MQTT broker, see the top of this module.
+        """
+        super().__init__(endpoint, factory, reactor)
+        self.plugins = OrderedDict()  # Name to Plugin.
+        self.metrics.gauge('plugins', self.plugin_usage)
+
+    def load(self, bus: TopicBus, dotted_names) -> None:
+        """
+        I start a plugin for each name in dotted_names, and pass all they publish on to the broker.
+        """
+        self.attach(bus, (), ['#'])
+        for dotted_name in dotted_names:
+            plugin = Plugin(dotted_name, self)
+            if plugin.name in self.plugins:
+                log.error("{plugin} is in the plugins more than once", plugin=dotted_name)
+                continue
+            self.plugins[plugin.name] = plugin
+            log.info("Hosting {plugin}", plugin=dotted_name)
+            plugin.start(bus)
+
+    def plugin_failed(self, plugin: Plugin, failure: Failure, reason: str) -> None:
+        log.error("Plugin {plugin} {reason}: {message}", plugin=plugin.name, reason=reason,
+                  message=failure.getErrorMessage())
+        self.publish(LEDSLIE_ERROR + "/contenthost", ("Plugin: %s: %s, %s" % (
+            plugin.name, reason, failure.getErrorMessage())).encode())
+
+    def plugin_usage(self) -> dict:
+        return OrderedDict([(name, plugin.usage()) for name, plugin in self.plugins.items()])
+
+    def stop_plugins(self) -> None:
+        for plugin in self.plugins.values():
+            plugin.stop()
+
+
+def RunContentHost(bus: TopicBus) -> ContentHost:
+    host = CreateService(ContentHost)
+    host.load(bus, Config()['CONTENT_HOST_PLUGINS'])
+    return host
+
+
+if __name__ == '__main__':
+    Config(envvar_silent=False)
+    RunContentHost(TopicBus(reactor))
+    reactor.run()
@@ -15,7 +15,7 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
 
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from twisted.internet.defer import inlineCallbacks
 from twisted.logger import Logger
 
@@ -26,14 +26,13 @@ from ledslie.messages import TextTripleLinesLayout
 
 
 class InfoContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
         self.task = None
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
 
     def onBrokerConnected(self):
-        self.task = task.LoopingCall(self.publishInfo)
-        self.task.start(self.config['INFO_UPDATE_FREQ'], now=True)
+        self.task = self.repeating.repeat(self.publishInfo, lambda: self.config['INFO_UPDATE_FREQ'])
 
     def publishInfo(self):
         def _logFailure(failure):
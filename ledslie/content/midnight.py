@@ -28,7 +28,6 @@ from ledslie.content.generic import GenericContent, CreateContent
 from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_3LINES
 from ledslie.messages import TextTripleLinesLayout
 
-import pytz
 
 def next_midnight(tz_str=None):
     if tz_str is None:
@@ -42,6 +41,7 @@ def next_midnight(tz_str=None):
 
 
 def all_gmts() -> dict:
+    import pytz
     gmts = {}
     for tzname in pytz.all_timezones:
         tzname_parts = tzname.split('/')
@@ -53,6 +53,7 @@ def all_gmts() -> dict:
 
 
 def all_next_midnights():
+    import pytz
     gmts = all_gmts()
     midnights = []
     for tzname in pytz.all_timezones:
@@ -91,9 +92,9 @@ def create_midnight_groups():
 
 
 class MidnightContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.tz_groups = create_midnight_groups()
         self.is_empty = True
 
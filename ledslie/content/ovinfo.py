@@ -17,14 +17,10 @@ import json
 import os
 
 from datetime import datetime
-from dateutil.parser import parser as date_parser
-from jsonpath_rw.parser import JsonPathParser
 from twisted.internet.defer import Deferred
 from twisted.logger import Logger
 
-from twisted.internet import reactor, task
-from twisted.web.client import readBody
-import treq
+from twisted.internet import reactor
 
 from ledslie.config import Config
 from ledslie.content.generic import GenericContent, CreateContent
@@ -84,21 +80,19 @@ class Transports(object):
 
 
 class OVInfoContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.update_task = None
         self.publish_task = None
         self.urls = CircularBuffer(self.config['OVINFO_STOPAREA_URLS'])
         self.lines = Transports()
 
     def onBrokerConnected(self):
-        self.update_task = task.LoopingCall(self.update_ov_info)
         # update_delay_time = float(60) / len(self.urls)
-        update_delay_time = float(self.config['OVINFO_UPDATE_FREQ']) / len(self.urls)
-        self.update_task.start(update_delay_time, now=True)
-        self.publish_task = task.LoopingCall(self.publish_ov_info)
-        self.publish_task.start(self.config['OVINFO_PUBLISH_FREQ'], now=True)
+        self.update_task = self.repeating.repeat(self.update_ov_info,
+                                                 lambda: float(self.config['OVINFO_UPDATE_FREQ']) / len(self.urls))
+        self.publish_task = self.repeating.repeat(self.publish_ov_info, lambda: self.config['OVINFO_PUBLISH_FREQ'])
         # self.publish_task.start(15, now=True)
 
     def _logFailure(self, failure):
@@ -106,7 +100,7 @@ class OVInfoContent(GenericContent):
         return failure
 
     def update_ov_info(self):
-        d = treq.get(next(self.urls))
+        d = self.http_get(next(self.urls))
         d.addCallbacks(self.grab_http_response, self._logFailure)
         d.addCallbacks(self.parse_json_page, self._logFailure)
         d.addCallbacks(self.update_depature_info, self._logFailure)
@@ -140,6 +134,7 @@ class OVInfoContent(GenericContent):
         return lines
 
     def grab_http_response(self, response):
+        from twisted.web.client import readBody
         if response.code != 200:
             raise RuntimeError("Status is not 200 but '%s'" % response.code)
         return readBody(response)
@@ -149,6 +144,8 @@ class OVInfoContent(GenericContent):
         return prices
 
     def update_depature_info(self, data):
+        from dateutil.parser import parser as date_parser
+        from jsonpath_rw.parser import JsonPathParser
         dparser = date_parser()
         for trans in [x.value for x in JsonPathParser().parse('$..Passes.*').find(data)]:
             expectedTime = dparser.parse(trans['ExpectedArrivalTime'])
@@ -175,6 +172,7 @@ class OVInfoContent(GenericContent):
         msg.valid_time = 60  # Information is only valid for a minute.
         msg.program = 'ovinfo'
         msg.size = '6x7'
+        msg.proportional = True
         msg.lines = info_lines
         d = self.publish(topic=LEDSLIE_TOPIC_TYPESETTER_3LINES, message=msg, qos=1)
         d.addCallbacks(_logAll, self._logFailure)
@@ -13,8 +13,7 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
-import os
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from twisted.internet.protocol import ClientCreator
 from twisted.logger import Logger
 
@@ -26,25 +25,45 @@ from ledslie.messages import TextTripleLinesLayout
 
 
 class MpdPlaying(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.update_task = None
         self.mpd = None
+        self._mpd_connecting = None
         self.program_name = 'playing'
         self.playing_state = False
 
+    def connect_mpd(self):
+        """
+        I connect to the MPD server at MPD_HOST and MPD_PORT, when I'm not connected or connecting yet.
+        """
+        if self.mpd is not None or self._mpd_connecting is not None:
+            return self._mpd_connecting
+        d = self._mpd_connecting = ClientCreator(self.reactor, MPDProtocol).connectTCP(
+            self.config['MPD_HOST'], self.config['MPD_PORT'])
+        d.addCallback(self.onMpdConnected)
+        d.addErrback(connection_error)
+        d.addBoth(self._mpd_connected)
+        return d
+
+    def _mpd_connected(self, result):
+        self._mpd_connecting = None
+        return result
+
     def onMpdConnected(self, mpdProtocol):
         self.log.info("MPD connected.")
         self.mpd = mpdProtocol
 
     def onBrokerConnected(self):
-        self.update_task = task.LoopingCall(self.get_playing_state)
-        self.update_task.start(float(self.config['MPD_PLAYING_UPDATE']), now=True)
+        self.connect_mpd()
+        self.update_task = self.repeating.repeat(self.get_playing_state,
+                                                 lambda: float(self.config['MPD_PLAYING_UPDATE']))
 
     def get_playing_state(self):
         if self.mpd is None:
             self.log.info("MPD not yet ready")
+            self.connect_mpd()
             return
         self.mpd.status().addCallback(self.get_song_info)
 
@@ -86,12 +105,6 @@ def connection_error(failure):
 
 
 if __name__ == '__main__':
-    ns = __file__.split(os.sep)[-1]
-    config = Config(envvar_silent=False)
-
-    mpd = ClientCreator(reactor, MPDProtocol)
-    service = CreateContent(MpdPlaying)
-    d = mpd.connectTCP(config['MPD_HOST'], config['MPD_PORT'])
-    d.addCallback(service.onMpdConnected)
-    d.addErrback(connection_error)
+    Config(envvar_silent=False)
+    CreateContent(MpdPlaying)
     reactor.run()
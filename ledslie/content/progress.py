@@ -18,7 +18,7 @@ from calendar import monthrange
 from datetime import datetime
 
 import os
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from twisted.logger import Logger
 
 from ledslie.bitfont.font8x8 import font8x8
@@ -26,17 +26,16 @@ from ledslie.config import Config
 from ledslie.definitions import LEDSLIE_TOPIC_SEQUENCES_PROGRAMS
 from ledslie.messages import FrameSequence, Frame
 from ledslie.content.generic import GenericContent, CreateContent
-from ledslie.processors.typesetter import MarkupLine
+from ledslie.bitfont.markup import MarkupLine
 
 
 class Progress(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
 
     def onBrokerConnected(self):
-        self.task = task.LoopingCall(self.publishProgress)
-        self.task.start(60, now=True)  # Update content every minute
+        self.task = self.repeating.repeat(self.publishProgress, 60)  # Update content every minute
 
     def publishProgress(self):
         def _logFailure(failure):
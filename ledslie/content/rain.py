@@ -16,13 +16,10 @@
 
 import os
 
-from twisted.internet import _sslverify
 from twisted.logger import Logger
 
-from twisted.internet import reactor, task
+from twisted.internet import reactor
 from twisted.python.failure import Failure
-from twisted.web.client import readBody
-import treq
 
 from ledslie.config import Config
 from ledslie.content.generic import GenericContent, CreateContent
@@ -31,14 +28,13 @@ from ledslie.messages import TextSingleLineLayout
 
 
 class RainContent(GenericContent):
-    def __init__(self, endpoint, factory):
+    def __init__(self, endpoint, factory, reactor=None):
         self.log = Logger(self.__class__.__name__)
-        super().__init__(endpoint, factory)
+        super().__init__(endpoint, factory, reactor)
         self.task = None
 
     def onBrokerConnected(self):
-        self.task = task.LoopingCall(self.createForecast)
-        self.task.start(self.config['RAIN_UPDATE_FREQ'], now=True)
+        self.task = self.repeating.repeat(self.createForecast, lambda: self.config['RAIN_UPDATE_FREQ'])
 
     def _logFailure(self, failure):
         self.log.error("reported failure: {message}", message=failure.getErrorMessage())
@@ -51,7 +47,7 @@ class RainContent(GenericContent):
     def createForecast(self):
         url = self.config["RAIN_DATA_SOURCE"]
         self.log.debug("Grabbing rain forecast URL '%s'" % url)
-        d = treq.get(url, timeout=5)
+        d = self.http_get(url, timeout=5)
         d.addCallbacks(self.grab_http_response, self._logFailure)
         d.addCallbacks(self.parse_forecast_results, self._logFailure)
         d.addCallbacks(self.create_forcast, self._logFailure)
@@ -71,6 +67,7 @@ class RainContent(GenericContent):
             return "Rain Rain Rain"
 
     def grab_http_response(self, response):
+        from twisted.web.client import readBody
         if response.code != 200:
             raise RuntimeError("Status is not 200 but '%s'" % response.code)
         return readBody(response)
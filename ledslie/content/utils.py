@@ -60,11 +60,11 @@ class CircularBuffer(object):
 
         # Remove from the Table
         for k, v in self._table.items():
-            if v == value:
+            if v[0] is value:
                 found = k
                 break
-        if found:
-            del self._table[k]
+        if found is not None:
+            del self._table[found]
 
     def remove_by_id(self, id: int):
         """
@@ -78,6 +78,12 @@ class CircularBuffer(object):
     def update(self, elem_id: int, new_value: Any):
         self._table[elem_id][0] = new_value
 
+    def get(self, elem_id: int) -> Any:
+        """
+        I return the content of the element with elem_id.
+        """
+        return self._table[elem_id][0]
+
     def __contains__(self, elem_id) -> bool:
         """
         I return True if the elem_id is in the buffer.
@@ -13,7 +13,84 @@ MQTT_KEEPALIVE = 60  # set the time interval for sending a ping to the broker to
 # app.config['MQTT_PASSWORD'] = ''  # set the password here if the broker demands authentication
 # app.config['MQTT_TLS_ENABLED'] = False  # set TLS to disabled for testing purposes
 
+STATS_INTERVAL = 5.0  # Seconds between publishing the metrics of each service. 0 doesn't publish them.
+TRACE_SAMPLE_RATE = 1.0  # Part of the programs whose time from producer to display is traced. 0 traces none.
+PUBLISH_WINDOW = 8  # Messages of a service on their way to the broker at the same time. At most 16.
+PUBLISH_QUEUE_MAX = 200  # Messages that wait for the broker. The oldest is dropped when more come.
+PUBLISH_COALESCE_TOPICS = [  # Topics where only the newest message matters. A waiting message is replaced by a newer one.
+    'ledslie/sequences/1/+',
+    'ledslie/scheduler/1/programs',
+    'ledslie/stats/1/+',
+]  # Not the mirror topic; its messages only have the rows that changed since the previous one.
+SEQUENCE_CHUNK_BYTES = 256*1024  # Sequences larger than this are sent in chunks of about this size. 0 never splits.
+SEQUENCE_CHUNK_TIMEOUT = 30  # Seconds the scheduler waits for the next chunk of a sequence, before it gives up on it.
+SEQUENCE_CHUNK_MAX_BYTES = 32*1024*1024  # Bytes of chunks the scheduler keeps for sequences that aren't complete yet.
+STARTUP_IMPORT_TARGET = 0.4  # Seconds a service may take to import, see ledslie.startup.
+STARTUP_IMPORT_TARGETS = {'allinone': 0.5}  # Seconds for the services that get another target.
+
+CONTENT_HOST_PLUGINS = [  # Content producers the content host runs in one process, see ledslie.content.host.
+    'ledslie.content.info.InfoContent',
+    'ledslie.content.progress.Progress',
+    'ledslie.content.midnight.MidnightContent',
+    'ledslie.content.astralinfo.AstralContent',
+    'ledslie.content.coins.CoinsContent',
+    'ledslie.content.events.EventsContent',
+    'ledslie.content.ovinfo.OVInfoContent',
+    'ledslie.content.rain.RainContent',
+    'ledslie.content.playing.MpdPlaying',
+]
+CONTENT_HOST_MAX_FAILURES = 5  # Failed calls in a row after which the content host stops a plugin.
+CONTENT_HOST_SLOW_CALL = 0.5  # Seconds a call of a plugin may keep the reactor busy before it's logged as slow.
+CONTENT_HTTP_MAX_PER_HOST = 2  # HTTP connections to each host kept open for the content producers of a process.
+
+ALLINONE_CONTENT = []  # Content producers the all-in-one runner hosts, like 'ledslie.content.rain.RainContent'.
+ALLINONE_EXPORT_TOPICS = [  # Topics the all-in-one runner passes on to the broker, for the clients outside it.
+    'ledslie/sequences/1/+',  # The dashboard of the site. Each sequence is serialized once for this.
+    'ledslie/scheduler/1/programs',
+    'ledslie/mirror/1',
+    'ledslie/stats/1/+',
+    'ledslie/error/#',
+]
+ALLINONE_ECHO_WINDOW = 100  # Exported messages remembered, to recognise them when the broker sends them back.
+
 FONT_DIRECTORY = '../../resources/fonts/'
+BITFONT_DIRECTORIES = ['/usr/share/fonts/X11/misc']  # Directories with BDF and PCF fonts to offer for display.
+BITFONT_CACHE_DIRECTORY = None  # Where compiled bitmap fonts are kept, only for this user. None is in ~/.cache.
+
+SITE_BIND = 'unix:/var/run/ledslie/ledslie.sock'  # Where the site listens for nginx.
+SITE_WORKERS = 1  # Processes serving the site. Upload jobs, previews, the mirror and limits are kept per process.
+SITE_THREADS = 32  # Threads serving requests in each process. Every mirror watcher keeps one busy.
+SITE_KEEPALIVE = 30  # Seconds an idle connection from nginx is kept open for the next request.
+SITE_WORKER_TIMEOUT = 60  # Seconds a worker can be unresponsive before it's restarted.
+SITE_PROXY_HOPS = 1  # Number of proxies in front of the site, whose X-Forwarded- headers are trusted.
+SITE_MAX_UPLOAD_BYTES = 8*1024*1024  # Largest request the site accepts.
+SITE_UPLOAD_WORKERS = 2  # Number of uploads that are converted at the same time.
+SITE_UPLOAD_MAX_PENDING = 10  # Number of uploads that can wait for conversion. More are refused.
+SITE_UPLOAD_JOB_RETENTION = 10*60  # Seconds that the status of a finished upload can be asked for.
+SITE_PREVIEW_SCALE = 4  # Previews show every LED as a square of this many pixels.
+SITE_PREVIEW_CACHE_ENTRIES = 64  # Number of rendered previews that are kept.
+SITE_MIRROR_MAX_CLIENTS = 16  # Browsers that can watch the display mirror at the same time. Below SITE_THREADS.
+SITE_MIRROR_CLIENT_BACKLOG = 10  # Mirror updates queued for a slow browser, before it has to catch up.
+SITE_MIRROR_KEEPALIVE = 15  # Seconds between keep-alive comments on idle mirror streams.
+SITE_BULK_MAX_ITEMS = 100  # Number of programs that can be published with one bulk request.
+SITE_BULK_PUBLISH_TIMEOUT = 10  # Seconds to wait for the broker to acknowledge all programs of a bulk request.
+SITE_LIMIT_CLIENT_RATE = 0.5  # Requests per second a client can make, on average.
+SITE_LIMIT_CLIENT_BURST = 20  # Requests a client can make in a short burst. Larger bulk requests take all of it.
+SITE_LIMIT_CLIENT_BYTES_RATE = 64*1024  # Bytes per second a client can send, on average.
+SITE_LIMIT_CLIENT_BYTES_BURST = 16*1024*1024  # Bytes a client can send in a short burst.
+SITE_LIMIT_PROGRAM_RATE = 0.2  # Updates per second a program can get, on average.
+SITE_LIMIT_PROGRAM_BURST = 5  # Updates a program can get in a short burst.
+SITE_LIMIT_MAX_TEXT_LENGTH = 1024  # Longest text a request can contain.
+SITE_LIMIT_MAX_KEYS = 10000  # Number of clients and programs whose limits are remembered.
+SITE_LIMIT_STATS_INTERVAL = 10  # Minimal seconds between publishing the counters of the limits.
+SITE_DASHBOARD_THUMBNAIL_WIDTH = 72  # Width in pixels of the pictures of the programs on the dashboard.
+
+INGEST_MAX_PIXELS = 2048*2048  # Largest uploaded image, width times height.
+INGEST_MAX_FRAMES = 2000  # Maximum number of frames read from an uploaded animation.
+INGEST_MAX_BYTES = 2*1024*1024  # Maximum bytes of frame data an uploaded animation may become.
+INGEST_LED_GAMMA = 2.2  # The light of the LEDs is their level to this power. 1.0 for LEDs that are linear.
+INGEST_BRIGHTNESS = 1.0  # Fraction of the full brightness of the LEDs that white in uploaded images becomes.
+INGEST_DITHER = False  # Dither uploaded images to show the levels between those the panel can show.
 
 SERIAL_BAUDRATE = 115200
 SERIAL_PORT = '/dev/ttyACM0'  # set to "fake" to run without serial port.
@@ -26,11 +103,31 @@ DISPLAY_LINE_DURATION = 2500  # Delay in miliseconds for each line.
 
 TYPESETTER_1LINE_DEFAULT_FONT_SIZE = 20
 TYPESETTER_ANIMATE_VERTICAL_SCROLL_DELAY = 30  # ms to wait between each scrolling frame.
+TYPESETTER_MARQUEE_SPEED = 48  # Pixels per second that text too long for the display scrolls by.
+TYPESETTER_MARQUEE_FRAME_DELAY = 50  # Minimal ms between marquee frames. Never faster than the serial link allows.
+TYPESETTER_MARQUEE_HOLD = 1500  # ms that the start and the end of the marquee text is shown still.
+TYPESETTER_SIMPLE_TEXT_MAX_LENGTH = 256  # Maximum number of characters taken from the simple text topic.
+
+MIRROR_MAX_FPS = 4  # Maximum number of frames per second published on the mirror topic.
+MIRROR_KEYFRAME_INTERVAL = 20  # Mirror messages between two messages that contain the whole display.
 
 PROGRAM_RETIREMENT_AGE = 30*60  # Age in seconds before the program is removed. 30 minutes.
 ALERT_RETIREMENT_AGE   = 5*60   # Age in seconds before a alert is removed
 ALERT_INITIAL_REPEAT   = 5      # Number of times an alert is repeated before it is seen as a normal program.
 
+PLANNER_STORE = '/var/lib/ledslie/planner.json'  # File where the planner keeps the scheduled programs.
+PLANNER_REFRESH_INTERVAL = 10*60  # Seconds between publishing an active program again. Below PROGRAM_RETIREMENT_AGE.
+PLANNER_MIN_REPEAT = 15*60  # Least number of seconds between two times a program is shown.
+PLANNER_MAX_PROGRAMS = 100  # Maximum number of scheduled programs.
+
+TICKER_FONT = '8x8'  # Bitfont the ticker text is shown in.
+TICKER_FONT_SCALE = 2  # Number of LEDs for each pixel of the bitfont.
+TICKER_SPEED = 48  # Pixels per second that the ticker text moves.
+TICKER_FRAME_DELAY = 50  # Minimal ms between ticker frames. Never faster than the serial link allows.
+TICKER_DISPLAY_DURATION = 20*1000  # Mili-seconds the ticker is shown before the next program is shown.
+TICKER_ITEM_SEPARATOR = "  *  "  # Text shown between two ticker items.
+TICKER_MAX_ITEMS = 50  # Maximum number of items in a ticker. The oldest items are dropped.
+
 PROGRESS_DISPLAY_DURATION = 5*1000  # Miliseconds that the progress message is shown.
 
 LOCATION_LAT = 52.34557
@@ -5,6 +5,9 @@ user is supposed to be configuring in either runtime or deployment.
 
 LEDSLIE_TOPIC_SEQUENCES_UNNAMED      = "ledslie/sequences/1"
 LEDSLIE_TOPIC_SEQUENCES_PROGRAMS     = "ledslie/sequences/1/+"
+LEDSLIE_TOPIC_CHUNKS_UNNAMED         = "ledslie/chunks/1"
+LEDSLIE_TOPIC_CHUNKS_PROGRAMS        = "ledslie/chunks/1/+"
+LEDSLIE_TOPIC_TICKER_PROGRAMS        = "ledslie/ticker/1/+"
 LEDSLIE_TOPIC_TYPESETTER_1LINE       = "ledslie/typesetter/1/1line"
 LEDSLIE_TOPIC_TYPESETTER_3LINES      = "ledslie/typesetter/1/3lines"
 LEDSLIE_TOPIC_TYPESETTER_SIMPLE_TEXT = "ledslie/text"
@@ -12,5 +15,8 @@ LEDSLIE_TOPIC_STATS_BASE             = "ledslie/stats/1/"
 LEDSLIE_TOPIC_ALERT                  = "ledslie/alert/1/"
 LEDSLIE_ERROR                        = "ledslie/error"
 LEDSLIE_TOPIC_SCHEDULER_PROGRAMS     = "ledslie/scheduler/1/programs"
+LEDSLIE_TOPIC_MIRROR                 = "ledslie/mirror/1"
+LEDSLIE_TOPIC_PLANNER                = "ledslie/planner/1/+"
+LEDSLIE_TOPIC_CONFIG                 = "ledslie/config/1"
 
 ALERT_PRIO_STRING = 'alert'
\ No newline at end of file
@@ -0,0 +1,91 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I am the connection of the site to the MQTT broker. Each process serving the site has one connection, made when the
+# app is made in that process and kept for as long as it runs. All its threads publish over it, and it reconnects by
+# itself when the connection is lost.
+
+import logging
+
+import paho.mqtt.client as paho
+
+log = logging.getLogger(__name__)
+
+
+class SiteMqtt(object):
+    def __init__(self):
+        """
+        I hold the MQTT client of the site. Handlers can be added before there is a client.
+        """
+        self.client = None
+        self.broker_url = None
+        self.broker_port = None
+        self._handlers = {}  # topic -> handler(client, userdata, message)
+
+    def init_app(self, app) -> None:
+        """
+        I connect to the broker in the MQTT_ settings of app and keep the connection in a background thread.
+        """
+        config = app.config
+        self.broker_url = config['MQTT_BROKER_URL']
+        self.broker_port = config['MQTT_BROKER_PORT']
+        self.client = paho.Client(paho.CallbackAPIVersion.VERSION2)
+        if config.get('MQTT_USERNAME'):
+            self.client.username_pw_set(config['MQTT_USERNAME'], config.get('MQTT_PASSWORD'))
+        self.client.on_connect = self._on_connect
+        self.client.reconnect_delay_set(min_delay=1, max_delay=30)
+        for topic, handler in self._handlers.items():
+            self.client.message_callback_add(topic, handler)
+        self.client.connect_async(self.broker_url, self.broker_port, keepalive=config['MQTT_KEEPALIVE'])
+        self.client.loop_start()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            log.error("Connecting to %s:%s failed: %s", self.broker_url, self.broker_port, reason_code)
+            return
+        log.info("Connected to %s:%s", self.broker_url, self.broker_port)
+        for topic in self._handlers:
+            client.subscribe(topic)
+
+    def on_topic(self, topic: str):
+        """
+        Decorator to handle the messages on topic. The topic is subscribed to every time the client connects.
+        """
+        def decorator(handler):
+            self._handlers[topic] = handler
+            if self.client is not None:
+                self.client.message_callback_add(topic, handler)
+                self.client.subscribe(topic)
+            return handler
+        return decorator
+
+    def publish(self, topic: str, payload, qos: int=0, retain: bool=False):
+        """
+        I publish payload on topic. While the connection is down, messages with QoS 1 or more wait for it to be back and
+        messages with QoS 0 are dropped.
+        :return: The message info from paho.
+        """
+        info = self.client.publish(topic, payload, qos, retain)
+        if info.rc not in (paho.MQTT_ERR_SUCCESS, paho.MQTT_ERR_NO_CONN):
+            log.error("Error %s publishing to %s", info.rc, topic)
+        return info
+
+    def shutdown(self) -> None:
+        if self.client is not None:
+            self.client.loop_stop()
+            self.client.disconnect()
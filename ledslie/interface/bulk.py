@@ -0,0 +1,68 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I help the site to publish many programs in one request. All messages are handed to the MQTT client at once and only
+# then is waited for the broker to acknowledge them, so the batch costs about one round trip to the broker.
+
+import time
+
+
+class BulkError(ValueError):
+    pass
+
+
+def BulkItems(request_data, max_items: int) -> list:
+    """
+    I return the list of program definitions in the data of a bulk request.
+    :raises BulkError: When the request isn't a list of at most max_items objects, or an object with such a list in
+    "programs".
+    """
+    if isinstance(request_data, dict):
+        request_data = request_data.get('programs', None)
+    if not isinstance(request_data, list):
+        raise BulkError("Expected a list of programs.")
+    if len(request_data) > max_items:
+        raise BulkError("Expected at most %d programs, got %d." % (max_items, len(request_data)))
+    return request_data
+
+
+def PublishBatch(client, messages: list, qos: int, timeout: float) -> list:
+    """
+    I publish the messages over client and wait for all of them together.
+
+    :param client: The paho MQTT client.
+    :param messages: List of tuples with the topic and payload.
+    :type messages: list
+    :param qos: The QoS to publish with. With 1 or more the broker has acknowledged each message on return.
+    :type qos: int
+    :param timeout: Seconds to wait for all the messages together.
+    :type timeout: float
+    :return: For each message None when it was published, or the reason why not.
+    :rtype: list
+    """
+    infos = [client.publish(topic, payload, qos) for topic, payload in messages]  # Don't wait between messages.
+    deadline = time.time() + timeout
+    results = []
+    for info in infos:
+        try:
+            info.wait_for_publish(max(0.0, deadline - time.time()))
+        except (ValueError, RuntimeError) as exc:
+            results.append(str(exc))
+            continue
+        results.append(None if info.is_published() else "Not acknowledged within %s seconds." % timeout)
+    return results
@@ -0,0 +1,135 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I condition uploaded images for the LED panel.
+#
+# Images are scaled down in linear light, so the average of a black and a white pixel is as bright as the LEDs can show
+# half of their light, and not darker. The linear levels are then turned into the levels the panel gets through a table
+# that is made once for the gamma and brightness of the panel. The panel shows 128 levels, as the scheduler drops the
+# lowest bit. With ordered dithering the levels in between are made from a fixed pattern of the two nearest levels. The
+# pattern doesn't move between frames, so parts of an animation that stay the same don't flicker.
+#
+# All the work on pixels is done by Pillow. The table lookups and dithering run once over all frames of a sequence.
+
+from functools import lru_cache
+
+from PIL import Image
+
+from ledslie.config import Config
+
+LINEAR_MAX = 4095  # Linear light is kept as 12 bit numbers between the steps.
+PANEL_LEVELS = 128  # Number of levels the panel shows.
+BAYER_4X4 = (
+    (0, 8, 2, 10),
+    (12, 4, 14, 6),
+    (3, 11, 1, 9),
+    (15, 7, 13, 5),
+)
+
+
+@lru_cache(maxsize=1)
+def LinearTable() -> list:
+    """
+    I return the table that turns the levels of a grayscale image into linear light between 0.0 and 1.0. Images are
+    taken to have a gamma of 2.2, close to sRGB.
+    """
+    return [(level / 255) ** 2.2 for level in range(256)]
+
+
+@lru_cache(maxsize=32)
+def PanelTable(gamma: float, brightness: float, threshold: float) -> list:
+    """
+    I return the table that turns a 12 bit linear light level into the image level for the panel.
+
+    :param gamma: Gamma of the LEDs, the light they give is the panel level to the power of gamma.
+    :param brightness: Fraction of the full brightness that white becomes.
+    :param threshold: Fraction of a panel level at which the level is rounded up. 0.5 is plain rounding.
+    :return: Table with the 65536 entries Pillow wants for looking up the levels of an integer image.
+    :rtype: list
+    """
+    table = []
+    top = PANEL_LEVELS - 1
+    for linear in range(LINEAR_MAX + 1):
+        panel_level = ((linear / LINEAR_MAX) ** (1 / gamma)) * brightness * top
+        table.append(min(top, int(panel_level + threshold)) * 2)  # The scheduler keeps the top 7 bits.
+    table.extend([table[-1]] * (65536 - len(table)))
+    return table
+
+
+@lru_cache(maxsize=4)
+def DitherMasks(size: tuple) -> tuple:
+    """
+    I return for each position in the dither pattern the mask of the pixels of an image of size at that position.
+    """
+    width, height = size
+    masks = []
+    for y_pos, pattern_row in enumerate(BAYER_4X4):
+        for x_pos in range(len(pattern_row)):
+            row = bytes([255 if x % 4 == x_pos else 0 for x in range(width)])
+            empty = bytes(width)
+            block = b''.join([row if y == y_pos else empty for y in range(4)])
+            data = block * (height // 4) + block[:width * (height % 4)]
+            masks.append((pattern_row[x_pos], Image.frombytes("L", size, data)))
+    return tuple(masks)
+
+
+def Linearize(frame: Image.Image) -> Image.Image:
+    """
+    I return frame scaled down to the display, as a floating point image of linear light.
+    """
+    config = Config()
+    display_size = (config["DISPLAY_WIDTH"], config["DISPLAY_HEIGHT"])
+    linear = frame.convert("L").point(LinearTable(), "F")
+    if linear.size != display_size:
+        linear = linear.resize(display_size, Image.BOX)  # Each LED gets the average of the pixels it covers.
+    return linear
+
+
+def ConditionFrames(frames: list, dither: bool=None) -> list:
+    """
+    I turn the linear light frames made by Linearize into the image data of the frames for the panel.
+
+    :param frames: List of images returned by Linearize.
+    :type frames: list
+    :param dither: Use ordered dithering. None takes INGEST_DITHER from the configuration.
+    :type dither: bool
+    :return: List with the image data of each frame.
+    :rtype: list
+    """
+    config = Config()
+    if not frames:
+        return []
+    if dither is None:
+        dither = config['INGEST_DITHER']
+    gamma = config['INGEST_LED_GAMMA']
+    brightness = config['INGEST_BRIGHTNESS']
+    width, height = frames[0].size
+    stacked = Image.new("F", (width, height * len(frames)))
+    for nr, frame in enumerate(frames):
+        stacked.paste(frame, (0, nr * height))
+    levels = stacked.point(lambda x: x * LINEAR_MAX + 0.5).convert("I")
+    if not dither:
+        panel = levels.point(PanelTable(gamma, brightness, 0.5), "L")
+    else:
+        panel = Image.new("L", stacked.size)
+        for rank, mask in DitherMasks(stacked.size):
+            threshold = (rank + 0.5) / 16
+            panel.paste(levels.point(PanelTable(gamma, brightness, threshold), "L"), mask=mask)
+    data = panel.tobytes()
+    frame_size = width * height
+    return [bytearray(data[nr * frame_size:(nr + 1) * frame_size]) for nr in range(len(frames))]
@@ -0,0 +1,167 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I keep track of the programs the scheduler has, for the dashboard of the site. A sequence is only decoded when its
+# program gets a sequence different from the one before. Large sequences come in chunks, that are put back together
+# like the scheduler does. What the dashboard shows is kept, so showing the dashboard never decodes anything.
+
+import hashlib
+import io
+import json
+import threading
+import time
+
+from PIL import Image
+
+from ledslie.config import Config
+from ledslie.messages import FrameSequence
+from ledslie.processors.chunks import ChunkAssembler, ChunkError
+
+
+class ProgramInfo(object):
+    def __init__(self, name: str, digest: str, frames: int, duration: int, valid_time: float, received: float,
+                 is_alert: bool, thumbnail: bytes):
+        self.name = name
+        self.digest = digest
+        self.frames = frames
+        self.duration = duration
+        self.valid_time = valid_time
+        self.valid_until = received + valid_time
+        self.is_alert = is_alert
+        self.thumbnail = thumbnail
+
+
+def Thumbnail(sequence: FrameSequence, width: int) -> bytes:
+    """
+    I return a PNG of the first frame of sequence, scaled down to width.
+    """
+    config = Config()
+    display_size = (config['DISPLAY_WIDTH'], config['DISPLAY_HEIGHT'])
+    image = Image.frombytes("L", display_size, bytes(sequence.first().raw()))
+    if width != display_size[0]:
+        image = image.resize((width, max(1, round(display_size[1] * width / display_size[0]))), Image.BOX)
+    fp = io.BytesIO()
+    image.save(fp, format='PNG')
+    return fp.getvalue()
+
+
+class ProgramBoard(object):
+    def __init__(self, thumbnail_width: int):
+        """
+        I know which programs are live and what they look like.
+        :param thumbnail_width: Width in pixels of the thumbnails.
+        :type thumbnail_width: int
+        """
+        self.thumbnail_width = thumbnail_width
+        self.live = None  # Names of the programs the scheduler has. None until it has told.
+        self._programs = {}
+        self._lock = threading.Lock()
+        self._chunks = ChunkAssembler(None, Config())
+        self._chunks_lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.time()
+
+    def on_programs(self, payload: bytes) -> None:
+        """
+        I handle the list of program names published by the scheduler.
+        """
+        try:
+            names = json.loads(payload.decode())
+        except ValueError:
+            return
+        with self._lock:
+            self.live = set([name for name in names if name is not None])
+            for name, info in list(self._programs.items()):
+                if name not in self.live and not info.is_alert:
+                    del self._programs[name]  # The scheduler has retired it.
+
+    def on_sequence(self, program_name: str, payload: bytes) -> bool:
+        """
+        I handle a sequence sent to the scheduler for program_name.
+        :return: True when the sequence was decoded, False when it was the same as before or can't be read.
+        :rtype: bool
+        """
+        now = self.now()
+        with self._chunks_lock:
+            self._chunks.drop(program_name)
+        if not payload:
+            with self._lock:
+                self._programs.pop(program_name, None)
+            return False
+        digest = hashlib.sha1(payload).hexdigest()
+        with self._lock:
+            info = self._programs.get(program_name, None)
+            if info is not None and info.digest == digest:
+                info.valid_until = now + info.valid_time  # The scheduler renews it as well.
+                return False
+        try:
+            sequence = FrameSequence().load(bytearray(payload))
+        except (ValueError, TypeError):
+            sequence = None
+        return self._add_sequence(program_name, digest, sequence, now)
+
+    def on_chunk(self, program_name: str, payload: bytes) -> bool:
+        """
+        I handle a chunk of a sequence sent to the scheduler for program_name, see ledslie.processors.chunks.
+        :return: True when it was the last chunk and the sequence was decoded, False otherwise.
+        :rtype: bool
+        """
+        now = self.now()
+        with self._chunks_lock:
+            try:
+                sequence = self._chunks.add(program_name, payload)
+            except ChunkError:
+                return False
+        if sequence is None:
+            return False
+        return self._add_sequence(program_name, hashlib.sha1(payload).hexdigest(), sequence, now)
+
+    def _add_sequence(self, program_name: str, digest: str, sequence, now: float) -> bool:
+        if sequence is None or sequence.is_empty():
+            return False
+        info = ProgramInfo(program_name, digest, len(sequence), sequence.duration, sequence.valid_time, now,
+                           sequence.is_alert(), Thumbnail(sequence, self.thumbnail_width))
+        with self._lock:
+            self._programs[program_name] = info
+        return True
+
+    def programs(self) -> list:
+        """
+        I return the live programs sorted by name, as tuples of the name and the ProgramInfo. The info is None for the
+        programs the scheduler has but whose sequence I haven't seen. Before the scheduler has told which programs it
+        has, the programs whose sequence is still valid are live. Alerts are live while they are valid.
+        """
+        now = self.now()
+        with self._lock:
+            valid = dict([(name, info) for name, info in self._programs.items() if info.valid_until > now])
+            if self.live is None:
+                names = set(valid)
+            else:
+                names = self.live | set([name for name, info in valid.items() if info.is_alert])
+            return [(name, valid.get(name, None)) for name in sorted(names)]
+
+    def thumbnail(self, program_name: str):
+        """
+        I return the thumbnail and its digest for program_name. None when the program isn't known.
+        """
+        with self._lock:
+            info = self._programs.get(program_name, None)
+            if info is None:
+                return None
+            return info.thumbnail, info.digest
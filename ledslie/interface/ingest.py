@@ -0,0 +1,124 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I turn uploaded images into frame sequences for the display. Animated GIF, PNG and WebP images are decoded one frame
+# at a time, so only the frame being converted and the resulting sequence are kept in memory.
+
+from PIL import Image, ImageSequence
+
+from ledslie.config import Config
+from ledslie.interface.conditioning import Linearize, ConditionFrames
+from ledslie.messages import FrameSequence, Frame
+
+
+class IngestError(ValueError):
+    pass
+
+
+class UnsupportedImage(IngestError):
+    pass
+
+
+class ImageTooLarge(IngestError):
+    pass
+
+
+def ProcessFrame(frame_raw: Image.Image) -> tuple:
+    """
+    I scale a single image down to the display.
+    :param frame_raw: The image to convert.
+    :type frame_raw: Image.Image
+    :return: Tuple of the image in linear light (see Linearize) and the duration in ms.
+    :rtype: tuple
+    """
+    duration = frame_raw.info.get('duration', None)
+    if duration is None:
+        duration = Config()["DISPLAY_DEFAULT_DELAY"]
+    return Linearize(frame_raw), duration
+
+
+def IngestFrames(fp, progress=None, dither: bool=None) -> tuple:
+    """
+    I read the (animated) image from file object fp and turn it into a sequence. Consecutive frames that look the same
+    are folded into one frame that is shown for their combined duration.
+
+    :param fp: The file object with the image.
+    :param progress: Optional callable that is called with the number of frames read so far.
+    :type progress: callable
+    :param dither: Use ordered dithering. None takes INGEST_DITHER from the configuration.
+    :type dither: bool
+    :return: Tuple with the sequence and the number of frames that were in the image.
+    :rtype: tuple
+    :raises UnsupportedImage: When the image can't be read.
+    :raises ImageTooLarge: When the image is larger than the INGEST_ limits of the configuration.
+    """
+    config = Config()
+    try:
+        im = Image.open(fp)
+    except (OSError, Image.DecompressionBombError) as exc:
+        raise UnsupportedImage(str(exc))
+    width, height = im.size
+    if width * height > config['INGEST_MAX_PIXELS']:
+        raise ImageTooLarge("Image of %dx%d pixels is too large." % (width, height))
+    frame_size = config['DISPLAY_SIZE']
+    max_frames = int(config['INGEST_MAX_BYTES'] / frame_size)
+    linear_frames = []
+    durations = []
+    previous_data = None
+    nr_of_source_frames = 0
+    try:
+        for frame_raw in ImageSequence.Iterator(im):
+            nr_of_source_frames += 1
+            if nr_of_source_frames > config['INGEST_MAX_FRAMES']:
+                raise ImageTooLarge("Image has more than %d frames." % config['INGEST_MAX_FRAMES'])
+            linear, duration = ProcessFrame(frame_raw)
+            if progress is not None:
+                progress(nr_of_source_frames)
+            linear_data = linear.tobytes()
+            if linear_data == previous_data:
+                durations[-1] += duration  # Same as the frame before, show that one longer.
+                continue
+            if len(linear_frames) >= max_frames:
+                raise ImageTooLarge("Image has more than %d different frames." % max_frames)
+            linear_frames.append(linear)
+            durations.append(duration)
+            previous_data = linear_data
+    except (OSError, EOFError) as exc:
+        raise UnsupportedImage(str(exc))
+    finally:
+        im.close()
+    if not linear_frames:
+        raise UnsupportedImage("Image has no frames.")
+    sequence = FrameSequence()
+    for image_data, duration in zip(ConditionFrames(linear_frames, dither), durations):
+        sequence.add_frame(Frame(image_data, duration))
+    return sequence, nr_of_source_frames
+
+
+def SequenceSummary(sequence: FrameSequence, payloads: list, nr_of_source_frames: int) -> dict:
+    """
+    I return a short description of an ingested sequence, to report back instead of the whole sequence. payloads are
+    what was published for it, more than one when it was sent in chunks.
+    """
+    return {
+        'frames': len(sequence),
+        'source_frames': nr_of_source_frames,
+        'duration': sequence.duration,
+        'bytes': sum([len(payload) for payload in payloads]),
+        'chunks': len(payloads),
+    }
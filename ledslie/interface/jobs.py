@@ -0,0 +1,145 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I run slow work, like converting large uploads, in a small pool of background threads. This way the site can answer
+# right away with a job id, and the job status can be asked for later on.
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ledslie.interface.ingest import IngestError
+
+log = logging.getLogger(__name__)
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class Job(object):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, job_id: str, program: str):
+        self.id = job_id
+        self.program = program
+        self.state = self.QUEUED
+        self.frames_read = 0
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self._finished = threading.Event()
+
+    def set_progress(self, frames_read: int):
+        self.frames_read = frames_read
+
+    def wait(self, timeout=None) -> bool:
+        """
+        I wait until the job is finished. Returns False if it didn't finish within timeout seconds.
+        """
+        return self._finished.wait(timeout)
+
+    def status(self) -> dict:
+        status = {
+            'job': self.id,
+            'program': self.program,
+            'state': self.state,
+            'frames_read': self.frames_read,
+        }
+        if self.result is not None:
+            status['result'] = self.result
+        if self.error is not None:
+            status['error'] = self.error
+        return status
+
+
+class JobQueue(object):
+    def __init__(self, max_workers: int, max_pending: int, retention: float):
+        """
+        I run jobs in a pool of background threads.
+
+        :param max_workers: Number of jobs that run at the same time.
+        :type max_workers: int
+        :param max_pending: Number of jobs that can be queued or running. More are refused.
+        :type max_pending: int
+        :param retention: Seconds that the status of a finished job is kept.
+        :type retention: float
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._max_pending = max_pending
+        self._retention = retention
+        self._jobs = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.time()
+
+    def submit(self, program: str, func, *args) -> Job:
+        """
+        I queue func to be called with the job and args. What func returns becomes the result of the job.
+        :raises QueueFull: When max_pending jobs are already waiting or running.
+        """
+        with self._lock:
+            self._forget_finished()
+            if self._pending >= self._max_pending:
+                raise QueueFull("%d jobs are already waiting." % self._pending)
+            job = Job(uuid.uuid4().hex, program)
+            self._jobs[job.id] = job
+            self._pending += 1
+        self._executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job: Job, func, args):
+        job.state = Job.RUNNING
+        try:
+            job.result = func(job, *args)
+            job.state = Job.DONE
+        except IngestError as exc:
+            job.error = str(exc)
+            job.state = Job.FAILED
+        except Exception as exc:
+            log.exception("Job %s failed", job.id)
+            job.error = "Internal error"
+            job.state = Job.FAILED
+        finally:
+            with self._lock:
+                self._pending -= 1
+                job.finished_at = self.now()
+            job._finished.set()
+
+    def _forget_finished(self):
+        expire_before = self.now() - self._retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at is not None and job.finished_at < expire_before:
+                del self._jobs[job_id]
+
+    def get(self, job_id: str):
+        """
+        I return the job with job_id, or None if it's not known (anymore).
+        """
+        with self._lock:
+            return self._jobs.get(job_id, None)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,170 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I limit how much a single client, or the programs of a single name, can ask from the display. Requests over the limit
+# are refused by the site, before anything is published, so the typesetter and scheduler never see them.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LimitExceeded(RuntimeError):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__("Too many requests for the %s limit, retry after %.1f seconds." % (reason, retry_after))
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket(object):
+    def __init__(self, rate: float, burst: float, now: float):
+        """
+        I hold up to burst tokens, and get rate tokens more every second.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float, now: float) -> bool:
+        """
+        I take cost tokens when I have them. Returns False, and takes nothing, when I don't. A cost of more than I can
+        hold takes all of my tokens once I'm full, so it isn't refused forever.
+        """
+        self._refill(now)
+        cost = min(cost, self.burst)
+        if cost > self.tokens:
+            return False
+        self.tokens -= cost
+        return True
+
+    def wait_time(self, cost: float) -> float:
+        """
+        I return the seconds until I'll have cost tokens, or am full when cost is more than I can hold.
+        """
+        return max(0.0, (min(cost, self.burst) - self.tokens) / self.rate)
+
+    def give_back(self, cost: float):
+        self.tokens = min(self.burst, self.tokens + cost)
+
+
+class RateLimiter(object):
+    def __init__(self, rate: float, burst: float, max_keys: int):
+        """
+        I keep a token bucket for each key, like a client address or program name.
+        :param rate: Tokens each key gets every second.
+        :param burst: Tokens each key can save up.
+        :param max_keys: Number of keys remembered. When there are more the least recently seen key is forgotten, as
+        if its bucket was full.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def take(self, key, cost: float, now: float) -> float:
+        """
+        I take cost tokens from the bucket of key.
+        :return: 0.0 when the tokens were taken, otherwise the seconds to wait before they can be.
+        :rtype: float
+        """
+        bucket = self._buckets.get(key, None)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        if bucket.take(cost, now):
+            return 0.0
+        return max(bucket.wait_time(cost), 1e-3)
+
+    def give_back(self, key, cost: float) -> None:
+        """
+        I return cost tokens that were taken from the bucket of key.
+        """
+        if key in self._buckets:
+            self._buckets[key].give_back(cost)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class IngressLimits(object):
+    def __init__(self, config):
+        """
+        I enforce the SITE_LIMIT_ settings of config on the requests of the site, and count what I let through and
+        what not.
+        """
+        max_keys = config['SITE_LIMIT_MAX_KEYS']
+        self.clients = RateLimiter(config['SITE_LIMIT_CLIENT_RATE'], config['SITE_LIMIT_CLIENT_BURST'], max_keys)
+        self.client_bytes = RateLimiter(config['SITE_LIMIT_CLIENT_BYTES_RATE'], config['SITE_LIMIT_CLIENT_BYTES_BURST'],
+                                        max_keys)
+        self.programs = RateLimiter(config['SITE_LIMIT_PROGRAM_RATE'], config['SITE_LIMIT_PROGRAM_BURST'], max_keys)
+        self.max_text_length = config['SITE_LIMIT_MAX_TEXT_LENGTH']
+        self.stats_interval = config['SITE_LIMIT_STATS_INTERVAL']
+        self.counters = {'accepted': 0, 'client': 0, 'bytes': 0, 'program': 0, 'size': 0}
+        self._stats_published = None
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        return time.time()
+
+    def check(self, client: str, programs=(), nr_of_bytes: int=0, texts=(), cost: int=1) -> None:
+        """
+        I check a request of client that publishes to programs, is nr_of_bytes large and contains texts. The request
+        counts cost times against the limit of the client, like for the number of programs of a bulk request. Nothing
+        is taken from any bucket when the request is refused.
+        :raises LimitExceeded: When the request is over one of the limits.
+        """
+        with self._lock:
+            for text in texts:
+                if len(text) > self.max_text_length:
+                    self.counters['size'] += 1
+                    raise LimitExceeded('size', 0.0)
+            now = self.now()
+            taken = []
+            checks = [(self.clients, client, cost, 'client'), (self.client_bytes, client, nr_of_bytes, 'bytes')]
+            checks.extend([(self.programs, program, 1, 'program') for program in set(programs) if program])
+            for limiter, key, cost, reason in checks:
+                wait = limiter.take(key, cost, now)
+                if wait:
+                    for done_limiter, done_key, done_cost in taken:
+                        done_limiter.give_back(done_key, done_cost)
+                    self.counters[reason] += 1
+                    raise LimitExceeded(reason, wait)
+                taken.append((limiter, key, cost))
+            self.counters['accepted'] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def due_stats(self):
+        """
+        I return the counters when they haven't been asked for in the last stats_interval seconds, otherwise None.
+        """
+        now = self.now()
+        with self._lock:
+            if self._stats_published is not None and now - self._stats_published < self.stats_interval:
+                return None
+            self._stats_published = now
+            return dict(self.counters)
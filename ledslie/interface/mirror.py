@@ -0,0 +1,110 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I hand the display mirror published by the scheduler to the browsers that watch it. Every browser gets its own small
+# queue of updates. A browser that falls behind is sent the whole display once it catches up, so it never holds up the
+# others.
+
+import base64
+import json
+import queue
+import threading
+
+from ledslie.processors.mirror import MirrorDecoder
+
+
+class TooManyWatchers(RuntimeError):
+    pass
+
+
+def MirrorEvent(rows: dict) -> str:
+    """
+    I return the Server-Sent Event with the changed rows of the display.
+    """
+    data = {str(row_nr): base64.b64encode(row).decode() for row_nr, row in rows.items()}
+    return "event: rows\ndata: %s\n\n" % json.dumps(data)
+
+
+class _Watcher(object):
+    def __init__(self, backlog: int):
+        self.events = queue.Queue(backlog)
+        self.behind = False
+
+
+class MirrorHub(object):
+    def __init__(self, max_watchers: int, backlog: int):
+        """
+        I fan out the mirror messages to the watchers.
+        :param max_watchers: Number of watchers that can watch at the same time.
+        :param backlog: Number of updates queued for a watcher.
+        """
+        self.max_watchers = max_watchers
+        self.backlog = backlog
+        self.decoder = MirrorDecoder()
+        self._watchers = set()
+        self._lock = threading.Lock()
+
+    def on_mirror(self, payload: bytes) -> None:
+        """
+        I handle a mirror message from the scheduler.
+        """
+        with self._lock:
+            changed = self.decoder.decode(payload)
+            if not changed:
+                return
+            event = MirrorEvent(changed)
+            for watcher in self._watchers:
+                if watcher.behind:
+                    continue
+                try:
+                    watcher.events.put_nowait(event)
+                except queue.Full:
+                    watcher.behind = True
+
+    def watch(self, keepalive: float):
+        """
+        I return a generator with the events for a new watcher, starting with the whole display.
+        :raises TooManyWatchers: When max_watchers are already watching.
+        """
+        watcher = _Watcher(self.backlog)
+        with self._lock:
+            if len(self._watchers) >= self.max_watchers:
+                raise TooManyWatchers("%d are already watching." % len(self._watchers))
+            self._watchers.add(watcher)
+            first_event = MirrorEvent(self.decoder.rows())
+        return self._events(watcher, first_event, keepalive)
+
+    def _events(self, watcher: _Watcher, first_event: str, keepalive: float):
+        try:
+            yield first_event
+            while True:
+                try:
+                    yield watcher.events.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                if watcher.behind and watcher.events.empty():
+                    with self._lock:
+                        watcher.behind = False
+                        catch_up = MirrorEvent(self.decoder.rows())
+                    yield catch_up
+        finally:  # The browser went away.
+            with self._lock:
+                self._watchers.discard(watcher)
+
+    def __len__(self):
+        return len(self._watchers)
@@ -0,0 +1,132 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I show what a text or image will look like on the display, without sending it there. The texts are typeset by the
+# same Typesetter that the display uses, only its published sequences are caught instead of sent to the broker.
+
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image
+
+from ledslie.config import Config
+from ledslie.messages import FrameSequence
+
+
+class _CapturingProtocol(object):
+    """
+    I stand in for the MQTT protocol of the typesetter and keep what it publishes.
+    """
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, message, qos=0, retain=False):
+        self.published.append((topic, message))
+
+
+class PreviewTypesetter(object):
+    def __init__(self):
+        """
+        I typeset messages for the typesetter topics and return the resulting sequence.
+        """
+        from ledslie.processors.typesetter import Typesetter
+        self._typesetter = Typesetter(None, None)
+        self._protocol = _CapturingProtocol()
+        self._typesetter.protocol = self._protocol
+        self._lock = threading.Lock()
+
+    def typeset(self, topic: str, payload) -> FrameSequence:
+        """
+        I return the sequence for payload sent to the typesetter topic. None if nothing would be shown.
+        """
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')  # As it arrives from the broker.
+        with self._lock:
+            del self._protocol.published[:]
+            self._typesetter.onPublish(topic, payload, qos=0, dup=False, retain=False, msgId=0)
+            if not self._protocol.published:
+                return None
+            seq_topic, seq_data = self._protocol.published[-1]
+        return FrameSequence().load(seq_data)
+
+
+def RenderPreview(sequence: FrameSequence, scale: int) -> tuple:
+    """
+    I render the frames of sequence scale times enlarged. A single frame becomes a PNG, more frames an animated GIF.
+    :return: Tuple with the image data and its mimetype.
+    :rtype: tuple
+    """
+    config = Config()
+    display_size = (config['DISPLAY_WIDTH'], config['DISPLAY_HEIGHT'])
+    preview_size = (display_size[0] * scale, display_size[1] * scale)
+    images = []
+    durations = []
+    for frame in sequence:
+        image = Image.frombytes("L", display_size, bytes(frame.raw()))
+        images.append(image.resize(preview_size, Image.NEAREST))  # Keep the LEDs sharp.
+        durations.append(frame.duration)
+    fp = io.BytesIO()
+    if len(images) == 1:
+        images[0].save(fp, format='PNG')
+        return fp.getvalue(), 'image/png'
+    images[0].save(fp, format='GIF', save_all=True, append_images=images[1:], duration=durations, loop=0)
+    return fp.getvalue(), 'image/gif'
+
+
+def PreviewDigest(*parts) -> str:
+    """
+    I return a digest of the parts that make up a preview request.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(len(part).to_bytes(8, 'little'))  # So the parts can't run into each other.
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class PreviewCache(object):
+    def __init__(self, max_entries: int):
+        """
+        I keep the most recently used previews.
+        :param max_entries: Number of previews kept.
+        :type max_entries: int
+        """
+        self.max_entries = max_entries
+        self._previews = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest: str):
+        with self._lock:
+            preview = self._previews.get(digest, None)
+            if preview is not None:
+                self._previews.move_to_end(digest)
+            return preview
+
+    def put(self, digest: str, preview) -> None:
+        with self._lock:
+            self._previews[digest] = preview
+            self._previews.move_to_end(digest)
+            while len(self._previews) > self.max_entries:
+                self._previews.popitem(last=False)
+
+    def __len__(self):
+        return len(self._previews)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I serve the site with gunicorn, behind nginx. Every worker process makes the app itself, so each has its own
+# connection to the MQTT broker, and serves requests from a pool of threads.
+#
+# Usage: python3 -m ledslie.interface.serve
+
+from flask import Config as FlaskConfig
+from gunicorn.app.base import BaseApplication
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+
+def ServerOptions(config) -> dict:
+    """
+    I return the gunicorn settings for the SITE_ settings in config.
+    """
+    return {
+        'bind': config['SITE_BIND'],
+        'workers': config['SITE_WORKERS'],
+        'worker_class': 'gthread',
+        'threads': config['SITE_THREADS'],
+        'keepalive': config['SITE_KEEPALIVE'],
+        'timeout': config['SITE_WORKER_TIMEOUT'],
+        'umask': 0o007,  # nginx, in the same group, connects to the socket.
+    }
+
+
+class SiteServer(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from ledslie.interface.site import make_app  # Made in the worker, after it is forked.
+        site_app = make_app()
+        site_app.wsgi_app = ProxyFix(site_app.wsgi_app, x_for=site_app.config['SITE_PROXY_HOPS'],
+                                     x_proto=site_app.config['SITE_PROXY_HOPS'])
+        return site_app
+
+
+def main():
+    config = FlaskConfig('.')
+    config.from_object('ledslie.defaults')
+    config.from_envvar('LEDSLIE_CONFIG')
+    SiteServer(ServerOptions(config)).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,21 +14,104 @@
 #     You should have received a copy of the GNU Affero General Public License
 #     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import base64
+import binascii
+import io
 import logging
 import json
+import math
 
-from PIL import Image, ImageSequence
-
-from werkzeug.exceptions import UnsupportedMediaType
-from flask import Flask, render_template, request, json, Response
-from flask_mqtt import Mqtt
+from werkzeug.exceptions import BadRequest, NotFound, ServiceUnavailable, UnsupportedMediaType, \
+    RequestEntityTooLarge, TooManyRequests
+from flask import Flask, render_template, request, json, Response, url_for
 
 from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_TYPESETTER_3LINES, \
-    LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_ALERT
-from ledslie.messages import FrameSequence, Frame
+    LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_ALERT, LEDSLIE_TOPIC_MIRROR, \
+    LEDSLIE_TOPIC_STATS_BASE, LEDSLIE_TOPIC_SCHEDULER_PROGRAMS, LEDSLIE_TOPIC_PLANNER, LEDSLIE_TOPIC_CHUNKS_PROGRAMS
+from ledslie.interface.broker import SiteMqtt
+from ledslie.interface.dashboard import ProgramBoard
+from ledslie.interface.bulk import BulkItems, BulkError, PublishBatch
+from ledslie.interface.ingest import IngestFrames, SequenceSummary, UnsupportedImage, ImageTooLarge
+from ledslie.interface.jobs import JobQueue, QueueFull
+from ledslie.interface.limits import IngressLimits, LimitExceeded
+from ledslie.interface.mirror import MirrorHub, TooManyWatchers
+from ledslie.interface.preview import PreviewTypesetter, PreviewCache, PreviewDigest, RenderPreview
+from ledslie.messages import ScheduledProgram, SequencePayloads
+from ledslie.tracing import StartTrace, STAGE_SITE
 
 app = Flask(__name__)
-mqtt = Mqtt()
+mqtt = SiteMqtt()
+_upload_jobs = None
+_preview_typesetter = None
+_preview_cache = None
+_mirror_hub = None
+_ingress_limits = None
+_program_board = None
+
+
+def upload_jobs() -> JobQueue:
+    global _upload_jobs
+    if _upload_jobs is None:
+        _upload_jobs = JobQueue(app.config['SITE_UPLOAD_WORKERS'], app.config['SITE_UPLOAD_MAX_PENDING'],
+                                app.config['SITE_UPLOAD_JOB_RETENTION'])
+    return _upload_jobs
+
+
+def preview_typesetter() -> PreviewTypesetter:
+    global _preview_typesetter
+    if _preview_typesetter is None:
+        _preview_typesetter = PreviewTypesetter()
+    return _preview_typesetter
+
+
+def preview_cache() -> PreviewCache:
+    global _preview_cache
+    if _preview_cache is None:
+        _preview_cache = PreviewCache(app.config['SITE_PREVIEW_CACHE_ENTRIES'])
+    return _preview_cache
+
+
+def mirror_hub() -> MirrorHub:
+    global _mirror_hub
+    if _mirror_hub is None:
+        _mirror_hub = MirrorHub(app.config['SITE_MIRROR_MAX_CLIENTS'], app.config['SITE_MIRROR_CLIENT_BACKLOG'])
+    return _mirror_hub
+
+
+def ingress_limits() -> IngressLimits:
+    global _ingress_limits
+    if _ingress_limits is None:
+        _ingress_limits = IngressLimits(app.config)
+    return _ingress_limits
+
+
+def program_board() -> ProgramBoard:
+    global _program_board
+    if _program_board is None:
+        _program_board = ProgramBoard(app.config['SITE_DASHBOARD_THUMBNAIL_WIDTH'])
+    return _program_board
+
+
+def check_limits(programs=(), texts=(), cost=1):
+    """
+    I refuse the request when it's over the limits of the site, before anything is published. Now and then the counters
+    of the limits are published, so it's visible when requests are refused.
+    """
+    limits = ingress_limits()
+    try:
+        limits.check(request.remote_addr, programs, request.content_length or 0, texts, cost)
+    except LimitExceeded as exc:
+        if exc.reason == 'size':
+            raise RequestEntityTooLarge(str(exc))
+        raise TooManyRequests(str(exc), retry_after=int(math.ceil(exc.retry_after)))
+    finally:
+        stats = limits.due_stats()
+        if stats is not None:
+            mqtt.publish(LEDSLIE_TOPIC_STATS_BASE + "SiteLimits", json.dumps(stats))
+
+
+def form_texts(form, fields) -> list:
+    return [form.get(field, '') for field in fields]
 
 
 @app.route('/')
@@ -36,96 +119,340 @@ def index():
     return render_template('index.html')
 
 
-def send_image(sequence, program_name):
+def send_image(sequence, program_name) -> list:
+    """
+    I publish sequence for program_name, in chunks when it's large. Chunks go with QoS 1 so none of them get lost.
+    :return: The payloads that were published.
+    """
     if not program_name:
         topic = LEDSLIE_TOPIC_SEQUENCES_UNNAMED
     else:
         topic = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + program_name
-    payload = sequence.serialize()
-    mqtt.publish(topic, payload)
-    return payload
+    payloads = SequencePayloads(topic, sequence)
+    for payload_topic, payload in payloads:
+        mqtt.publish(payload_topic, payload, qos=0 if len(payloads) == 1 else 1)
+    return [payload for payload_topic, payload in payloads]
 
 
 @app.route('/gif', methods=['POST'])
 def gif():
-    f = request.files['f']
     program = request.form['program']
+    check_limits(programs=[program])
+    f = request.files['f']
+    image_data = f.read()  # The upload is gone once the request is done.
     try:
-        im = Image.open(f)
-    except OSError:
-        raise UnsupportedMediaType()
-    sequence = FrameSequence()
-    for frame_raw in ImageSequence.Iterator(im):
-        image_data, duration = process_frame(frame_raw)
-        sequence.add_frame(Frame(image_data, duration))
-    payload = send_image(sequence, program)
-    return Response(payload, mimetype='application/json')
+        job = upload_jobs().submit(program, convert_image, image_data, program, form_dither(request.form))
+    except QueueFull as exc:
+        raise ServiceUnavailable(str(exc))
+    status = job.status()
+    status['status_url'] = url_for('job_status', job_id=job.id)
+    return Response(json.dumps(status), status=202, mimetype='application/json')
 
 
-@app.route('/text', methods=['POST'])
-def text1():
-    text = request.form['text']
-    duration = int(request.form['duration'])
-    program = request.form['program']
-    font_size = float(request.form['font_size'])
+def form_dither(form):
+    """
+    I return if the form asks for dithering. None when it doesn't say, so the configuration decides. The programs of a
+    bulk request can also say it with a JSON boolean.
+    """
+    if 'dither' not in form:
+        return None
+    value = form['dither']
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'on', 'true', 'yes')
+
+
+def convert_image(job, image_data, program, dither=None):
+    sequence, nr_of_source_frames = IngestFrames(io.BytesIO(image_data), progress=job.set_progress, dither=dither)
+    payloads = send_image(sequence, program)
+    summary = SequenceSummary(sequence, payloads, nr_of_source_frames)
+    summary['program'] = program
+    return summary
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = upload_jobs().get(job_id)
+    if job is None:
+        raise NotFound()
+    return Response(json.dumps(job.status()), mimetype='application/json')
+
+
+def text1_payload(form, trace=None) -> str:
     set_data = {
-        'text': text,
-        'program': program,
-        'duration': duration,
-        'font_size': font_size
+        'text': form['text'],
+        'program': form['program'],
+        'duration': int(form['duration']),
+        'font_size': float(form['font_size'])
     }
-    payload = json.dumps(set_data)
+    if trace is not None:
+        set_data['trace'] = trace
+    return json.dumps(set_data)
+
+
+def text3_payload(form, trace=None) -> str:
+    set_data = {
+        'lines': (form['l1'], form['l2'], form['l3']),
+        'duration': int(form['duration']),
+        'program': form['program'],
+        'size': form['font'],
+    }
+    if trace is not None:
+        set_data['trace'] = trace
+    return json.dumps(set_data)
+
+
+@app.route('/text', methods=['POST'])
+def text1():
+    check_limits(programs=[request.form.get('program')], texts=form_texts(request.form, ['text']))
+    payload = text1_payload(request.form, StartTrace(STAGE_SITE))
     mqtt.publish(LEDSLIE_TOPIC_TYPESETTER_1LINE, payload)
     return Response(payload, mimetype='application/json')
 
 
 @app.route('/text3', methods=['POST'])
 def text3():
-    lines = request.form['l1'], request.form['l2'], request.form['l3']
-    size = request.form['font']
-    duration = int(request.form['duration'])
-    program = request.form['program']
-    set_data = {
-        'lines': lines,
-        'duration': duration,
-        'program': program,
-        'size': size,
-    }
-    payload = json.dumps(set_data)
+    check_limits(programs=[request.form.get('program')], texts=form_texts(request.form, ['l1', 'l2', 'l3']))
+    payload = text3_payload(request.form, StartTrace(STAGE_SITE))
     mqtt.publish(LEDSLIE_TOPIC_TYPESETTER_3LINES, payload)
     return Response(payload, mimetype='application/json')
 
 
+def preview_response(digest, render):
+    """
+    I return the preview with digest from the cache, or render it with render() and cache it.
+    """
+    cache = preview_cache()
+    preview = cache.get(digest)
+    cache_status = 'hit'
+    if preview is None:
+        cache_status = 'miss'
+        sequence = render()
+        if sequence is None or sequence.is_empty():
+            raise UnsupportedMediaType("Nothing would be shown.")
+        preview = RenderPreview(sequence, app.config['SITE_PREVIEW_SCALE'])
+        cache.put(digest, preview)
+    image_data, mimetype = preview
+    response = Response(image_data, mimetype=mimetype)
+    response.headers['ETag'] = digest
+    response.headers['X-Preview-Cache'] = cache_status
+    return response
+
+
+@app.route('/preview/text', methods=['POST'])
+def preview_text1():
+    check_limits(texts=form_texts(request.form, ['text']))
+    payload = text1_payload(request.form)
+    digest = PreviewDigest(LEDSLIE_TOPIC_TYPESETTER_1LINE, payload)
+    return preview_response(digest, lambda: preview_typesetter().typeset(LEDSLIE_TOPIC_TYPESETTER_1LINE, payload))
+
+
+@app.route('/preview/text3', methods=['POST'])
+def preview_text3():
+    check_limits(texts=form_texts(request.form, ['l1', 'l2', 'l3']))
+    payload = text3_payload(request.form)
+    digest = PreviewDigest(LEDSLIE_TOPIC_TYPESETTER_3LINES, payload)
+    return preview_response(digest, lambda: preview_typesetter().typeset(LEDSLIE_TOPIC_TYPESETTER_3LINES, payload))
+
+
+@app.route('/preview/gif', methods=['POST'])
+def preview_gif():
+    check_limits()
+    image_data = request.files['f'].read()
+    dither = form_dither(request.form)
+
+    def ingest():
+        try:
+            return IngestFrames(io.BytesIO(image_data), dither=dither)[0]
+        except UnsupportedImage as exc:
+            raise UnsupportedMediaType(str(exc))
+        except ImageTooLarge as exc:
+            raise RequestEntityTooLarge(str(exc))
+    return preview_response(PreviewDigest('gif', repr(dither), image_data), ingest)
+
+
+@mqtt.on_topic(LEDSLIE_TOPIC_MIRROR)
+def handle_mirror(client, userdata, message):
+    mirror_hub().on_mirror(message.payload)
+
+
+@mqtt.on_topic(LEDSLIE_TOPIC_SCHEDULER_PROGRAMS)
+def handle_scheduler_programs(client, userdata, message):
+    program_board().on_programs(message.payload)
+
+
+@mqtt.on_topic(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS)
+def handle_sequence(client, userdata, message):
+    program_board().on_sequence(message.topic.split('/')[-1], message.payload)
+
+
+@mqtt.on_topic(LEDSLIE_TOPIC_CHUNKS_PROGRAMS)
+def handle_chunk(client, userdata, message):
+    program_board().on_chunk(message.topic.split('/')[-1], message.payload)
+
+
+@app.route('/dashboard')
+def dashboard():
+    board = program_board()
+    return render_template('dashboard.html', programs=board.programs(), now=board.now(), live_known=board.live is not None)
+
+
+@app.route('/dashboard/<program_name>.png')
+def dashboard_thumbnail(program_name):
+    thumbnail = program_board().thumbnail(program_name)
+    if thumbnail is None:
+        raise NotFound()
+    image_data, digest = thumbnail
+    response = Response(image_data, mimetype='image/png')
+    response.set_etag(digest)
+    return response.make_conditional(request)
+
+
+@app.route('/mirror')
+def mirror():
+    return render_template('mirror.html', width=app.config['DISPLAY_WIDTH'], height=app.config['DISPLAY_HEIGHT'])
+
+
+@app.route('/mirror/events')
+def mirror_events():
+    try:
+        events = mirror_hub().watch(app.config['SITE_MIRROR_KEEPALIVE'])
+    except TooManyWatchers as exc:
+        raise ServiceUnavailable(str(exc))
+    response = Response(events, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Don't let nginx hold back the events.
+    return response
+
+
+def alert_payload(form, trace=None) -> str:
+    set_data = {
+        'text': form['text'],
+        'who': form['who'],
+    }
+    if trace is not None:
+        set_data['trace'] = trace
+    return json.dumps(set_data)
+
+
 @app.route('/alert', methods=['POST'])
 def alert():
-    text = request.form['text']
-    who = request.form['who']
     alert_type = "spacealert"
-    set_data = {
-        'text': text,
-        'who': who,
-    }
-    payload = json.dumps(set_data)
+    check_limits(programs=['alert'], texts=form_texts(request.form, ['text', 'who']))
+    payload = alert_payload(request.form, StartTrace(STAGE_SITE))
     mqtt.publish(LEDSLIE_TOPIC_ALERT + alert_type, payload)
     return Response(payload, mimetype='application/json')
 
 
-def process_frame(frame_raw):
-    frame = frame_raw.copy()
-    if (app.config.get("DISPLAY_WIDTH"), app.config.get("DISPLAY_HEIGHT")) != frame.size:
-        frame = frame.resize((app.config.get("DISPLAY_WIDTH"), app.config.get("DISPLAY_HEIGHT")))
-    frame_image = frame.convert("L")
-    encoded_image = frame_image.tobytes()
-    if 'duration' in frame.info:
-        duration = frame.info.get('duration')
-    else:
-        duration = app.config.get("DISPLAY_DEFAULT_DELAY")
-    return bytearray(encoded_image), duration
+BULK_TEXT_TYPES = {  # The types of bulk items that go to the typesetter, with their topic and payload.
+    'text': (LEDSLIE_TOPIC_TYPESETTER_1LINE, text1_payload),
+    'text3': (LEDSLIE_TOPIC_TYPESETTER_3LINES, text3_payload),
+    'alert': (LEDSLIE_TOPIC_ALERT + "spacealert", alert_payload),
+}
+
+
+@app.route('/programs', methods=['POST'])
+def programs():
+    """
+    I publish a list of programs. Each program is an object with a "type" of text, text3, alert or gif and the same
+    fields as the form for that type. The image of a gif is base64 encoded in "f".
+    """
+    try:
+        items = BulkItems(request.get_json(force=True, silent=True), app.config['SITE_BULK_MAX_ITEMS'])
+    except BulkError as exc:
+        raise BadRequest(str(exc))
+    dict_items = [item for item in items if isinstance(item, dict)]
+    item_programs = ['alert' if item.get('type') == 'alert' else item.get('program') for item in dict_items]
+    item_texts = [value for item in dict_items for key, value in item.items() if key != 'f' and isinstance(value, str)]
+    check_limits(programs=[program for program in item_programs if isinstance(program, str)], texts=item_texts,
+                 cost=max(1, len(items)))
+    results = []
+    messages = []
+    for item_nr, item in enumerate(items):
+        result = {'item': item_nr}
+        results.append(result)
+        try:
+            if not isinstance(item, dict):
+                raise TypeError("Expected an object.")
+            item_type = item['type']
+            if item_type == 'gif':
+                image_data = base64.b64decode(item['f'], validate=True)
+                job = upload_jobs().submit(item['program'], convert_image, image_data, item['program'],
+                                           form_dither(item))
+                result.update(status='queued', job=job.id, status_url=url_for('job_status', job_id=job.id))
+                continue
+            if item_type not in BULK_TEXT_TYPES:
+                raise ValueError("Unknown type '%s'." % item_type)
+            topic, make_payload = BULK_TEXT_TYPES[item_type]
+            messages.append((topic, make_payload(item), result))
+        except KeyError as exc:
+            result.update(status='invalid', error="Missing field %s." % exc)
+        except (ValueError, TypeError, AttributeError, binascii.Error) as exc:
+            result.update(status='invalid', error=str(exc))
+        except QueueFull as exc:
+            result.update(status='failed', error=str(exc))
+    errors = PublishBatch(mqtt.client, [(topic, payload) for topic, payload, result in messages], 1,
+                          app.config['SITE_BULK_PUBLISH_TIMEOUT'])
+    for (topic, payload, result), error in zip(messages, errors):
+        if error is None:
+            result.update(status='published', topic=topic)
+        else:
+            result.update(status='failed', error=error)
+    return Response(json.dumps({'results': results}), mimetype='application/json')
+
+
+@app.route('/schedule', methods=['POST'])
+def schedule_program():
+    """
+    I schedule a program. The program is an object with a "type" of text or text3 and the same fields as the form for
+    that type, with the "start" and "end" time in seconds since the epoch. It's shown again every "every" seconds when
+    that is given, until the time in "until".
+    """
+    item = request.get_json(force=True, silent=True)
+    if not isinstance(item, dict):
+        raise BadRequest("Expected an object.")
+    program = item.get('program')
+    check_limits(programs=[program] if isinstance(program, str) else [],
+                 texts=[value for value in item.values() if isinstance(value, str)])
+    if item.get('type') not in ('text', 'text3'):
+        raise BadRequest("Only text and text3 programs can be scheduled.")
+    topic, make_payload = BULK_TEXT_TYPES[item['type']]
+    try:
+        payload = make_payload(item)
+    except KeyError as exc:
+        raise BadRequest("Missing field %s." % exc)
+    except (ValueError, TypeError) as exc:
+        raise BadRequest(str(exc))
+    plan_data = {
+        'program': program,
+        'topic': topic,
+        'payload': payload,
+        'start': item.get('start'),
+        'end': item.get('end'),
+        'every': item.get('every'),
+        'until': item.get('until'),
+    }
+    problem = ScheduledProgram.problem(plan_data)
+    if problem is not None:
+        raise BadRequest(problem)
+    plan = json.dumps(plan_data)
+    mqtt.publish(LEDSLIE_TOPIC_PLANNER[:-1] + program, plan, qos=1)
+    return Response(plan, mimetype='application/json')
+
+
+@app.route('/schedule/<program_name>', methods=['DELETE'])
+def cancel_schedule(program_name):
+    check_limits(programs=[program_name])
+    if '+' in program_name or '#' in program_name:
+        raise BadRequest("Program name is not valid.")
+    mqtt.publish(LEDSLIE_TOPIC_PLANNER[:-1] + program_name, b'', qos=1)
+    return Response(status=204)
 
 
 def make_app():
     app.config.from_object('ledslie.defaults')
     app.config.from_envvar('LEDSLIE_CONFIG')
+    app.config['MAX_CONTENT_LENGTH'] = app.config['SITE_MAX_UPLOAD_BYTES']
     mqtt.init_app(app)
     print("broker url: %s. port: %s." % (mqtt.broker_url, mqtt.broker_port))
     return app
@@ -1,11 +1,14 @@
 import base64
 import json
+import uuid
 
 import binascii
 from twisted.logger import Logger
 
 from ledslie.config import Config
-from ledslie.definitions import ALERT_PRIO_STRING
+from ledslie.tracing import CheckTrace
+from ledslie.definitions import ALERT_PRIO_STRING, LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_TYPESETTER_3LINES, \
+    LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_CHUNKS_UNNAMED
 
 log = Logger()
 
@@ -36,16 +39,28 @@ class GenericMessage(object):
         return data
 
 
+def LoadMessage(message_cls, payload):
+    """
+    I return payload as a message of message_cls. A message that was handed over within the process is used as it is,
+    otherwise it's loaded from the payload.
+    """
+    if isinstance(payload, message_cls):
+        return payload
+    return message_cls().load(payload)
+
+
 class GenericProgram(GenericMessage):
     def __init__(self):
         super().__init__()
         self.program = None
         self.valid_time = self._config['PROGRAM_RETIREMENT_AGE']
+        self.trace = None  # See ledslie.tracing.
 
     def load(self, prog_data):
         self.program = prog_data.get('program', None)
         self.valid_time = min(prog_data.get('valid_time', self.valid_time),
                               self._config['PROGRAM_RETIREMENT_AGE'])
+        self.trace = CheckTrace(prog_data.get('trace', None))
 
 class Frame(GenericMessage):
     def __init__(self, img_data: bytearray, duration: int):
@@ -62,11 +77,46 @@ class Frame(GenericMessage):
         return len(self.img_data)
 
 
+class ViewportFrame(Frame):
+    """
+    I am a frame that shows a display sized part of a larger image strip, starting at pixel offset. That is a column
+    of a strip wider than the display, or the start of a row of a strip taller than it. My image data is only created
+    when asked for, so a sequence of viewports keeps just the strip in memory.
+    """
+    def __init__(self, strip: bytes, strip_width: int, offset: int, duration: int):
+        self.strip = strip
+        self.strip_width = strip_width
+        self.offset = offset
+        self.duration = duration
+
+    @property
+    def img_data(self):
+        return self.raw()
+
+    def serialize(self):
+        return None, {'duration': self.duration, 'offset': self.offset}
+
+    def raw(self):
+        config = Config()
+        width = config['DISPLAY_WIDTH']
+        start = self.offset
+        rows = []
+        for row in range(config['DISPLAY_HEIGHT']):
+            rows.append(self.strip[start:start+width])
+            start += self.strip_width
+        return bytearray().join(rows)
+
+    def __len__(self):
+        return Config()['DISPLAY_SIZE']
+
+
 class FrameSequence(GenericProgram):
     def __init__(self):
         super().__init__()
         self.name = None
         self.frames = []
+        self.strip = None  # Image larger than the display that ViewportFrames look into.
+        self.strip_width = None
         self.prio = None
         self.frame_nr = -1
         self.program_id = None
@@ -74,26 +124,88 @@ class FrameSequence(GenericProgram):
 
     def load(self, payload: bytearray):
         seq_images, seq_info = json.loads(payload.decode())
+        return self.load_parts(seq_images, seq_info)
+
+    def load_parts(self, seq_images: list, seq_info: dict):
         super().load(seq_info)
         self.prio = seq_info.get('prio', self.prio)
         self.alert_count = min(seq_info.get('alert_count', self.alert_count), self._config['ALERT_INITIAL_REPEAT'])
+        if 'strip' in seq_info and not self._load_strip(seq_info['strip']):
+            return
+        if not self.load_frames(seq_images):
+            return
+        return self
+
+    def load_frames(self, seq_images: list) -> bool:
+        """
+        I add the serialized frames of seq_images. Views on the strip need the strip to be there already.
+        :return: False when a frame can't be read.
+        """
         for image_data_encoded, image_info in seq_images:
+            if image_data_encoded is None:  # A view on the strip.
+                viewport = self._load_viewport(image_info)
+                if viewport is None:
+                    return False
+                self.frames.append(viewport)
+                continue
             try:
                 image_data = bytearray(DeserializeFrame(image_data_encoded))
             except binascii.Error:
-                return
+                return False
             if len(image_data) != self._config.get('DISPLAY_SIZE'):
                 log.error("Frame is of the wrong length %d, expected %d. Ignoring." % (
                     len(image_data), self._config.get('DISPLAY_SIZE')))
-                return
+                return False
             try:
                 image_duration = image_info.get('duration', self._config['DISPLAY_DEFAULT_DELAY'])
             except KeyError:
                 break
             self.frames.append(Frame(image_data, duration=image_duration))
-        return self
+        return True
 
-    def serialize(self):
+    def _load_strip(self, strip_info: dict) -> bool:
+        try:
+            strip = DeserializeFrame(strip_info['data'])
+            strip_width = int(strip_info['width'])
+        except (binascii.Error, KeyError, TypeError, ValueError, AttributeError):
+            log.error("Strip information can not be read. Ignoring.")
+            return False
+        if (strip_width < self._config['DISPLAY_WIDTH'] or len(strip) % strip_width
+                or len(strip) < strip_width * self._config['DISPLAY_HEIGHT']):
+            log.error("Strip is of the wrong size %d for width %d. Ignoring." % (len(strip), strip_width))
+            return False
+        self.set_strip(strip, strip_width)
+        return True
+
+    def _load_viewport(self, image_info: dict):
+        offset = image_info.get('offset', 0)
+        if self.strip is None or not self._in_strip(offset):
+            log.error("Viewport at offset %s is outside of the strip. Ignoring." % offset)
+            return None
+        image_duration = image_info.get('duration', self._config['DISPLAY_DEFAULT_DELAY'])
+        return ViewportFrame(self.strip, self.strip_width, offset, image_duration)
+
+    def _in_strip(self, offset) -> bool:
+        if not isinstance(offset, int) or offset < 0:
+            return False
+        row, column = divmod(offset, self.strip_width)
+        strip_height = len(self.strip) // self.strip_width
+        return (column <= self.strip_width - self._config['DISPLAY_WIDTH']
+                and row <= strip_height - self._config['DISPLAY_HEIGHT'])
+
+    def set_strip(self, strip: bytes, strip_width: int):
+        """
+        I set the image strip that the ViewportFrames of this sequence show a part of. A sequence has only one strip.
+        :param strip: The image data of the strip. Rows of strip_width pixels each, at least as many as the display.
+        :type strip: bytes
+        :param strip_width: Number of pixels each row of the strip is wide.
+        :type strip_width: int
+        """
+        assert self.strip is None, "Sequence already has a strip."
+        self.strip = bytes(strip)
+        self.strip_width = strip_width
+
+    def _serialize_images(self) -> list:
         images = []
         for frame in self.frames:
             if hasattr(frame, 'serialize'):
@@ -101,10 +213,48 @@ class FrameSequence(GenericProgram):
             else:
                 idata, iinfo = frame
                 images.append((SerializeFrame(idata), iinfo))
+        return images
+
+    def _sequence_info(self) -> dict:
         sequence_info = {}
         if self.prio is not None:
             sequence_info['prio'] = self.prio
-        return bytearray(json.dumps((images, sequence_info)), 'utf-8')
+        if self.strip is not None:
+            sequence_info['strip'] = {'data': SerializeFrame(self.strip), 'width': self.strip_width}
+        if self.trace is not None:
+            sequence_info['trace'] = self.trace
+        return sequence_info
+
+    def serialize(self):
+        return bytearray(json.dumps((self._serialize_images(), self._sequence_info())), 'utf-8')
+
+    def serialize_chunks(self, max_bytes: int, transfer_id: str) -> list:
+        """
+        I return the sequence serialized, in one payload when it's at most max_bytes. Otherwise I split it between
+        frames in chunks of about max_bytes, that are sequences themselves with a 'chunk' field that tells the
+        transfer_id, the number of the chunk and the number of chunks. The first chunk has the strip and the rest of
+        the information of the sequence, so it can be larger.
+        """
+        images = self._serialize_images()
+        sequence_info = self._sequence_info()
+        payload = bytearray(json.dumps((images, sequence_info)), 'utf-8')
+        if not max_bytes or len(payload) <= max_bytes:
+            return [payload]
+        groups = [[]]
+        group_size = 0
+        for image in images:
+            image_size = len(json.dumps(image)) + 2
+            if groups[-1] and group_size + image_size > max_bytes:
+                groups.append([])
+                group_size = 0
+            groups[-1].append(image)
+            group_size += image_size
+        chunks = []
+        for nr, group in enumerate(groups):
+            chunk_info = dict(sequence_info) if nr == 0 else {}
+            chunk_info['chunk'] = {'id': transfer_id, 'nr': nr, 'of': len(groups)}
+            chunks.append(bytearray(json.dumps((group, chunk_info)), 'utf-8'))
+        return chunks
 
     @property
     def duration(self):
@@ -136,6 +286,9 @@ class FrameSequence(GenericProgram):
     def is_empty(self):
         return len(self) == 0
 
+    def __iter__(self):
+        return iter(self.frames)
+
     def __len__(self):
         return len(self.frames)
 
@@ -143,6 +296,38 @@ class FrameSequence(GenericProgram):
         return self.frames[nr]
 
 
+def SequencePayloads(topic: str, sequence: FrameSequence) -> list:
+    """
+    I return the topics and payloads to publish sequence on topic with. A sequence larger than SEQUENCE_CHUNK_BYTES is
+    split in chunks, that go to the chunks topic of the program, see ledslie.processors.chunks.
+    """
+    if topic != LEDSLIE_TOPIC_SEQUENCES_UNNAMED and not topic.startswith(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1]):
+        return [(topic, sequence.serialize())]
+    payloads = sequence.serialize_chunks(Config()['SEQUENCE_CHUNK_BYTES'], uuid.uuid4().hex[:12])
+    if len(payloads) == 1:
+        return [(topic, payloads[0])]
+    chunk_topic = LEDSLIE_TOPIC_CHUNKS_UNNAMED + topic[len(LEDSLIE_TOPIC_SEQUENCES_UNNAMED):]
+    return [(chunk_topic, payload) for payload in payloads]
+
+
+class TickerLayout(GenericProgram):
+    def __init__(self):
+        super().__init__()
+        self.items = []
+        self.replace = True  # Replace the items of a running ticker. When False, items are appended.
+        self.size = None
+        self.duration = None
+
+    def load(self, payload):
+        obj_data = json.loads(payload.decode())
+        super().load(obj_data)
+        self.items = [str(item) for item in obj_data.get('items', [])]
+        self.replace = obj_data.get('replace', True)
+        self.size = obj_data.get('size', None)
+        self.duration = obj_data.get('duration', None)
+        return self
+
+
 class EmptyProgram(GenericProgram):
     def __init__(self, program_name):
         super().__init__()
@@ -166,11 +351,13 @@ class TextSingleLineLayout(GenericTextLayout):
         super().__init__()
         self.text = ""
         self.font_size = None
+        self.marquee = True  # Scroll the text when it doesn't fit the display.
 
     def load(self, payload):
         obj_data = super(TextSingleLineLayout, self).load(payload)
         self.text = obj_data.get('text', "")
         self.font_size = obj_data.get('font_size', None)
+        self.marquee = obj_data.get('marquee', True)
         return self
 
 
@@ -180,12 +367,16 @@ class TextTripleLinesLayout(GenericTextLayout):
         self.lines = []
         self.size = '8x8'
         self.line_duration = None
+        self.proportional = False  # Characters only take the width they need instead of the full font width.
+        self.wrap = False  # Each of the lines is a paragraph that is wrapped to fit the display.
 
     def load(self, payload):
         obj_data = super(TextTripleLinesLayout, self).load(payload)
         self.lines = obj_data.get('lines', [])
         self.size  = obj_data.get('size', '8x8')
         self.line_duration = obj_data.get('line_duration', None)
+        self.proportional = obj_data.get('proportional', False)
+        self.wrap = obj_data.get('wrap', False)
         return self
 
 
@@ -200,3 +391,102 @@ class TextAlertLayout(GenericTextLayout):
         self.text = obj_data.get('text', "")
         self.who = obj_data.get('who', "")
         return self
+
+
+class ScheduledProgram(GenericMessage):
+    """
+    I am a program that is shown from start till end, times in seconds since the epoch. When every is set I come back
+    every that many seconds, until the time in until if that is set. I carry the message that makes the program and the
+    topic it is published on.
+    """
+    def __init__(self):
+        super().__init__()
+        self.program = None
+        self.topic = None
+        self.payload = None
+        self.start = None
+        self.end = None
+        self.every = None
+        self.until = None
+        self.active = False  # The program was published and not removed since.
+
+    def load(self, payload, program: str=None):
+        """
+        I load the schedule from the JSON payload. program is the name of the program, when it's not in the payload.
+        I return None when the schedule is not valid.
+        """
+        try:
+            obj_data = json.loads(bytes(payload).decode())
+        except (ValueError, TypeError) as exc:
+            log.error("Schedule is not JSON: %s" % exc)
+            return None
+        if isinstance(obj_data, dict) and program is not None:
+            obj_data.setdefault('program', program)
+            if obj_data['program'] != program:
+                log.error("Schedule is for program '%s', not '%s'." % (obj_data['program'], program))
+                return None
+        problem = self.problem(obj_data)
+        if problem is not None:
+            log.error("Schedule of '%s' is not valid: %s" % (program, problem))
+            return None
+        self.program = obj_data['program']
+        self.topic = obj_data.get('topic', LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + self.program)
+        self.payload = obj_data['payload']
+        self.start = obj_data['start']
+        self.end = obj_data['end']
+        self.every = obj_data.get('every', None)
+        self.until = obj_data.get('until', None)
+        self.active = bool(obj_data.get('active', False))
+        return self
+
+    @staticmethod
+    def problem(obj_data) -> str:
+        """
+        I return what is wrong with the schedule in obj_data, None when it's fine.
+        """
+        if not isinstance(obj_data, dict):
+            return "Expected an object."
+        program = obj_data.get('program', None)
+        if not isinstance(program, str) or not program or '/' in program or '+' in program or '#' in program:
+            return "Program name is missing or not valid."
+        topic = obj_data.get('topic', LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + program)
+        if topic not in (LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_TYPESETTER_3LINES,
+                         LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + program):
+            return "Programs can't be scheduled on topic '%s'." % topic
+        payload = obj_data.get('payload', None)
+        if not isinstance(payload, str) or not payload:
+            return "Payload is missing."
+        if topic != LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + program:
+            try:
+                layout = json.loads(payload)
+            except ValueError:
+                return "Payload for the typesetter is not JSON."
+            if not isinstance(layout, dict) or layout.get('program', None) != program:
+                return "Payload for the typesetter is not for program '%s'." % program
+        for field in ('start', 'end', 'every', 'until'):
+            value = obj_data.get(field, None)
+            if value is None and field in ('every', 'until'):
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                return "Field %s is not a number." % field
+        if obj_data['end'] <= obj_data['start']:
+            return "End is not after start."
+        every = obj_data.get('every', None)
+        if every is not None and every < obj_data['end'] - obj_data['start']:
+            return "Repeats before it ends."
+        if every is not None and every < Config()['PLANNER_MIN_REPEAT']:
+            return "Repeats more often than every %d seconds." % Config()['PLANNER_MIN_REPEAT']
+        return None
+
+    def occurrence(self, now: float):
+        """
+        I return the start and end of the time I'm shown that is now, or else the next. None when I'm not shown again.
+        """
+        start, end = self.start, self.end
+        if self.every is not None and now >= end:
+            skipped = int((now - end) // self.every) + 1
+            start += skipped * self.every
+            end += skipped * self.every
+        if now >= end or (self.until is not None and start >= self.until):
+            return None
+        return start, end
@@ -0,0 +1,160 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I keep the numbers a service publishes about itself on «ledslie/stats/1/» + «service name».
+#
+# Updating a counter or a histogram is an addition and a lookup, so they can be used on the paths that run for each
+# frame. Gauges that are expensive to know, like the size of the catalog, are given a function that is only called when
+# the stats are published. Counters and histograms count from the start of the service; readers take the difference
+# between two messages to know what happened in between.
+
+import json
+import time
+from bisect import bisect_left
+
+from twisted.logger import Logger
+
+log = Logger()
+
+TIME_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)  # Seconds.
+
+
+class Counter(object):
+    """
+    I count how often something happened.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1) -> None:
+        self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge(object):
+    """
+    I hold a value that goes up and down. When I have a function, the value is what it returns when asked.
+    """
+    __slots__ = ('value', 'func')
+
+    def __init__(self, func=None):
+        self.value = 0
+        self.func = func
+
+    def set(self, value) -> None:
+        self.value = value
+
+    def snapshot(self):
+        if self.func is not None:
+            return self.func()
+        return self.value
+
+
+class _Timing(object):
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Histogram(object):
+    """
+    I count values in buckets, with the upper bounds of the buckets in bounds. Values above the last bound go in an
+    extra bucket.
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds: tuple=TIME_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def observe(self, value) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def time(self) -> _Timing:
+        """
+        I return a context manager that adds the seconds its block took.
+        """
+        return _Timing(self)
+
+    def snapshot(self) -> dict:
+        buckets = [[bound, nr] for bound, nr in zip(self.bounds + (None,), self.counts) if nr]
+        return {'count': self.count, 'sum': round(self.total, 6), 'max': round(self.max, 6), 'buckets': buckets}
+
+
+class Registry(object):
+    def __init__(self):
+        """
+        I keep the counters, gauges and histograms of a service by their name.
+        """
+        self._metrics = {}
+
+    def _get(self, name, cls, *args):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(*args)
+        assert isinstance(metric, cls), "Metric %s is a %s, not a %s" % (name, type(metric).__name__, cls.__name__)
+        return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def gauge(self, name: str, func=None) -> Gauge:
+        """
+        I return gauge name. When func is given, it's the function that tells the value of the gauge.
+        """
+        gauge = self._get(name, Gauge)
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(self, name: str, bounds: tuple=TIME_BUCKETS) -> Histogram:
+        return self._get(name, Histogram, bounds)
+
+    def snapshot(self) -> dict:
+        """
+        I return the values of all metrics. Gauges whose function fails are left out.
+        """
+        values = {}
+        for name, metric in self._metrics.items():
+            try:
+                values[name] = metric.snapshot()
+            except Exception as exc:
+                log.error("Metric {name} failed: {exc!r}", name=name, exc=exc)
+        return values
+
+    def serialize(self) -> bytes:
+        return json.dumps(self.snapshot(), sort_keys=True, separators=(',', ':')).encode()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ============
+#
+# I run the typesetter, the scheduler and the content producers of ALLINONE_CONTENT in one process. They talk to each
+# other over a TopicBus. The MQTT broker is only used for the clients outside the process, like the site: messages on
+# the topics the typesetter and scheduler listen to come in from the broker, and messages on ALLINONE_EXPORT_TOPICS go
+# out to it.
+#
+# This replaces the ledslie-typesetter and ledslie-scheduler services and the services of the hosted content producers;
+# don't run those next to me.
+
+import importlib
+
+from twisted.internet import reactor
+from twisted.logger import Logger
+
+from ledslie.config import Config
+from ledslie.processors.bus import TopicBus, BusProtocol, BusBridge
+from ledslie.processors.scheduler import Scheduler, AttachScreen
+from ledslie.processors.service import CreateService
+from ledslie.processors.typesetter import Typesetter
+
+log = Logger()
+
+
+def ImportClass(dotted_name: str):
+    """
+    I return the class named by dotted_name, like 'ledslie.content.rain.RainContent'.
+    """
+    module_name, class_name = dotted_name.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def HostService(service, bus: TopicBus):
+    """
+    I connect service to bus, in the way it would otherwise connect to the MQTT broker.
+    """
+    service._system_name = service.__class__.__name__
+    service.connectToBroker(BusProtocol(bus))
+    return service
+
+
+def RunAllInOne(bus: TopicBus) -> BusBridge:
+    """
+    I start the services on bus, and the bridge that connects bus to the MQTT broker.
+    """
+    config = Config()
+    bridge = CreateService(BusBridge)
+    processors = [HostService(Typesetter(None, None), bus), HostService(Scheduler(None, None), bus)]
+    AttachScreen(processors[1])
+    for dotted_name in config['ALLINONE_CONTENT']:
+        log.info("Hosting {name}", name=dotted_name)
+        HostService(ImportClass(dotted_name)(None, None), bus)
+    import_topics = [topic for processor in processors for topic, qos in processor.subscriptions]
+    bridge.attach(bus, import_topics, config['ALLINONE_EXPORT_TOPICS'])
+    return bridge
+
+
+if __name__ == '__main__':
+    Config(envvar_silent=False)
+    RunAllInOne(TopicBus(reactor))
+    reactor.run()
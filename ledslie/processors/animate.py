@@ -19,26 +19,30 @@
 #
 # Animation routines.
 
-from ledslie.config import Config
-from ledslie.messages import FrameSequence, Frame
+import math
+from typing import Iterable
+
+from ledslie.config import Settings
+from ledslie.messages import FrameSequence, Frame, ViewportFrame
 
 
 def AnimateStill(still: Frame):
     """
-    I take a frame and create a sequence where the duration of the frame is visible.
+    I take a frame and create a sequence where the duration of the frame is visible. The frame itself is left as it
+    is, as it can be shared with other subscribers of the bus.
     :param still: The image to animate.
     :type still: Frame
     :return: The sequence of frames with the time animation.
     :rtype: FrameSequence
     """
     seq = FrameSequence()
-    width, height = Config().get('DISPLAY_WIDTH'), Config().get('DISPLAY_HEIGHT')
+    settings = Settings()
+    width, height = settings.DISPLAY_WIDTH, settings.DISPLAY_HEIGHT
     seq_duration = still.duration
     if not seq_duration:
-        seq_duration = Config()['DISPLAY_DEFAULT_DELAY']
+        seq_duration = settings.DISPLAY_DEFAULT_DELAY
     steps_ms = int(seq_duration / height)
     still_img = still.raw()
-    still.duration = steps_ms
     for nr in range(height):
         frame = bytearray(still_img)
         frame[width*nr-1] = 0xff
@@ -47,31 +51,100 @@ def AnimateStill(still: Frame):
     return seq
 
 
-def AnimateVerticalScroll(image: bytearray, line_duration: int) -> list:
+def AnimateVerticalScroll(seq: FrameSequence, line_images: Iterable, line_duration: int,
+                          line_height: int=8) -> FrameSequence:
     """
-    I let the content of a longer image scroll vertically up.
-    :param image: The image that there is to scroll.
-    :type image: bytearray
+    I let lines of text scroll vertically up. The images of the lines are put under each other in one strip, and the
+    frames are views on the strip. So the strip is the only image kept in memory and sent to the scheduler, however
+    many lines scroll by.
+    :param seq: The sequence to add the scrolling frames to.
+    :type seq: FrameSequence
+    :param line_images: The images of the lines, each the width of the display.
+    :type line_images: Iterable
     :param line_duration: The duration in ms that each line should be shown.
     :type line_duration: int
-    :return: List of frames that make up the scrolling motion.
-    :rtype: list
+    :param line_height: The number of rows of each line.
+    :type line_height: int
+    :return: The sequence with the scrolling frames added.
+    :rtype: FrameSequence
+    """
+    settings = Settings()
+    display_width = settings.DISPLAY_WIDTH
+    animate_duration = settings.TYPESETTER_ANIMATE_VERTICAL_SCROLL_DELAY
+    strip = bytearray()
+    for line_image in line_images:
+        strip.extend(line_image)
+    last_row = max(0, int(len(strip) / display_width) - settings.DISPLAY_HEIGHT)
+    strip.extend(bytearray(settings.DISPLAY_SIZE - min(len(strip), settings.DISPLAY_SIZE)))  # At least the display.
+    seq.set_strip(strip, display_width)
+    frames = []
+    for row in range(last_row):
+        duration = line_duration if row % line_height == 0 else animate_duration  # On a full line, show for longer.
+        frames.append(ViewportFrame(seq.strip, display_width, row * display_width, duration))
+    frames.append(ViewportFrame(seq.strip, display_width, last_row * display_width, line_duration))
+    seq.extend(frames)
+    return seq
+
+
+def SerialFrameTime() -> int:
+    """
+    I return the number of milliseconds it takes to send one frame over the serial link to the display. Showing
+    frames faster than this only makes the serial output fall behind.
+    :return: Milliseconds per frame.
+    :rtype: int
+    """
+    settings = Settings()
+    frame_bits = (settings.DISPLAY_SIZE + 1) * 10  # The frame and its end marker, each byte with start and stop bit.
+    return int(math.ceil(frame_bits * 1000 / settings.SERIAL_BAUDRATE))
+
+
+def ScrollTiming(speed: int, frame_delay: int) -> tuple:
+    """
+    I work out how to scroll at a speed without sending frames faster than the serial link can take them.
+    :param speed: The scroll speed in pixels per second.
+    :type speed: int
+    :param frame_delay: The wanted delay in ms between the frames.
+    :type frame_delay: int
+    :return: Tuple with the frame delay in ms and the number of pixels to move each frame.
+    :rtype: tuple
     """
-    config = Config()
-    display_width = config['DISPLAY_WIDTH']
-    animate_duration = config['TYPESETTER_ANIMATE_VERTICAL_SCROLL_DELAY']
-    nr_of_lines = len(image) / display_width  # nr of lines does the whole image has.
-    nr_of_scroll = int(nr_of_lines - config['DISPLAY_HEIGHT'])  # number of lines there are to scroll
-    f_start = 0
-    f_end = config['DISPLAY_SIZE']
+    frame_delay = max(frame_delay, SerialFrameTime())
+    step = max(1, round(speed * frame_delay / 1000))  # Larger steps keep the speed when frames are slower.
+    return frame_delay, step
+
+
+def AnimateHorizontalScroll(seq: FrameSequence, strip: bytes, strip_width: int, duration=None) -> FrameSequence:
+    """
+    I let an image strip that is wider than the display scroll by from right to left. The frames are views on the
+    strip, so the strip is the only image kept in memory.
+    :param seq: The sequence to add the scrolling frames to.
+    :type seq: FrameSequence
+    :param strip: The image data of the strip, rows of strip_width pixels.
+    :type strip: bytes
+    :param strip_width: The width in pixels of the strip.
+    :type strip_width: int
+    :param duration: Total duration in ms. The time not needed for scrolling is spent showing the begin and the end
+        of the strip. When None, these are shown for TYPESETTER_MARQUEE_HOLD.
+    :type duration: int
+    :return: The sequence with the scrolling frames added.
+    :rtype: FrameSequence
+    """
+    settings = Settings()
+    frame_delay, step = ScrollTiming(settings.TYPESETTER_MARQUEE_SPEED, settings.TYPESETTER_MARQUEE_FRAME_DELAY)
+    last_offset = strip_width - settings.DISPLAY_WIDTH
+    offsets = list(range(0, last_offset, step)) + [last_offset]
+    if duration is None:
+        hold_duration = settings.TYPESETTER_MARQUEE_HOLD
+    else:
+        scroll_duration = (len(offsets) - 2) * frame_delay
+        hold_duration = max(frame_delay, int((duration - scroll_duration) / 2))
+    seq.set_strip(strip, strip_width)
     frames = []
-    for nr in range(nr_of_scroll):
-        if nr % 8 == 0:  # On a full line, show for longer.
-            duration = line_duration
-        else:
-            duration = animate_duration
-        frames.append(Frame(image[f_start:f_end], duration=duration))
-        f_start += display_width
-        f_end += display_width
-    frames.append(Frame(image[-config['DISPLAY_SIZE']:], duration=line_duration))
-    return frames
+    for offset in offsets:
+        frame_duration = hold_duration if offset in (0, last_offset) else frame_delay
+        frames.append(ViewportFrame(seq.strip, strip_width, offset, frame_duration))
+    missing_duration = 0 if duration is None else duration - sum([f.duration for f in frames])
+    if missing_duration > 0:
+        frames[-1].duration += missing_duration  # Add the ms missing because of the division.
+    seq.extend(frames)
+    return seq
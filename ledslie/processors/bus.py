@@ -0,0 +1,161 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I let services that run in the same process talk to each other without MQTT. Messages are handed over as the Python
+# objects they were published as, so a FrameSequence made by the typesetter reaches the scheduler without being turned
+# into JSON and base64 and back. The BusBridge connects the bus to the MQTT broker for the clients outside the process.
+
+import hashlib
+from collections import OrderedDict
+
+from twisted.internet.defer import succeed
+from twisted.logger import Logger
+
+from ledslie.messages import GenericMessage, FrameSequence, SequencePayloads
+from ledslie.processors.service import GenericProcessor
+from ledslie.publishing import TopicMatches
+
+log = Logger()
+
+
+def _as_bytes(message) -> bytes:
+    if isinstance(message, GenericMessage):
+        return bytes(message.serialize())
+    if isinstance(message, str):
+        return message.encode()
+    return bytes(message)
+
+
+class TopicBus(object):
+    def __init__(self, reactor):
+        """
+        I deliver published messages to the subscribers of their topic, in a later turn of reactor like a broker would.
+        """
+        self.reactor = reactor
+        self._subscriptions = []  # Tuples of topic filter, callback, owner and if it's called right away.
+
+    def subscribe(self, topic_filter: str, callback, owner=None, immediate=False) -> None:
+        """
+        I call callback with the same arguments as onPublish of a MQTT protocol for each message on topic_filter.
+        Messages published by owner are not given to it. An immediate callback is called while the message is
+        published, before the other subscribers get the same object and can change it.
+        """
+        self._subscriptions.append((topic_filter, callback, owner, immediate))
+
+    def unsubscribe(self, owner) -> None:
+        """
+        I stop delivering messages to the subscriptions of owner.
+        """
+        self._subscriptions = [subscription for subscription in self._subscriptions if subscription[2] is not owner]
+
+    def publish(self, topic: str, message, qos: int=0, retain: bool=False, sender=None) -> None:
+        if isinstance(message, str):
+            message = message.encode()
+        for topic_filter, callback, owner, immediate in self._subscriptions:
+            if owner is not None and owner is sender:
+                continue
+            if not TopicMatches(topic_filter, topic):
+                continue
+            if immediate:
+                callback(topic, message, qos, False, retain, None)
+            else:
+                self.reactor.callLater(0, callback, topic, message, qos, False, retain, None)
+
+
+class BusProtocol(object):
+    carries_objects = True  # Messages are published as they are, not serialized.
+
+    def __init__(self, bus: TopicBus):
+        """
+        I stand in for the MQTT protocol of a service that is connected to a TopicBus.
+        """
+        self.bus = bus
+        self.onPublish = None
+        self.onDisconnection = None
+
+    def setWindowSize(self, size):
+        pass
+
+    def connect(self, name, keepalive=None):
+        return succeed(None)
+
+    def subscribe(self, topic, qos=0):
+        self.bus.subscribe(topic, self._deliver, owner=self)
+        return succeed(qos)
+
+    def publish(self, topic, message, qos=0, retain=False):
+        self.bus.publish(topic, message, qos, retain, sender=self)
+        return succeed(None)
+
+    def _deliver(self, topic, payload, qos, dup, retain, msgId):
+        if self.onPublish is not None:
+            self.onPublish(topic, payload, qos, dup, retain, msgId)
+
+
+class BusBridge(GenericProcessor):
+    def __init__(self, endpoint, factory, reactor=None):
+        """
+        I pass messages between a TopicBus and the MQTT broker. Messages on the imported topics go from the broker to
+        the bus, and messages on the exported topics go from the bus to the broker.
+        """
+        super().__init__(endpoint, factory, reactor)
+        self.bus = None
+        self.subscriptions = ()
+        self._exported = OrderedDict()  # Topic and digest of exported messages the broker will send back to me.
+
+    def attach(self, bus: TopicBus, import_topics, export_topics) -> None:
+        self.bus = bus
+        self.subscriptions = tuple([(topic_filter, 1) for topic_filter in import_topics])
+        for topic_filter in export_topics:
+            bus.subscribe(topic_filter, self.export, owner=self, immediate=True)
+
+    def export(self, topic, message, qos, dup, retain, msgId):
+        """
+        I publish a message from the bus on the broker. I'm called while the message is published on the bus, and
+        serialize it right away, before the services in the process get the same object and change it. Large
+        sequences are sent in chunks. The messages the broker will send back to me are remembered by their digest.
+        """
+        if self.protocol is None:
+            return
+        if isinstance(message, FrameSequence):
+            payloads = SequencePayloads(topic, message)
+        else:
+            payloads = [(topic, _as_bytes(message))]
+        for payload_topic, payload in payloads:
+            if self._imports(payload_topic):
+                key = (payload_topic, hashlib.sha1(payload).digest())
+                self._exported[key] = self._exported.get(key, 0) + 1
+            self.publish(payload_topic, payload, qos, retain and len(payloads) == 1)  # Chunks are never retained.
+        while len(self._exported) > self.config['ALLINONE_ECHO_WINDOW']:
+            self._exported.popitem(last=False)
+
+    def _imports(self, topic) -> bool:
+        return any([TopicMatches(topic_filter, topic) for topic_filter, qos in self.subscriptions])
+
+    def onPublish(self, topic, payload, qos, dup, retain, msgId):
+        """
+        I put a message from the broker on the bus, unless it's one I exported coming back.
+        """
+        payload = bytes(payload)
+        key = (topic, hashlib.sha1(payload).digest())
+        if key in self._exported:
+            self._exported[key] -= 1
+            if not self._exported[key]:
+                del self._exported[key]
+            return
+        self.bus.publish(topic, payload, qos, retain, sender=self)
@@ -2,9 +2,9 @@ import time
 from random import choice
 from typing import Iterable
 
-from ledslie.config import Config
+from ledslie.config import Config, Settings
 from ledslie.content.utils import CircularBuffer
-from ledslie.messages import FrameSequence
+from ledslie.messages import FrameSequence, Frame, ViewportFrame
 
 
 class Catalog(object):
@@ -16,6 +16,7 @@ class Catalog(object):
         self.alert_program = None
         self.intermezzo_func_list = []
         self.current_program = None
+        self.shown_program = None  # The program of the last frame given out, None during an intermezzo.
 
     def add_intermezzo(self, intermezzo_func):
         self.intermezzo_func_list.append(intermezzo_func)
@@ -46,6 +47,7 @@ class Catalog(object):
                         break
                 prev_program = self.current_program
             else:
+                self.shown_program = self.alert_program
                 while self.alert_program.alert_count > 0:
                     self.alert_program.alert_count -= 1
                     yield from self.alert_program
@@ -53,26 +55,27 @@ class Catalog(object):
 
     def _normal_program_frame(self, prev_program):
         if prev_program and self.intermezzo_func_list:
+            self.shown_program = None
             intermezzo_func = choice(self.intermezzo_func_list)  # Pick an intermezzo
             yield from intermezzo_func(prev_program.last(), self.current_program.first())
+        self.shown_program = self.current_program
         if self.now() > self.program_retirement[self.current_program.program_id]:
-            self.programs.remove(self.current_program)  # Program is removed as it's now retired.
+            self._retire(self.current_program)  # Program is removed as it's now retired.
         nr_of_programs = len(self.programs)
         if nr_of_programs > 0:
-            yield from self.mark_program_progress(self.current_program.frames, self.programs.pos, nr_of_programs)
+            yield from self.mark_program_progress(self.current_program, self.programs.pos, nr_of_programs)
         else:
             yield from self.current_program
 
     def mark_program_progress(self, frames: FrameSequence, program_nr: int, nr_of_programs: int):
-        width = self.config['DISPLAY_WIDTH']
-        height = self.config['DISPLAY_HEIGHT']
-        marker_width = int(width / nr_of_programs)
-        last_line_start_byte = width * (height-1)
-        start_byte = last_line_start_byte + program_nr * marker_width
+        settings = Settings()
+        marker_width = int(settings.DISPLAY_WIDTH / nr_of_programs)
+        start_byte = settings.DISPLAY_LAST_ROW_START + program_nr * marker_width
         for frame in frames:
+            img_data = frame.raw()  # Viewport frames create new image data, so mark that and not the frame.
             for b_nr in range(start_byte, start_byte+marker_width):
-                frame.img_data[b_nr] |= 128
-            yield frame
+                img_data[b_nr] |= 128
+            yield Frame(img_data, frame.duration)
 
 
     def add_program(self, program_name: str, seq: FrameSequence):
@@ -101,6 +104,29 @@ class Catalog(object):
         program_id = self.program_name_ids[program_name]
         self.programs.remove_by_id(program_id)
         del self.program_name_ids[program_name]
+        self.program_retirement.pop(program_id, None)
+
+    def _retire(self, program: FrameSequence) -> None:
+        """
+        I remove a program that is past its valid time. The name is forgotten as well, so a program sent again under
+        the same name is added as a new program.
+        """
+        self.programs.remove(program)
+        if self.program_name_ids.get(program.name) == program.program_id:
+            del self.program_name_ids[program.name]
+        self.program_retirement.pop(program.program_id, None)
+
+    def get_program(self, program_name: str):
+        """
+        I return the program with program_name. None if it's not in the catalog.
+        :param program_name: The name of the program
+        :type program_name: str
+        :return: The program
+        :rtype: FrameSequence
+        """
+        if program_name not in self.program_name_ids:
+            return None
+        return self.programs.get(self.program_name_ids[program_name])
 
     def __contains__(self, program_name: str) -> bool:
         """
@@ -118,4 +144,17 @@ class Catalog(object):
         :return: list with the names of the programs
         :rtype: list
         """
-        return list(self.program_name_ids.keys())
\ No newline at end of file
+        return list(self.program_name_ids.keys())
+
+    def nr_of_bytes(self) -> int:
+        """
+        I return the number of bytes of image data held by the programs in the catalog.
+        """
+        total = 0
+        for program_id in self.program_name_ids.values():
+            if program_id not in self.programs:
+                continue
+            seq = self.programs.get(program_id)
+            total += len(seq.strip or b'')
+            total += sum([len(frame.img_data) for frame in seq.frames if not isinstance(frame, ViewportFrame)])
+        return total
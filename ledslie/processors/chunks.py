@@ -0,0 +1,156 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I put sequences that were sent in chunks back together, see FrameSequence.serialize_chunks. Each chunk is decoded
+# when it comes in, so the frames of a large sequence are ready by the time the last chunk arrives. A chunk that comes
+# before the ones in front of it waits for them. A program has one transfer at a time: a chunk of a new transfer, or
+# a whole sequence for the program, replaces the transfer that wasn't complete yet.
+
+import json
+from collections import OrderedDict
+
+from twisted.logger import Logger
+
+from ledslie.messages import FrameSequence
+
+log = Logger()
+
+
+class ChunkError(Exception):
+    pass
+
+
+def ReadChunk(payload) -> tuple:
+    """
+    I return the frames, the sequence information and the chunk information of a chunk.
+    :raises ChunkError: When payload isn't a chunk.
+    """
+    try:
+        seq_images, seq_info = json.loads(bytes(payload).decode())
+        chunk = seq_info['chunk']
+        chunk_id, nr, of = str(chunk['id']), int(chunk['nr']), int(chunk['of'])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ChunkError("Not a chunk of a sequence.")
+    if not 0 <= nr < of:
+        raise ChunkError("Chunk %d of %d." % (nr, of))
+    return seq_images, seq_info, chunk_id, nr, of
+
+
+class _Transfer(object):
+    def __init__(self, chunk_id: str, of: int):
+        self.id = chunk_id
+        self.of = of
+        self.sequence = None  # Made from the first chunk.
+        self.next_nr = 0
+        self.early = {}  # Chunks that came before the ones in front of them. Nr to frames.
+        self.nr_of_bytes = 0
+        self.timeout = None
+
+
+class ChunkAssembler(object):
+    def __init__(self, reactor, config, on_drop=None):
+        """
+        I keep the sequences that are on their way in chunks. on_drop(program_name, reason) is called when one is given
+        up on. Without a reactor transfers don't time out, they're only given up on when they're replaced or too large.
+        """
+        self.reactor = reactor
+        self.timeout = config['SEQUENCE_CHUNK_TIMEOUT']
+        self.max_bytes = config['SEQUENCE_CHUNK_MAX_BYTES']
+        self.on_drop = on_drop
+        self.transfers = OrderedDict()  # Program name to _Transfer, the oldest first.
+
+    @property
+    def nr_of_bytes(self) -> int:
+        return sum([transfer.nr_of_bytes for transfer in self.transfers.values()])
+
+    def add(self, program_name, payload) -> FrameSequence:
+        """
+        I add a chunk for program_name.
+        :return: The sequence, when this was the last chunk of it. None otherwise.
+        :raises ChunkError: When payload isn't a chunk.
+        """
+        seq_images, seq_info, chunk_id, nr, of = ReadChunk(payload)
+        transfer = self.transfers.get(program_name)
+        if transfer is None or transfer.id != chunk_id:
+            if transfer is not None:
+                self.drop(program_name, "replaced by a newer transfer")
+            transfer = self.transfers[program_name] = _Transfer(chunk_id, of)
+        if nr < transfer.next_nr or nr in transfer.early:
+            return None  # Sent again.
+        transfer.nr_of_bytes += len(payload)
+        if nr == transfer.next_nr:
+            if not self._decode(transfer, seq_images, seq_info):
+                self.drop(program_name, "chunk %d can't be read" % nr)
+                return None
+            while transfer.next_nr in transfer.early:
+                if not self._decode(transfer, transfer.early.pop(transfer.next_nr), None):
+                    self.drop(program_name, "chunk %d can't be read" % transfer.next_nr)
+                    return None
+        else:
+            transfer.early[nr] = seq_images
+        if transfer.next_nr == transfer.of:
+            self._forget(program_name)
+            return transfer.sequence
+        self._limit(program_name)
+        if program_name in self.transfers:
+            self._wait(program_name, transfer)
+        return None
+
+    def _decode(self, transfer: _Transfer, seq_images: list, seq_info) -> bool:
+        if transfer.next_nr == 0:
+            transfer.sequence = FrameSequence().load_parts(seq_images, seq_info)
+            ok = transfer.sequence is not None
+        else:
+            ok = transfer.sequence.load_frames(seq_images)
+        transfer.next_nr += 1
+        return ok
+
+    def _limit(self, program_name) -> None:
+        """
+        I give up on the oldest transfers while all together they're larger than SEQUENCE_CHUNK_MAX_BYTES.
+        """
+        while self.transfers and self.nr_of_bytes > self.max_bytes:
+            oldest = next(iter(self.transfers))
+            if oldest == program_name and len(self.transfers) > 1:
+                self.transfers.move_to_end(program_name)  # Keep the transfer that's coming in, when others can go.
+                continue
+            self.drop(oldest, "more than %d bytes of chunks" % self.max_bytes)
+
+    def _wait(self, program_name, transfer: _Transfer) -> None:
+        if self.reactor is None:
+            return
+        if transfer.timeout is not None and transfer.timeout.active():
+            transfer.timeout.reset(self.timeout)
+        else:
+            transfer.timeout = self.reactor.callLater(self.timeout, self.drop, program_name, "chunks stopped coming")
+
+    def _forget(self, program_name) -> None:
+        transfer = self.transfers.pop(program_name, None)
+        if transfer is not None and transfer.timeout is not None and transfer.timeout.active():
+            transfer.timeout.cancel()
+
+    def drop(self, program_name, reason: str="a whole sequence came") -> None:
+        """
+        I give up on the transfer for program_name.
+        """
+        if program_name not in self.transfers:
+            return
+        self._forget(program_name)
+        log.warn("Gave up on the chunks of {program}: {reason}", program=program_name, reason=reason)
+        if self.on_drop is not None:
+            self.on_drop(program_name, reason)
@@ -1,18 +1,18 @@
-from ledslie.config import Config
+from ledslie.config import Settings
 from ledslie.gfx.invaders import invader3, invader2, invader1
 from ledslie.gfx.pacman import Pacman1, Pacman2
 from ledslie.messages import Frame, FrameSequence
 
 
 def IntermezzoWipe(previous_frame: Frame, next_frame: Frame):
-    config = Config()
-    wipe_frame_delay = config['INTERMEZZO_WIPE_FRAME_DELAY']
-    wipe_frame_step_size = config['INTERMEZZO_WIPE_FRAME_STEP_SIZE']
+    settings = Settings()
+    wipe_frame_delay = settings.INTERMEZZO_WIPE_FRAME_DELAY
+    wipe_frame_step_size = settings.INTERMEZZO_WIPE_FRAME_STEP_SIZE
     prv = previous_frame.raw()
     nxt = next_frame.raw()
     seq = FrameSequence()
-    height = config['DISPLAY_HEIGHT']
-    width = config['DISPLAY_WIDTH']
+    height = settings.DISPLAY_HEIGHT
+    width = settings.DISPLAY_WIDTH
     sep = bytearray([0x00, 0x00, 0x40, 0x60, 0x80, 0x80, 0xff, 0x00])
     sep_len = len(sep)
     for step in range(wipe_frame_step_size, width-wipe_frame_step_size-sep_len, wipe_frame_step_size):
@@ -25,14 +25,14 @@ def IntermezzoWipe(previous_frame: Frame, next_frame: Frame):
 
 
 def IntermezzoPacman(previous_frame: Frame, next_frame: Frame):
-    config = Config()
-    frame_move  = config['PACMAN_MOVE']
-    frame_delay = config['PACMAN_DELAY']
+    settings = Settings()
+    frame_move  = settings.PACMAN_MOVE
+    frame_delay = settings.PACMAN_DELAY
     prv = previous_frame.raw()
     nxt = next_frame.raw()
     seq = FrameSequence()
-    height = config['DISPLAY_HEIGHT']
-    width = config['DISPLAY_WIDTH']
+    height = settings.DISPLAY_HEIGHT
+    width = settings.DISPLAY_WIDTH
     spacer = bytearray([0x00, 0x00, 0x00])
     pacmans = [Pacman1, Pacman2]
     i = 0
@@ -70,13 +70,13 @@ def IntermezzoInvaders(previous_frame: Frame, next_frame: Frame):
     """
     Show Invaders from the top to the bottom switching programs.
     """
-    config = Config()
+    settings = Settings()
     prv = previous_frame.raw()
     nxt = next_frame.raw()
     seq = FrameSequence()
-    frame_delay = config['INVADERS_FRAME_DELAY']
-    height = config['DISPLAY_HEIGHT']
-    width = config['DISPLAY_WIDTH']
+    frame_delay = settings.INVADERS_FRAME_DELAY
+    height = settings.DISPLAY_HEIGHT
+    width = settings.DISPLAY_WIDTH
     size = height*width
     invader_height = int(len(_invaders(0)) / width)
     for step in range(height+invader_height+4):  # lets go from top to bottom
@@ -0,0 +1,114 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I encode the frames that are sent to the display compactly, so they can be watched from elsewhere.
+#
+# A mirror message is zlib compressed and contains:
+#   kind     : one byte, MIRROR_KEYFRAME when all rows follow, MIRROR_DELTA when only the changed rows follow.
+#   row mask : (DISPLAY_HEIGHT + 7) // 8 bytes, little endian. Bit n is set when row n follows.
+#   rows     : DISPLAY_WIDTH bytes for each row in the row mask, from top to bottom.
+
+import zlib
+
+from ledslie.config import Config
+
+MIRROR_KEYFRAME = ord('K')
+MIRROR_DELTA = ord('D')
+
+
+class MirrorEncoder(object):
+    def __init__(self, keyframe_interval: int):
+        """
+        I encode frames as the rows that changed since the frame encoded before.
+        :param keyframe_interval: Every this many messages all rows are encoded, so new watchers can catch up.
+        :type keyframe_interval: int
+        """
+        self.config = Config()
+        self.keyframe_interval = keyframe_interval
+        self._previous = None
+        self._nr_since_keyframe = 0
+
+    def encode(self, image_data) -> bytes:
+        """
+        I return the mirror message for image_data. None when nothing changed.
+        """
+        width = self.config['DISPLAY_WIDTH']
+        height = self.config['DISPLAY_HEIGHT']
+        image_data = bytes(image_data)
+        keyframe = self._previous is None or self._nr_since_keyframe >= self.keyframe_interval
+        row_mask = 0
+        rows = []
+        for row_nr in range(height):
+            row = image_data[row_nr * width:(row_nr + 1) * width]
+            if keyframe or row != self._previous[row_nr * width:(row_nr + 1) * width]:
+                row_mask |= 1 << row_nr
+                rows.append(row)
+        if not rows:
+            return None
+        self._previous = image_data
+        self._nr_since_keyframe = 0 if keyframe else self._nr_since_keyframe + 1
+        kind = MIRROR_KEYFRAME if keyframe else MIRROR_DELTA
+        message = bytes([kind]) + row_mask.to_bytes((height + 7) // 8, 'little') + b''.join(rows)
+        return zlib.compress(message)
+
+
+class MirrorDecoder(object):
+    def __init__(self):
+        """
+        I keep the image of the display up to date from mirror messages.
+        """
+        self.config = Config()
+        self.image = None
+
+    def decode(self, payload: bytes) -> dict:
+        """
+        I apply the mirror message in payload to the image.
+        :return: Dict with the numbers and image data of the rows that changed. None until the first keyframe.
+        :rtype: dict
+        """
+        width = self.config['DISPLAY_WIDTH']
+        height = self.config['DISPLAY_HEIGHT']
+        message = zlib.decompress(payload)
+        mask_size = (height + 7) // 8
+        kind = message[0]
+        row_mask = int.from_bytes(message[1:1 + mask_size], 'little')
+        if kind == MIRROR_KEYFRAME and self.image is None:
+            self.image = bytearray(width * height)
+        elif kind not in (MIRROR_KEYFRAME, MIRROR_DELTA):
+            raise ValueError("Unknown mirror message kind %d" % kind)
+        if self.image is None:
+            return None  # Waiting for a keyframe.
+        changed = {}
+        pos = 1 + mask_size
+        for row_nr in range(height):
+            if row_mask & (1 << row_nr):
+                row = message[pos:pos + width]
+                pos += width
+                self.image[row_nr * width:(row_nr + 1) * width] = row
+                changed[row_nr] = row
+        return changed
+
+    def rows(self) -> dict:
+        """
+        I return all rows of the image. Empty before the first keyframe.
+        """
+        if self.image is None:
+            return {}
+        width = self.config['DISPLAY_WIDTH']
+        return {row_nr: bytes(self.image[row_nr * width:(row_nr + 1) * width])
+                for row_nr in range(self.config['DISPLAY_HEIGHT'])}
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ============
+#
+# I publish programs at the times they are scheduled for. The scheduler forgets a program after PROGRAM_RETIREMENT_AGE,
+# so while a program is active I publish it again every PLANNER_REFRESH_INTERVAL. When its time is over I remove it from
+# the scheduler, and wait for the next time it's shown when it repeats.
+#
+# Schedules are sent to topic «ledslie/planner/1/» + «name», see ledslie.messages.ScheduledProgram for the message. An
+# empty message cancels the schedule. The schedules are kept in a file, so they survive a restart.
+
+import heapq
+import itertools
+import json
+import os
+
+from twisted.internet import reactor
+from twisted.logger import Logger
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_PLANNER, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_ERROR
+from ledslie.messages import ScheduledProgram
+from ledslie.processors.service import CreateService, GenericProcessor
+
+log = Logger()
+
+
+class PlanStore(object):
+    def __init__(self, path: str):
+        """
+        I keep the scheduled programs, and a heap with the time each of them needs attention next.
+
+        :param path: The file the schedules are kept in.
+        :type path: str
+        """
+        self.path = path
+        self.plans = {}  # Program name with its ScheduledProgram.
+        self._heap = []  # Entries of (time, order, program name).
+        self._due = {}  # Program name with the time of its entry in the heap. Other entries are outdated.
+        self._order = itertools.count()
+
+    def load(self) -> None:
+        """
+        I read the schedules from the file. Schedules that can't be read are left out.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                stored = json.loads(f.read().decode())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            log.error("Can't read the schedules from {path}: {exc}", path=self.path, exc=exc)
+            return
+        for plan_data in stored:
+            plan = ScheduledProgram().load(json.dumps(plan_data).encode())
+            if plan is not None:
+                self.plans[plan.program] = plan
+
+    def save(self) -> None:
+        """
+        I write the schedules to the file, the first to need attention first.
+        """
+        order = sorted(self.plans, key=lambda name: self._due.get(name, float('inf')))
+        data = b'[' + b','.join([self.plans[name].serialize() for name in order]) + b']'
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)  # A crash never leaves half written schedules.
+        except OSError as exc:
+            log.error("Can't write the schedules to {path}: {exc}", path=self.path, exc=exc)
+
+    def due(self, program_name: str, when: float) -> None:
+        """
+        I mark that program_name needs attention at when, instead of the time it was due before.
+        """
+        self._due[program_name] = when
+        heapq.heappush(self._heap, (when, next(self._order), program_name))
+
+    def forget(self, program_name: str) -> None:
+        self.plans.pop(program_name, None)
+        self._due.pop(program_name, None)
+
+    def next_time(self):
+        """
+        I return the first time a program needs attention. None when there is none.
+        """
+        while self._heap:
+            when, order, program_name = self._heap[0]
+            if self._due.get(program_name) == when:
+                return when
+            heapq.heappop(self._heap)  # Outdated entry.
+        return None
+
+    def pop_due(self, now: float) -> list:
+        """
+        I return the names of the programs that need attention at now, and take them off the heap.
+        """
+        names = []
+        while True:
+            when = self.next_time()
+            if when is None or when > now:
+                return names
+            when, order, program_name = heapq.heappop(self._heap)
+            del self._due[program_name]
+            names.append(program_name)
+
+
+class Planner(GenericProcessor):
+    subscriptions = (
+        (LEDSLIE_TOPIC_PLANNER, 1),
+    )
+
+    def __init__(self, endpoint, factory, reactor=None):
+        super().__init__(endpoint, factory, reactor)
+        self.store = PlanStore(self.config['PLANNER_STORE'])
+        self.loaded = False
+        self.timer = None
+
+    def onBrokerConnected(self):
+        if not self.loaded:
+            self.loaded = True
+            self.store.load()
+            now = self.reactor.seconds()
+            for program_name in self.store.plans:
+                self.store.due(program_name, now)
+        self.attend()
+
+    def onPublish(self, topic, payload, qos, dup, retain, msgId):
+        program_name = topic.split('/')[-1]
+        now = self.reactor.seconds()
+        previous = self.store.plans.get(program_name)
+        if not payload:  # An empty message cancels the schedule.
+            if previous is None:
+                return
+            if previous.active:
+                self.remove_program(program_name)
+            self.store.forget(program_name)
+        else:
+            plan = ScheduledProgram().load(payload, program_name)
+            if plan is None:
+                self.report("Schedule of '%s' is not valid." % program_name)
+                return
+            if previous is None and len(self.store.plans) >= self.config['PLANNER_MAX_PROGRAMS']:
+                self.report("Too many scheduled programs, '%s' is not added." % program_name)
+                return
+            plan.active = previous is not None and previous.active
+            self.store.plans[program_name] = plan
+            self.attend_program(program_name, now)
+        self.store.save()
+        self.arm()
+
+    def attend(self):
+        """
+        I take care of the programs that are due, and wait for the next.
+        """
+        self.timer = None
+        now = self.reactor.seconds()
+        program_names = self.store.pop_due(now)
+        for program_name in program_names:
+            self.attend_program(program_name, now)
+        if program_names:
+            self.store.save()
+        self.arm()
+
+    def attend_program(self, program_name: str, now: float) -> None:
+        """
+        I publish or remove program_name as its schedule says for now, and mark when it needs attention again.
+        """
+        plan = self.store.plans[program_name]
+        occurrence = plan.occurrence(now)
+        if occurrence is None:  # Not shown again.
+            if plan.active:
+                self.remove_program(program_name)
+            self.store.forget(program_name)
+            return
+        start, end = occurrence
+        if now < start:
+            if plan.active:
+                self.remove_program(program_name)
+                plan.active = False
+            self.store.due(program_name, start)
+        else:
+            self.publish(plan.topic, plan.payload.encode(), qos=1)
+            plan.active = True
+            self.store.due(program_name, min(now + self.config['PLANNER_REFRESH_INTERVAL'], end))
+
+    def remove_program(self, program_name: str) -> None:
+        self.publish(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + program_name, b'', qos=1)
+
+    def arm(self) -> None:
+        """
+        I set the timer for the first program that needs attention.
+        """
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.timer = None
+        when = self.store.next_time()
+        if when is not None:
+            self.timer = self.reactor.callLater(max(0, when - self.reactor.seconds()), self.attend)
+
+    def report(self, message: str) -> None:
+        log.error("{message}", message=message)
+        self.publish(LEDSLIE_ERROR + "/planner", message.encode())
+
+
+if __name__ == '__main__':
+    Config(envvar_silent=False)
+    CreateService(Planner)
+    reactor.run()
@@ -34,18 +34,26 @@ from twisted.logger import Logger
 from twisted.internet.serialport import SerialPort as RealSerialPort
 
 from ledslie.config import Config
-from ledslie.definitions import LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_ERROR, LEDSLIE_TOPIC_SCHEDULER_PROGRAMS
-from ledslie.messages import FrameSequence
+from ledslie.definitions import LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_ERROR, \
+    LEDSLIE_TOPIC_SCHEDULER_PROGRAMS, LEDSLIE_TOPIC_TICKER_PROGRAMS, LEDSLIE_TOPIC_MIRROR, \
+    LEDSLIE_TOPIC_CHUNKS_PROGRAMS, LEDSLIE_TOPIC_CHUNKS_UNNAMED
+from ledslie.messages import FrameSequence, TickerLayout, GenericMessage, LoadMessage
 from ledslie.processors.animate import AnimateStill
 from ledslie.processors.catalog import Catalog
+from ledslie.processors.chunks import ChunkAssembler, ChunkError
 from ledslie.processors.intermezzos import IntermezzoWipe, IntermezzoInvaders, IntermezzoPacman
+from ledslie.processors.mirror import MirrorEncoder
 from ledslie.processors.service import CreateService, GenericProcessor
+from ledslie.processors.ticker import Ticker
+from ledslie.tracing import Stamp, StageLatencies, STAGE_SCHEDULER, STAGE_SERIAL
 
 # ----------------
 # Global variables
 # ----------------
 
 serial_port = None
+SHIFT_TABLE = bytes([b >> 1 for b in range(256)])
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)  # Seconds.
 
 log = Logger()
 
@@ -54,6 +62,9 @@ class Scheduler(GenericProcessor):
     subscriptions = (
         (LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, 1),
         (LEDSLIE_TOPIC_SEQUENCES_UNNAMED, 1),
+        (LEDSLIE_TOPIC_TICKER_PROGRAMS, 1),
+        (LEDSLIE_TOPIC_CHUNKS_PROGRAMS, 1),
+        (LEDSLIE_TOPIC_CHUNKS_UNNAMED, 1),
     )
 
     def __init__(self, endpoint, factory):
@@ -62,6 +73,24 @@ class Scheduler(GenericProcessor):
         self.sequencer = None
         self.frame_iterator = None
         self.led_screen = None
+        self.mirror_encoder = MirrorEncoder(self.config['MIRROR_KEYFRAME_INTERVAL'])
+        self.mirror_pending = None
+        self.mirror_call = None
+        self.mirror_last_sent = None
+        self.frames_sent = self.metrics.counter('frames_sent')
+        self.frame_errors = self.metrics.counter('frame_errors')
+        self.metrics.gauge('programs', lambda: len(self.catalog.programs))
+        self.metrics.gauge('catalog_bytes', self.catalog.nr_of_bytes)
+        self.metrics.gauge('serial_backlog', self.serial_backlog)
+        self.chunks = ChunkAssembler(self.reactor, self.config, self.chunks_dropped)
+        self.metrics.gauge('chunk_bytes', lambda: self.chunks.nr_of_bytes)
+
+    def onConfigChanged(self, changed: set):
+        if changed & {'MIRROR_KEYFRAME_INTERVAL', 'DISPLAY_WIDTH', 'DISPLAY_HEIGHT'}:
+            self.mirror_encoder = MirrorEncoder(self.config['MIRROR_KEYFRAME_INTERVAL'])  # Starts with a keyframe.
+        if changed & {'SEQUENCE_CHUNK_TIMEOUT', 'SEQUENCE_CHUNK_MAX_BYTES'}:
+            self.chunks.timeout = self.config['SEQUENCE_CHUNK_TIMEOUT']
+            self.chunks.max_bytes = self.config['SEQUENCE_CHUNK_MAX_BYTES']
 
     def onPublish(self, topic, payload, qos, dup, retain, msgId):
         '''
@@ -69,23 +98,56 @@ class Scheduler(GenericProcessor):
         '''
         log.debug("onPublish topic={topic}, msg={payload}", payload=payload, topic=topic)
         program_name = self.get_program_id(topic)
-        if not payload:  # remove programs when the payload is empty.
+        is_chunk = topic == LEDSLIE_TOPIC_CHUNKS_UNNAMED or topic.startswith(LEDSLIE_TOPIC_CHUNKS_PROGRAMS[:-1])
+        if not is_chunk:
+            self.chunks.drop(program_name)  # A whole sequence replaces the one that's still coming in.
+        if not isinstance(payload, GenericMessage) and not payload:  # remove programs when the payload is empty.
             if program_name in self.catalog:
                 self.catalog.remove_program(program_name)
             return
-        seq = FrameSequence().load(payload)
+        if is_chunk:
+            try:
+                seq = self.chunks.add(program_name, payload)
+            except ChunkError as exc:
+                log.error("Chunk for {program} is wrong: {exc}", program=program_name, exc=exc)
+                return
+        elif topic.startswith(LEDSLIE_TOPIC_TICKER_PROGRAMS[:-1]):
+            seq = self.update_ticker(program_name, LoadMessage(TickerLayout, payload))
+        else:
+            seq = LoadMessage(FrameSequence, payload)
         if seq is None:
             return
-        if len(seq) == 1:
+        trace = Stamp(seq.trace, STAGE_SCHEDULER)
+        if len(seq) == 1 and not isinstance(seq, Ticker):  # A ticker creates its frames while it's shown.
             seq = AnimateStill(seq[0])
+        seq.trace = trace
         self.catalog.add_program(program_name, seq)
         if self.sequencer is None:
             self.sequencer = self.reactor.callLater(0, self.send_next_frame)
         content = json.dumps(self.catalog.list_current_programs())
         self.protocol.publish(LEDSLIE_TOPIC_SCHEDULER_PROGRAMS, content, 0, retain=False)
 
+    def update_ticker(self, program_name, layout: TickerLayout) -> Ticker:
+        """
+        I update the items of the running ticker program_name, or create a new ticker when there is none. A layout
+        that can't be shown is reported, and None returned.
+        """
+        ticker = self.catalog.get_program(program_name)
+        if not isinstance(ticker, Ticker):
+            ticker = Ticker()
+        try:
+            return ticker.update(layout)
+        except ValueError as exc:
+            log.error("Ticker {program} is wrong: {exc}", program=program_name, exc=exc)
+            self.publish(LEDSLIE_ERROR + "/scheduler", ("Program: %s: %s" % (program_name, exc)).encode())
+            return None
+
+    def chunks_dropped(self, program_name, reason):
+        self.metrics.counter('chunk_transfers_dropped').inc()
+        self.publish(LEDSLIE_ERROR + "/scheduler", "Program: %s: chunks dropped, %s" % (program_name, reason))
+
     def get_program_id(self, topic):
-        if topic == LEDSLIE_TOPIC_SEQUENCES_UNNAMED:
+        if topic in (LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_CHUNKS_UNNAMED):
             program_id = None
         else:
             program_id = topic.split('/')[-1]
@@ -101,12 +163,58 @@ class Scheduler(GenericProcessor):
         try:
             self.led_screen.publish_frame(frame)
         except FrameException as exc:
+            self.frame_errors.inc()
             log.error(str(exc))
             self.publish(LEDSLIE_ERROR + "/scheduler", "Program: %s: %s" % (
                 self.catalog.current_program.name, str(exc)))
+        else:
+            self.frames_sent.inc()
+            self.finish_trace(self.catalog.shown_program)
+            self.mirror_frame(frame)
         duration = min(10, frame.duration/1000)
         self.sequencer = self.reactor.callLater(duration, self.send_next_frame)
 
+    def finish_trace(self, program) -> None:
+        """
+        I add the last stamp to the trace of program, now the first frame of it is written to the serial port, and
+        count the time between its stages in the latency_ histograms.
+        """
+        trace = getattr(program, 'trace', None)
+        if trace is None:
+            return
+        program.trace = None  # Only the first time the program is shown counts.
+        for name, seconds in StageLatencies(Stamp(trace, STAGE_SERIAL)):
+            self.metrics.histogram('latency_' + name, LATENCY_BUCKETS).observe(seconds)
+
+    def mirror_frame(self, frame):
+        """
+        I publish frame on the mirror topic, at most MIRROR_MAX_FPS times a second. Only the latest frame is kept when
+        frames come faster, and it's encoded when it's published so the serial output is never held up.
+        """
+        self.mirror_pending = frame
+        if self.mirror_call is not None:
+            return
+        delay = 0
+        if self.mirror_last_sent is not None:
+            delay = max(0, self.mirror_last_sent + 1 / self.config['MIRROR_MAX_FPS'] - self.reactor.seconds())
+        self.mirror_call = self.reactor.callLater(delay, self._publish_mirror)
+
+    def _publish_mirror(self):
+        self.mirror_call = None
+        self.mirror_last_sent = self.reactor.seconds()
+        payload = self.mirror_encoder.encode(self.mirror_pending.raw())
+        self.mirror_pending = None
+        if payload is not None:
+            self.publish(LEDSLIE_TOPIC_MIRROR, payload)
+
+    def serial_backlog(self) -> int:
+        """
+        I return the number of bytes written to the serial port that are not sent yet.
+        """
+        transport = getattr(self.led_screen, 'transport', None)
+        buffered = len(getattr(transport, 'dataBuffer', b'')) - getattr(transport, 'offset', 0)
+        return buffered + getattr(transport, '_tempDataLen', 0)
+
     def add_intermezzo(self, intermezzo):
         self.catalog.add_intermezzo(intermezzo)
 
@@ -125,12 +233,10 @@ class LEDScreen(Protocol):
         self.transport.write(self._prepare_image(frame.raw()))
 
     def _prepare_image(self, image_data):
-        if len(image_data) != int(config.get("DISPLAY_SIZE")):
-            raise FrameException("WRONG frame size. Expected %d but got %d." % (
-                len(image_data), config.get("DISPLAY_SIZE")))
-        shifted_data = bytearray()
-        for b in image_data:
-            shifted_data.append(b >> 1)  # Downshift the data one byte. making the highbyte 0.
+        display_size = int(Config().get("DISPLAY_SIZE"))
+        if len(image_data) != display_size:
+            raise FrameException("WRONG frame size. Expected %d but got %d." % (display_size, len(image_data)))
+        shifted_data = bytearray(image_data).translate(SHIFT_TABLE)  # Downshift the data one bit. making the highbit 0.
         shifted_data.append(1 << 7)  ## end with a new frame marker, a byte with the high byte 1
         return shifted_data
 
@@ -145,21 +251,30 @@ class FakeSerialPort(object):
         log.info("FAKE WRITING #%d bytes" % len(data))
 
 
-if __name__ == '__main__':
-    log = Logger(__file__)
-    config = Config(envvar_silent=False)
-    scheduler = CreateService(Scheduler)
+def AttachScreen(scheduler: Scheduler) -> LEDScreen:
+    """
+    I add the intermezzos to scheduler, and connect it to the LED screen on the SERIAL_PORT of the configuration.
+    """
+    config = Config()
     scheduler.add_intermezzo(IntermezzoWipe)
     scheduler.add_intermezzo(IntermezzoInvaders)
     scheduler.add_intermezzo(IntermezzoPacman)
     led_screen = LEDScreen()
-    serial_port = config.get('SERIAL_PORT')
-    if serial_port == 'fake':
+    port = config.get('SERIAL_PORT')
+    if port == 'fake':
         log.warn("FAKE SERIAL SELECTED.")
         FakeSerialPort(led_screen)
     else:
         baudrate = config.get('SERIAL_BAUDRATE')
-        log.info("REAL Serialport %s @ %s" % (serial_port, baudrate))
-        RealSerialPort(led_screen, serial_port, reactor, baudrate=baudrate)
+        log.info("REAL Serialport %s @ %s" % (port, baudrate))
+        RealSerialPort(led_screen, port, reactor, baudrate=baudrate)
     scheduler.led_screen = led_screen
+    return led_screen
+
+
+if __name__ == '__main__':
+    log = Logger(__file__)
+    Config(envvar_silent=False)
+    scheduler = CreateService(Scheduler)
+    AttachScreen(scheduler)
     reactor.run()
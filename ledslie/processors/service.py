@@ -19,14 +19,17 @@ import sys
 from mqtt.client.factory import MQTTFactory
 from twisted.application.internet import ClientService, backoffPolicy, _maybeGlobalReactor
 from twisted.internet import reactor, task
-from twisted.internet.defer import inlineCallbacks, DeferredList, Deferred
+from twisted.internet.defer import inlineCallbacks, DeferredList, Deferred, gatherResults
 from twisted.internet.endpoints import clientFromString
 from twisted.logger import Logger, LogLevel, globalLogBeginner, textFileLogObserver, \
     FilteringLogObserver, LogLevelFilterPredicate
 
-from ledslie.config import Config
-from ledslie.definitions import LEDSLIE_TOPIC_STATS_BASE
-from ledslie.messages import GenericMessage
+from ledslie.config import Config, ConfigError, SubscribeConfig
+from ledslie.definitions import LEDSLIE_TOPIC_STATS_BASE, LEDSLIE_TOPIC_CONFIG, LEDSLIE_ERROR
+from ledslie.messages import GenericMessage, FrameSequence, SequencePayloads
+from ledslie.metrics import Registry
+from ledslie.publishing import PublishQueue
+from ledslie.reloading import ReloadFromMessage, ReloadOnSignal, RepeatingCalls
 
 logLevelFilterPredicate = LogLevelFilterPredicate(defaultLogLevel=LogLevel.info)
 
@@ -75,6 +78,7 @@ def CreateService(ServiceCls):
     myEndpoint = clientFromString(reactor, Config().get('MQTT_BROKER_CONN_STRING'))
     serv = ServiceCls(myEndpoint, factory)
     serv.startService(ServiceCls.__name__)
+    ReloadOnSignal(reactor)
     return serv
 
 
@@ -87,6 +91,16 @@ class GenericProcessor(ClientService):
         self.config = Config()
         self.protocol = None
         self._system_name = None
+        self.metrics = Registry()
+        self._received = self.metrics.counter('messages_received')
+        self._sent = self.metrics.counter('messages_sent')
+        self._sent_bytes = self.metrics.counter('bytes_sent')
+        self.stats_task = None
+        self._stats_last = None
+        self._offline = False  # From (re-)connecting until the broker accepted the connection.
+        self.publish_queue = PublishQueue(self._send, self._can_send, self.reactor, self.metrics, self.config)
+        self.repeating = RepeatingCalls(self.reactor)
+        self._config_subscribed = False
 
     def startService(self, name):
         log.info("starting MQTT Client Subscriber&Publisher Service")
@@ -100,12 +114,15 @@ class GenericProcessor(ClientService):
         '''
         Connect to MQTT broker
         '''
+        self._offline                 = True
         self.protocol                 = protocol
-        self.protocol.onPublish       = self.onPublish
+        self.protocol.onPublish       = self._onPublish
         self.protocol.onDisconnection = self.onDisconnection
-        self.protocol.setWindowSize(3)
-        self.stats_task = task.LoopingCall(self.publish_vital_stats)
-        self.stats_task.start(5.0, now=False)
+        self.protocol.setWindowSize(self.config['PUBLISH_WINDOW'])
+        self.start_vital_stats()
+        if not self._config_subscribed:
+            SubscribeConfig(self.config_changed)
+            self._config_subscribed = True
         try:
             yield self.protocol.connect( self._system_name, keepalive=60)
             yield self.subscribe()
@@ -114,9 +131,10 @@ class GenericProcessor(ClientService):
                       broker=self.config.get('MQTT_BROKER_CONN_STRING'), excp=e)
         else:
             log.info("Connected and subscribed to {broker}", broker=self.config.get('MQTT_BROKER_CONN_STRING'))
+            self._offline = False
+            self.publish_queue.restart()
             self.reactor.callLater(0, self.onBrokerConnected)
-        self_name = self.__class__.__name__
-        self.publish(topic=LEDSLIE_TOPIC_STATS_BASE+self_name, message="%s (re-)connected" % self_name)
+        self.metrics.counter('connects').inc()  # Published with the other stats.
 
     def onBrokerConnected(self):
         log.info("onBrokerConnected called")
@@ -135,28 +153,109 @@ class GenericProcessor(ClientService):
             return self.protocol.subscribe(topic, qos)
 
         d = Deferred()
-        for topic, qos in self.subscriptions:
+        for topic, qos in tuple(self.subscriptions) + ((LEDSLIE_TOPIC_CONFIG, 1),):
             d.addCallback(_subscribe_topic, topic, qos)
             d.addErrback(_logFailure)
         d.callback("Start")
         return d
 
+    def _onPublish(self, topic, payload, qos, dup, retain, msgId):
+        self._received.inc()
+        if topic == LEDSLIE_TOPIC_CONFIG:
+            return self.reload_config(payload)
+        return self.onPublish(topic, payload, qos, dup, retain, msgId)
+
+    def reload_config(self, payload):
+        """
+        I apply the settings of a message on the config topic, see ledslie.reloading.
+        """
+        try:
+            changed = ReloadFromMessage(payload)
+        except ConfigError as exc:
+            log.error("Configuration not reloaded: {exc}", exc=exc)
+            self.publish(LEDSLIE_ERROR + "/config", ("%s: %s" % (self.__class__.__name__, exc)).encode())
+        else:
+            log.info("Configuration reloaded, changed: {keys}", keys=", ".join(sorted(changed)) or "nothing")
+
+    def config_changed(self, changed: set):
+        """
+        I'm called with the keys of the settings that changed when the configuration was reloaded. Running calls follow
+        their new interval.
+        """
+        if any([key.startswith('PUBLISH_') for key in changed]):
+            self.publish_queue.configure(self.config)
+            if self.protocol is not None:
+                self.protocol.setWindowSize(self.config['PUBLISH_WINDOW'])
+            self.publish_queue.pump()
+        if 'STATS_INTERVAL' in changed:
+            if self.stats_task is not None and self.stats_task.running:
+                self.stats_task.stop()
+            self.start_vital_stats()
+        self.repeating.reschedule()
+        self.onConfigChanged(changed)
+
+    def onConfigChanged(self, changed: set):
+        """
+        I let a service forget what it derived from the settings in changed.
+        """
+        pass
+
     def onPublish(self, topic, payload, qos, dup, retain, msgId):
         raise NotImplemented()
 
     def publish(self, topic, message, qos=0, retain=False):
+        """
+        I queue message for topic, see ledslie.publishing. The Deferred I return fires when the broker has it.
+        Large sequences are sent in chunks.
+        """
+        if isinstance(message, FrameSequence) and not getattr(self.protocol, 'carries_objects', False):
+            payloads = SequencePayloads(topic, message)
+            if len(payloads) > 1:  # Sent in chunks, that are never retained.
+                return gatherResults([self.publish_queue.put(chunk_topic, chunk, qos)
+                                      for chunk_topic, chunk in payloads])
+            topic, message = payloads[0]
+        return self.publish_queue.put(topic, message, qos, retain)
+
+    def _can_send(self):
+        return self.protocol is not None and not self._offline
+
+    def _send(self, topic, message, qos, retain):
         if isinstance(message, bytes):
             message = bytearray(message)
         elif isinstance(message, GenericMessage):
+            if getattr(self.protocol, 'carries_objects', False):  # Handed over as it is, see ledslie.processors.bus.
+                self._sent.inc()
+                return self.protocol.publish(topic, message, qos, retain=retain)
             message = message.serialize()
+        self._sent.inc()
+        self._sent_bytes.inc(len(message))
         return self.protocol.publish(topic, message, qos, retain=retain)
 
     def _logPublishFailure(self, failure):
         log.debug("publisher reported {message}", message=failure.getErrorMessage())
         return failure
 
+    def start_vital_stats(self):
+        """
+        I start publishing the metrics every STATS_INTERVAL seconds, when that isn't 0.
+        """
+        interval = self.config['STATS_INTERVAL']
+        if not interval or (self.stats_task is not None and self.stats_task.running):
+            return
+        self.stats_task = task.LoopingCall(self.publish_vital_stats)
+        self.stats_task.clock = self.reactor
+        self.stats_task.start(interval, now=False)
+
     def publish_vital_stats(self):
-        pass
+        """
+        I publish the metrics. How much later than planned I'm called is the lag of the reactor.
+        """
+        now = self.reactor.seconds()
+        if self._stats_last is not None:
+            lag = now - self._stats_last - self.stats_task.interval
+            self.metrics.histogram('reactor_lag').observe(max(0, lag))
+        self._stats_last = now
+        self.publish(LEDSLIE_TOPIC_STATS_BASE + self.__class__.__name__, self.metrics.serialize())
 
     def onDisconnection(self, reason):
         '''
@@ -164,4 +263,5 @@ class GenericProcessor(ClientService):
         and get a deferred for a new protocol object (next retry)
         '''
         log.info("<Connection was lost !> <reason={r}>", r=reason)
+        self._offline = True
         self.whenConnected().addCallback(self.connectToBroker)
@@ -0,0 +1,143 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# A ticker continuously scrolls text items from right to left. The frames are not rendered up front, but created when
+# the scheduler asks for them. Only a display sized window is kept, so memory use doesn't depend on the amount of text.
+
+from ledslie.bitfont import FontMapping
+from ledslie.messages import FrameSequence, Frame, TickerLayout
+from ledslie.processors.animate import ScrollTiming
+
+
+class Ticker(FrameSequence):
+    def __init__(self):
+        super().__init__()
+        config = self._config
+        self.items = []
+        self.font = FontMapping[config['TICKER_FONT']]
+        self.scale = config['TICKER_FONT_SCALE']
+        self.show_duration = config['TICKER_DISPLAY_DURATION']
+        self.frame_delay, self.step = ScrollTiming(config['TICKER_SPEED'], config['TICKER_FRAME_DELAY'])
+        self._width = config['DISPLAY_WIDTH']
+        self._height = config['DISPLAY_HEIGHT']
+        self._window = bytearray(config['DISPLAY_SIZE'])  # The image currently shown.
+        self._scrolled_ahead = False  # The window already has the first frame of the next time I'm shown.
+        self._last_frame = Frame(bytearray(self._window), self.frame_delay)
+        self._item_nr = -1
+        self._columns = self._columns_iter()
+
+    def update(self, layout: TickerLayout):
+        """
+        I take the items and settings of the layout. The ticker keeps running: new items are shown once the item
+        that's currently scrolling by is done.
+        :param layout: The layout with the new items.
+        :type layout: TickerLayout
+        :raises ValueError: When the font size doesn't exist or the duration is shorter than a frame. Nothing is
+        changed then.
+        """
+        font = self.font
+        if layout.size is not None:
+            try:
+                font = FontMapping[layout.size]
+            except (KeyError, TypeError):
+                raise ValueError("Unknown font size %r." % (layout.size,))
+        if layout.duration is not None:
+            if not isinstance(layout.duration, (int, float)) or layout.duration < self.frame_delay:
+                raise ValueError("Duration %r is shorter than a frame of %s ms." % (layout.duration, self.frame_delay))
+            self.show_duration = layout.duration
+        self.font = font
+        if layout.replace:
+            self.items = list(layout.items)
+            self._item_nr = -1
+        else:
+            self.items.extend(layout.items)
+        del self.items[:-self._config['TICKER_MAX_ITEMS']]  # Drop the oldest items.
+        self.program = layout.program
+        self.valid_time = layout.valid_time
+        return self
+
+    def _next_item(self) -> str:
+        if not self.items:
+            return ""
+        self._item_nr = (self._item_nr + 1) % len(self.items)
+        return self.items[self._item_nr] + self._config['TICKER_ITEM_SEPARATOR']
+
+    def _columns_iter(self):
+        """
+        I endlessly yield the columns of the ticker text, one item after the other.
+        """
+        empty_column = bytes(self._height)
+        while True:
+            text = self._next_item()
+            if not text:
+                yield empty_column
+                continue
+            font, scale = self.font, self.scale
+            glyph_height = font.height * scale
+            top = max(0, int((self._height - glyph_height) / 2))  # Centre the text vertically.
+            bottom = max(0, self._height - glyph_height - top)
+            for char in text:
+                for column in font.columns(char, scale, proportional=True):
+                    yield bytes(top) + column[:self._height] + bytes(bottom)
+
+    def _scroll(self):
+        """
+        I move the window step columns to the left, filling up on the right with new columns of the text.
+        """
+        width, step = self._width, self.step
+        new_columns = [next(self._columns) for _ in range(step)]
+        window = self._window
+        for row in range(self._height):
+            start = row * width
+            window[start:start+width-step] = window[start+step:start+width]
+            window[start+width-step:start+width] = bytes([column[row] for column in new_columns])
+
+    def __iter__(self):
+        nr_of_frames = max(1, int(self.show_duration / self.frame_delay))
+        for nr in range(nr_of_frames):
+            if self._scrolled_ahead:
+                self._scrolled_ahead = False
+            else:
+                self._scroll()
+            self._last_frame = Frame(bytearray(self._window), self.frame_delay)
+            yield self._last_frame
+
+    def first(self):
+        """
+        I return the frame I'll start with the next time I'm shown.
+        """
+        if not self._scrolled_ahead:
+            self._scroll()
+            self._scrolled_ahead = True
+        return Frame(bytearray(self._window), self.frame_delay)
+
+    def last(self):
+        """
+        I return the frame I ended with the last time I was shown.
+        """
+        return self._last_frame
+
+    @property
+    def duration(self):
+        return self.show_duration
+
+    def __len__(self):
+        return max(1, int(self.show_duration / self.frame_delay))
+
+    def __getitem__(self, nr):
+        raise TypeError("The frames of a ticker are only created while it's shown.")
@@ -27,7 +27,10 @@ OR
 
 """
 
+import math
 import os
+import time
+from itertools import chain, islice
 
 from PIL import Image
 from PIL import ImageDraw
@@ -39,38 +42,16 @@ from ledslie.config import Config
 from ledslie.definitions import LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, \
     LEDSLIE_TOPIC_TYPESETTER_SIMPLE_TEXT, LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_TYPESETTER_3LINES, \
     LEDSLIE_TOPIC_ALERT
-from ledslie.messages import TextSingleLineLayout, TextTripleLinesLayout, FrameSequence, TextAlertLayout, Frame
-from ledslie.processors.animate import AnimateVerticalScroll
-from ledslie.bitfont.font6x7 import font6x7
-from ledslie.bitfont.font8x8 import font8x8
+from ledslie.messages import TextSingleLineLayout, TextTripleLinesLayout, FrameSequence, TextAlertLayout, Frame, \
+    LoadMessage
+from ledslie.processors.animate import AnimateVerticalScroll, AnimateHorizontalScroll
+from ledslie.bitfont import FontMapping
 from ledslie.bitfont.generic import GenericFont
+from ledslie.bitfont.markup import LineHeight, MarkupLine
 from ledslie.processors.service import GenericProcessor, CreateService
+from ledslie.tracing import Stamp, STAGE_TYPESETTER, STAGE_RENDERED
 
-SCRIPT_DIR = os.path.split(__file__)[0]
-os.chdir(SCRIPT_DIR)
-
-FontMapping = {
-    '8x8': font8x8,
-    '6x7': font6x7,
-    '7x6': font6x7,
-}
-
-
-def MarkupLine(image: bytearray, line: str, font: GenericFont):
-    display_width = Config()['DISPLAY_WIDTH']
-    char_display_width = int(display_width / font.width)  # maximum number of characters on a line
-    line_image = bytearray(display_width * 8)  # Bytes of the line.
-    for j, c in enumerate(line[:char_display_width]):  # Look at each character of a line
-        try:
-            glyph = font[ord(c)]
-        except KeyError:
-            glyph = font[ord("?")]
-        xpos = j * font.width  # Horizontal Position in the line.
-        for n, glyph_line in enumerate(glyph):  # Look at each row of the glyph (is just a byte)
-            for x in range(8):  # Look at the bits
-                if testBit(glyph_line, x) != 0:
-                    line_image[xpos + n * display_width + x] = 0xff
-    image.extend(line_image)
+SCRIPT_DIR = os.path.split(__file__)[0]  # A relative FONT_DIRECTORY starts here.
 
 
 class Typesetter(GenericProcessor):
@@ -85,40 +66,51 @@ class Typesetter(GenericProcessor):
         self.log = Logger(__class__.__name__)
         super().__init__(endpoint, factory)
         self.sequencer = None
+        self.render_time = self.metrics.histogram('render_time')
+
+    def onConfigChanged(self, changed: set):
+        if changed & {'BITFONT_DIRECTORIES', 'BITFONT_CACHE_DIRECTORY'}:
+            FontMapping.forget()
 
     def onPublish(self, topic, payload, qos, dup, retain, msgId):
         '''
         Callback Receiving messages from publisher
         '''
         self.log.debug("onPublish topic={topic};q={qos}, msg={payload}", payload=payload, qos=qos, topic=topic)
+        received = time.time()
         seq_msg = FrameSequence()
         image_bytes = None
-        if topic == LEDSLIE_TOPIC_TYPESETTER_SIMPLE_TEXT:
-            font_size = self.config['TYPESETTER_1LINE_DEFAULT_FONT_SIZE']
-            image_bytes = self.typeset_1line(payload[:30], font_size)
-            msg = TextSingleLineLayout()
-            msg.duration = self.config['DISPLAY_DEFAULT_DELAY']
-        elif topic == LEDSLIE_TOPIC_TYPESETTER_1LINE:
-            msg = TextSingleLineLayout().load(payload)
-            font_size = msg.font_size if msg.font_size is not None else self.config['TYPESETTER_1LINE_DEFAULT_FONT_SIZE']
-            text = msg.text
-            image_bytes = self.typeset_1line(text, font_size)
-        elif topic == LEDSLIE_TOPIC_TYPESETTER_3LINES:
-            msg = TextTripleLinesLayout().load(payload)
-            self.typeset_3lines(seq_msg, msg)
-        elif topic.startswith(LEDSLIE_TOPIC_ALERT):
-            msg = TextAlertLayout().load(payload)
-            frame_seq = self.typeset_alert(topic, msg)
-            frame_seq.program = "alert"
-            return self.send_frame_sequence(frame_seq)
-        else:
-            raise NotImplementedError("topic '%s' (%s) is not known" % (topic, type(topic)))
+        with self.render_time.time():
+            if topic == LEDSLIE_TOPIC_TYPESETTER_SIMPLE_TEXT:
+                msg = TextSingleLineLayout()
+                msg.text = self._decode_text(payload)[:self.config['TYPESETTER_SIMPLE_TEXT_MAX_LENGTH']]
+                msg.duration = self.config['DISPLAY_DEFAULT_DELAY']
+                font_size = self.config['TYPESETTER_1LINE_DEFAULT_FONT_SIZE']
+                image_bytes = self.typeset_single_line(seq_msg, msg, font_size)
+            elif topic == LEDSLIE_TOPIC_TYPESETTER_1LINE:
+                msg = LoadMessage(TextSingleLineLayout, payload)
+                font_size = msg.font_size
+                if font_size is None:
+                    font_size = self.config['TYPESETTER_1LINE_DEFAULT_FONT_SIZE']
+                image_bytes = self.typeset_single_line(seq_msg, msg, font_size)
+            elif topic == LEDSLIE_TOPIC_TYPESETTER_3LINES:
+                msg = LoadMessage(TextTripleLinesLayout, payload)
+                self.typeset_3lines(seq_msg, msg)
+            elif topic.startswith(LEDSLIE_TOPIC_ALERT):
+                msg = LoadMessage(TextAlertLayout, payload)
+                frame_seq = self.typeset_alert(topic, msg)
+                frame_seq.program = "alert"
+                frame_seq.trace = Stamp(Stamp(msg.trace, STAGE_TYPESETTER, received), STAGE_RENDERED)
+                return self.send_frame_sequence(frame_seq)
+            else:
+                raise NotImplementedError("topic '%s' (%s) is not known" % (topic, type(topic)))
         if image_bytes is None and seq_msg.is_empty():
             return
         seq_msg.program = msg.program
         seq_msg.valid_time = msg.valid_time
+        seq_msg.trace = Stamp(Stamp(msg.trace, STAGE_TYPESETTER, received), STAGE_RENDERED)
         if seq_msg.is_empty():
-            seq_msg.frames.append((image_bytes, {'duration': msg.duration}))
+            seq_msg.add_frame(Frame(image_bytes, msg.duration))
         self.send_image(seq_msg)
 
     def send_image(self, image_data):
@@ -130,53 +122,111 @@ class Typesetter(GenericProcessor):
 
     def send_frame_sequence(self, seq: FrameSequence):
         topic = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + seq.program
-        message = seq.serialize()
-        return self.protocol.publish(topic, message, 1, retain=False)
+        return self.publish(topic, seq, 1)
 
     def typeset_1line(self, text: str, font_size: int):
+        font = self._get_truetype_font(font_size)
+        if font is None:
+            return None
         image = Image.new("L", (self.config.get("DISPLAY_WIDTH"),
                                 self.config.get("DISPLAY_HEIGHT")))
         draw = ImageDraw.Draw(image)
+        draw.text((0, 0), text, 255, font=font)
+        return image.tobytes()
+
+    def typeset_1line_strip(self, text: str, font_size: int):
+        """
+        I render the text on a single line into a strip that is as wide as the text, but at least the display width.
+        :param text: The text to render.
+        :type text: str
+        :param font_size: The size of the font.
+        :type font_size: int
+        :return: Tuple with the image data of the strip and its width. None if the font can't be loaded.
+        :rtype: tuple
+        """
+        font = self._get_truetype_font(font_size)
+        if font is None:
+            return None
+        strip_width = max(self.config["DISPLAY_WIDTH"], int(math.ceil(font.getlength(text))))
+        image = Image.new("L", (strip_width, self.config["DISPLAY_HEIGHT"]))
+        draw = ImageDraw.Draw(image)
+        draw.text((0, 0), text, 255, font=font)
+        return image.tobytes(), strip_width
+
+    def typeset_single_line(self, seq: FrameSequence, msg: TextSingleLineLayout, font_size: int):
+        """
+        I typeset a single line of text. When the text is too long for the display and msg allows a marquee, I add
+        frames scrolling the text by to seq and return None. Otherwise I return the image of the text.
+        """
+        if not msg.marquee:
+            return self.typeset_1line(msg.text, font_size)
+        strip = self.typeset_1line_strip(msg.text, font_size)
+        if strip is None:
+            return None
+        strip_data, strip_width = strip
+        if strip_width == self.config["DISPLAY_WIDTH"]:  # The text fits, the strip is the image.
+            return strip_data
+        AnimateHorizontalScroll(seq, strip_data, strip_width, msg.duration)
+        return None
+
+    def _get_truetype_font(self, font_size: int):
         fontFileName = "DroidSansMono.ttf"
         font_path = self._get_font_filepath(fontFileName)
         try:
-            font = ImageFont.truetype(font_path, int(font_size))
+            return ImageFont.truetype(font_path, int(font_size))
         except OSError as exc:
             print("Can't find the font file '%s': %s" % (font_path, exc))
             return None
-        draw.text((0, 0), text, 255, font=font)
-        return image.tobytes()
+
+    def _decode_text(self, payload) -> str:
+        if isinstance(payload, (bytes, bytearray)):
+            return payload.decode('utf-8', errors='replace')
+        return payload
 
     def typeset_3lines(self, seq: FrameSequence, msg: TextTripleLinesLayout)-> FrameSequence:
         font = FontMapping[msg.size]
         lines = msg.lines
         if not lines:
             return seq
-        # lines = lines[0:3]  # Limit for now.
-        image = bytearray()
-        for line in lines:  # off all the lines
-            MarkupLine(image, line, font)
+        if msg.wrap:
+            lines = self.wrap_lines(lines, font, msg.proportional)
+        line_height = LineHeight(font)
+        display_lines = max(1, int(self.config['DISPLAY_HEIGHT'] / line_height))  # Three for the 8 high fonts.
+        line_images = (self._markup_line(line, font, msg.proportional) for line in lines)
+        first_lines = list(islice(line_images, display_lines + 1))  # Enough to know if the lines fit on the display.
         duration = msg.duration if msg.duration is not None else self.config['DISPLAY_DEFAULT_DELAY']
-        if len(lines) <= 3:
-            if len(lines) % 3 != 0:  # Append empty lines if not all lines are complete.
-                missing_lines = 3 - len(lines) % 3
-                for c in range(missing_lines):
-                    MarkupLine(image, "", font)
+        if len(first_lines) <= display_lines:
+            image = bytearray().join(first_lines)[:self.config['DISPLAY_SIZE']]  # Fonts can be taller than the display.
+            image.extend(bytearray(self.config['DISPLAY_SIZE'] - len(image)))  # Leave the lines without text empty.
             seq.add_frame(Frame(image, duration=duration))
         else:
             line_duration = msg.line_duration if msg.line_duration is not None else self.config['DISPLAY_LINE_DURATION']
-            seq.extend(AnimateVerticalScroll(image, line_duration))
+            AnimateVerticalScroll(seq, chain(first_lines, line_images), line_duration, line_height)
         return seq
 
+    def wrap_lines(self, paragraphs: list, font: GenericFont, proportional: bool):
+        """
+        I wrap each of the paragraphs into lines that fit the width of the display.
+        :return: Generator of the lines.
+        :rtype: Iterable
+        """
+        display_width = self.config['DISPLAY_WIDTH']
+        for paragraph in paragraphs:
+            yield from font.wrap(paragraph, display_width, proportional)
+
+    def _markup_line(self, line: str, font: GenericFont, proportional: bool) -> bytearray:
+        image = bytearray()
+        MarkupLine(image, line, font, proportional)
+        return image
+
     def _get_font_filepath(self, fontFileName):
-        return os.path.realpath(os.path.join(self.config["FONT_DIRECTORY"], fontFileName))
+        return os.path.realpath(os.path.join(SCRIPT_DIR, self.config["FONT_DIRECTORY"], fontFileName))
 
     def typeset_alert(self, topic: str, msg: TextAlertLayout) -> FrameSequence:
         assert topic.split('/')[-1] == "spacealert"
         text = msg.text
         who = msg.who
         fs = FrameSequence()
-        char_width = self._char_display_width()
         fs.program = msg.program
         alert = self.typeset_1line("Space Alert!", 20)
         alert_neg = bytearray([(~x & 0xff) for x in alert])
@@ -186,21 +236,13 @@ class Typesetter(GenericProcessor):
         fs.add_frame(Frame(alert_neg, duration=200))
         if text:
             three_line_msg = TextTripleLinesLayout()
-            three_line_msg.lines = ["From %s" % who, text[:char_width], text[char_width:]]
+            three_line_msg.lines = ["From %s" % who, text]
+            three_line_msg.wrap = True
             three_line_msg.duration = 2000
             self.typeset_3lines(fs, three_line_msg)
         fs.prio = "alert"
         return fs
 
-    def _char_display_width(self):
-        display_width = self.config['DISPLAY_WIDTH']
-        return int(display_width / 8)
-
-
-def testBit(int_type, offset):
-    mask = 1 << offset
-    return (int_type & mask)
-
 
 if __name__ == '__main__':
     Config(envvar_silent=False)
@@ -0,0 +1,166 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I hold the messages a service publishes until the broker can take them. At most PUBLISH_WINDOW messages are on their
+# way to the broker at the same time; the others wait in a queue of at most PUBLISH_QUEUE_MAX messages. On the topics
+# of PUBLISH_COALESCE_TOPICS only the newest message matters, so a message that is still waiting is replaced by a newer
+# one on the same topic, that is sent after the messages queued before it. Messages are only serialized when they are sent, so the replaced ones are never serialized.
+
+import itertools
+from collections import OrderedDict
+
+from twisted.internet.defer import Deferred, maybeDeferred
+from twisted.logger import Logger
+from twisted.python.failure import Failure
+
+log = Logger()
+
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)  # Seconds.
+
+
+def TopicMatches(topic_filter: str, topic: str) -> bool:
+    """
+    I return True when topic matches topic_filter, with the MQTT wildcards + for one level and # for all levels below.
+    """
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+    for nr, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if nr >= len(topic_levels):
+            return False
+        if level != '+' and level != topic_levels[nr]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class PublishDropped(Exception):
+    """
+    The message was dropped because the publish queue was full.
+    """
+
+
+class _Pending(object):
+    __slots__ = ('topic', 'message', 'qos', 'retain', 'waiting')
+
+    def __init__(self, topic, message, qos, retain):
+        self.topic = topic
+        self.message = message
+        self.qos = qos
+        self.retain = retain
+        self.waiting = []  # Deferreds of the callers, also of the messages this one replaced.
+
+
+class PublishQueue(object):
+    def __init__(self, send, ready, reactor, metrics, config):
+        """
+        I pass messages to send(topic, message, qos, retain), which returns a Deferred that fires when the broker has
+        them, as long as ready() says the connection can take them. The depth of the queue and the time the broker
+        takes to acknowledge are kept in metrics.
+        """
+        self.send = send
+        self.ready = ready
+        self.reactor = reactor
+        self.configure(config)
+        self.in_flight = 0
+        self._queue = OrderedDict()  # Key to _Pending. The key is the topic for coalesced messages.
+        self._numbers = itertools.count()
+        self._generation = 0  # Acknowledgements of an earlier connection don't free a place in the window.
+        self._pumping = False
+        metrics.gauge('publish_queue', lambda: len(self._queue))
+        metrics.gauge('publish_in_flight', lambda: self.in_flight)
+        self._coalesced = metrics.counter('publish_coalesced')
+        self._dropped = metrics.counter('publish_dropped')
+        self._ack_latency = metrics.histogram('publish_ack_latency', LATENCY_BUCKETS)
+
+    def configure(self, config) -> None:
+        """
+        I take the window, the length of the queue and the topics to coalesce from config.
+        """
+        self.window = config['PUBLISH_WINDOW']
+        self.max_length = config['PUBLISH_QUEUE_MAX']
+        self.coalesce_topics = tuple(config['PUBLISH_COALESCE_TOPICS'])
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, topic: str, message, qos: int=0, retain: bool=False) -> Deferred:
+        """
+        I queue message for topic, and return a Deferred that fires when the broker has it, or a newer message on the
+        same topic that replaced it.
+        """
+        d = Deferred()
+        if any([TopicMatches(topic_filter, topic) for topic_filter in self.coalesce_topics]):
+            key = ('topic', topic)
+        else:
+            key = ('nr', next(self._numbers))
+        pending = self._queue.get(key)
+        if pending is None:
+            pending = self._queue[key] = _Pending(topic, message, qos, retain)
+        else:  # The newer message replaces the waiting one, and goes after what was queued in between.
+            self._coalesced.inc()
+            pending.message, pending.qos, pending.retain = message, max(qos, pending.qos), retain
+            self._queue.move_to_end(key)  # Like the chunks of a sequence, that must not come after the newer one.
+        pending.waiting.append(d)
+        while len(self._queue) > self.max_length:
+            self._drop()
+        self.pump()
+        return d
+
+    def _drop(self):
+        key, pending = self._queue.popitem(last=False)
+        self._dropped.inc()
+        log.warn("Publish queue is full, dropped the message for {topic}", topic=pending.topic)
+        for d in pending.waiting:
+            d.errback(PublishDropped(pending.topic))
+
+    def restart(self) -> None:
+        """
+        I forget the messages that were on their way on an earlier connection, and send what is queued.
+        """
+        self._generation += 1
+        self.in_flight = 0
+        self.pump()
+
+    def pump(self) -> None:
+        """
+        I send messages until the window is full or the queue is empty.
+        """
+        if self._pumping:  # Called again from an acknowledgement that came right away.
+            return
+        self._pumping = True
+        try:
+            while self._queue and self.ready() and self.in_flight < self.window:
+                key, pending = self._queue.popitem(last=False)
+                self.in_flight += 1
+                d = maybeDeferred(self.send, pending.topic, pending.message, pending.qos, pending.retain)
+                d.addBoth(self._done, pending, self.reactor.seconds(), self._generation)
+        finally:
+            self._pumping = False
+
+    def _done(self, result, pending, started, generation):
+        if generation == self._generation:
+            self.in_flight -= 1
+        if pending.qos:
+            self._ack_latency.observe(self.reactor.seconds() - started)
+        for d in pending.waiting:
+            if isinstance(result, Failure):
+                d.errback(result)
+            else:
+                d.callback(result)
+        self.pump()
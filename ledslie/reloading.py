@@ -0,0 +1,146 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I change the configuration of running services. A JSON object with settings published on «ledslie/config/1» is put
+# on top of the configuration file, and on SIGHUP the configuration file is read again. The settings of the last
+# message stay on top until a new message comes; an empty message or {} leaves just the file. Publish it retained, so
+# services that start later get it as well:
+#
+#     mosquitto_pub -r -t ledslie/config/1 -m '{"DISPLAY_DEFAULT_DELAY": 4000}'
+#
+# The services are told which settings changed, see SubscribeConfig. Settings that are only used when a service starts,
+# like the address of the broker, still need a restart.
+
+import json
+import signal
+
+from twisted.internet import task
+from twisted.logger import Logger
+
+from ledslie.config import ReloadConfig, ConfigError
+from ledslie import defaults
+
+log = Logger()
+
+_overrides = {}  # The settings of the last message on the config topic.
+_signal_reactor = None
+
+
+def ReloadFromMessage(payload) -> set:
+    """
+    I put the settings in payload on top of the configuration file.
+    :raises ConfigError: When payload isn't a JSON object of known settings, or the settings are wrong.
+    :return: The keys of the settings that changed.
+    """
+    global _overrides
+    try:
+        overrides = json.loads(bytes(payload).decode()) if payload else {}
+    except (ValueError, TypeError) as exc:
+        raise ConfigError("Configuration message can't be read: %s" % exc)
+    if not isinstance(overrides, dict):
+        raise ConfigError("Configuration message is not a JSON object.")
+    unknown = sorted([key for key in overrides if not (key.isupper() and hasattr(defaults, key))])
+    if unknown:
+        raise ConfigError("Not settings: %s" % ", ".join(unknown))
+    changed = ReloadConfig(overrides)
+    _overrides = overrides
+    return changed
+
+
+def ReloadFromFile() -> set:
+    """
+    I read the configuration file again, with the settings of the last config message on top.
+    """
+    return ReloadConfig(_overrides)
+
+
+def _reload_on_signal():
+    try:
+        changed = ReloadFromFile()
+    except ConfigError as exc:
+        log.error("Configuration not reloaded: {exc}", exc=exc)
+    else:
+        log.info("Configuration reloaded, changed: {keys}", keys=", ".join(sorted(changed)) or "nothing")
+
+
+def ReloadOnSignal(reactor) -> None:
+    """
+    I read the configuration file again when the process gets SIGHUP. Installed once for each process.
+    """
+    global _signal_reactor
+    if _signal_reactor is not None or not hasattr(signal, 'SIGHUP'):
+        return
+    _signal_reactor = reactor
+    signal.signal(signal.SIGHUP, lambda signum, frame: reactor.callFromThread(_reload_on_signal))
+
+
+class RepeatingCalls(object):
+    def __init__(self, reactor):
+        """
+        I keep the LoopingCalls of a service, so they can follow a changed interval. A call that raises is logged and
+        repeated again from the next interval on. When failed is set, failed(failure) is called instead of logging it.
+        """
+        self.reactor = reactor
+        self.failed = None
+        self.stopped = False
+        self._calls = {}  # Function to the LoopingCall and its interval.
+
+    def repeat(self, func, interval, now=True) -> task.LoopingCall:
+        """
+        I call func every interval seconds. interval can be a function that returns the seconds from the
+        configuration. When func is already repeated, that's kept as it is, so connecting again doesn't add calls.
+        """
+        loop = self._calls.get(func, (None, None))[0]
+        if loop is not None and loop.running:
+            return loop
+        self.stopped = False
+        loop = task.LoopingCall(func)
+        loop.clock = self.reactor
+        self._calls[func] = (loop, interval)
+        self._start(loop, func, interval, now)
+        return loop
+
+    def _start(self, loop, func, interval, now) -> None:
+        loop.start(self._seconds(interval), now=now).addErrback(self._loop_failed, func, interval)
+
+    def _loop_failed(self, failure, func, interval):
+        if self.failed is not None:
+            self.failed(failure)
+        else:
+            log.failure("Repeated call of {func!r} failed", failure, func=func)
+        if not self.stopped:
+            self._calls.pop(func, None)
+            self.repeat(func, interval, now=False)
+
+    def _seconds(self, interval) -> float:
+        return interval() if callable(interval) else interval
+
+    def reschedule(self) -> None:
+        """
+        I let the calls whose interval is now different continue at the new interval.
+        """
+        for func, (loop, interval) in list(self._calls.items()):
+            if loop.running and self._seconds(interval) != loop.interval:
+                loop.stop()
+                self._start(loop, func, interval, now=False)
+
+    def stop(self) -> None:
+        self.stopped = True
+        for loop, interval in self._calls.values():
+            if loop.running:
+                loop.stop()
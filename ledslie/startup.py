@@ -0,0 +1,131 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I measure how long each service takes to import, in a new Python process with -X importtime, so nothing is in
+# sys.modules yet. For each service the modules it imports itself are listed with the time they took, the slowest
+# first, so it's clear what to load only when it's used. A service that takes longer than its target is reported:
+#
+#     python -m ledslie.startup [service ...]
+#
+# The targets are STARTUP_IMPORT_TARGET, or the seconds in STARTUP_IMPORT_TARGETS for the service. The exit status is
+# 1 when a service is slower than its target. The times depend on the machine, so compare them on the display host.
+
+import re
+import subprocess
+import sys
+
+from ledslie.config import Config
+
+SERVICES = {  # The name of each service, as in deploy/, to its module.
+    'scheduler': 'ledslie.processors.scheduler',
+    'typesetter': 'ledslie.processors.typesetter',
+    'planner': 'ledslie.processors.planner',
+    'allinone': 'ledslie.processors.allinone',
+    'astralinfo': 'ledslie.content.astralinfo',
+    'coins': 'ledslie.content.coins',
+    'contenthost': 'ledslie.content.host',
+    'events': 'ledslie.content.events',
+    'info': 'ledslie.content.info',
+    'midnight': 'ledslie.content.midnight',
+    'ovinfo': 'ledslie.content.ovinfo',
+    'playing': 'ledslie.content.playing',
+    'progress': 'ledslie.content.progress',
+    'rain': 'ledslie.content.rain',
+}
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def ParseImportTimes(text: str) -> list:
+    """
+    I return the imports in the output of -X importtime, as tuples of the module name, its depth, the seconds of the
+    module itself and the seconds including the modules it imported, in the order they finished.
+    """
+    imports = []
+    for line in text.splitlines():
+        match = _IMPORT_LINE.match(line.rstrip())
+        if match:
+            own, cumulative, indent, name = match.groups()
+            imports.append((name, len(indent) // 2, int(own) / 1e6, int(cumulative) / 1e6))
+    return imports
+
+
+def ImportBreakdown(imports: list, module: str) -> tuple:
+    """
+    I return the seconds it took to import module, and the modules it imported itself with their seconds, the slowest
+    first.
+    """
+    for nr, (name, depth, own, cumulative) in enumerate(imports):
+        if name == module and depth == 0:
+            break
+    else:
+        raise KeyError(module)
+    children = []
+    for name, child_depth, child_own, child_cumulative in reversed(imports[:nr]):
+        if child_depth == 0:
+            break  # Imported before module.
+        if child_depth == 1:
+            children.append((name, child_cumulative))
+    return cumulative, sorted(children, key=lambda child: child[1], reverse=True)
+
+
+def MeasureImport(module: str, python: str=sys.executable) -> list:
+    """
+    I import module in a new process and return its imports, see ParseImportTimes.
+    :raises RuntimeError: When module can't be imported.
+    """
+    result = subprocess.run([python, '-X', 'importtime', '-c', 'import %s' % module],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise RuntimeError("Importing %s failed: %s" % (module, result.stderr.strip().splitlines()[-1:]))
+    return ParseImportTimes(result.stderr)
+
+
+def ImportTarget(service: str, config=None) -> float:
+    config = Config() if config is None else config
+    return config['STARTUP_IMPORT_TARGETS'].get(service, config['STARTUP_IMPORT_TARGET'])
+
+
+def ProfileService(service: str, repeat: int=3) -> tuple:
+    """
+    I return the fastest of repeat imports of service, as the seconds and the modules it imported itself.
+    """
+    return min([ImportBreakdown(MeasureImport(SERVICES[service]), SERVICES[service]) for n in range(repeat)])
+
+
+def main(args: list) -> int:
+    services = args or sorted(SERVICES)
+    unknown = [service for service in services if service not in SERVICES]
+    if unknown:
+        print("Unknown services: %s. Known are: %s" % (", ".join(unknown), ", ".join(sorted(SERVICES))))
+        return 2
+    too_slow = []
+    for service in services:
+        seconds, children = ProfileService(service)
+        target = ImportTarget(service)
+        verdict = "ok" if seconds <= target else "SLOW"
+        if seconds > target:
+            too_slow.append(service)
+        print("%-12s %6.0f ms  target %4.0f ms  %s" % (service, seconds * 1000, target * 1000, verdict))
+        for name, child_seconds in children[:5]:
+            print("    %6.0f ms  %s" % (child_seconds * 1000, name))
+    return 1 if too_slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,379 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I am a MQTT 3.1.1 broker that runs inside the test process, so the services can be tested and measured talking to each
+# other without Mosquitto. I know wildcard subscriptions, retained messages, last wills and QoS 0 and 1. Subscriptions
+# are granted QoS 1 at most, and a QoS 2 publish is answered as the protocol asks but delivered as QoS 1. Sessions are
+# always clean.
+#
+# Twisted clients, like the services, connect through BrokerFactory. With twisted.test.iosim they can be connected
+# without sockets or a running reactor. Clients that bring their own network thread, like paho, connect to a
+# ThreadedBroker on a port of localhost.
+
+import socket
+import socketserver
+import struct
+import threading
+
+from twisted.internet.address import IPv4Address
+from twisted.internet.protocol import Protocol, Factory
+from twisted.test import iosim
+
+from ledslie.publishing import TopicMatches
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP, SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, \
+    PINGRESP, DISCONNECT = range(1, 15)
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def EncodeLength(length: int) -> bytes:
+    """
+    I return the remaining length of a packet in the variable length encoding of MQTT.
+    """
+    encoded = bytearray()
+    while True:
+        length, digit = divmod(length, 128)
+        encoded.append(digit | (128 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def EncodeString(data) -> bytes:
+    if isinstance(data, str):
+        data = data.encode()
+    return struct.pack('!H', len(data)) + data
+
+
+def Packet(packet_type: int, flags: int, body: bytes=b'') -> bytes:
+    return bytes([packet_type << 4 | flags]) + EncodeLength(len(body)) + body
+
+
+class PacketReader(object):
+    def __init__(self):
+        """
+        I cut the data that comes in on a connection into packets.
+        """
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes) -> list:
+        """
+        I return the packets that are complete after data, as tuples of packet type, flags and body.
+        """
+        self._buffer.extend(data)
+        packets = []
+        while len(self._buffer) >= 2:
+            length, multiplier, pos = 0, 1, 1
+            while True:
+                if pos >= len(self._buffer):
+                    return packets
+                digit = self._buffer[pos]
+                length += (digit & 127) * multiplier
+                multiplier *= 128
+                pos += 1
+                if not digit & 128:
+                    break
+                if pos > 4:
+                    raise ProtocolError("Remaining length is too long.")
+            if len(self._buffer) < pos + length:
+                return packets
+            packets.append((self._buffer[0] >> 4, self._buffer[0] & 15, bytes(self._buffer[pos:pos + length])))
+            del self._buffer[:pos + length]
+        return packets
+
+
+class _BodyReader(object):
+    def __init__(self, body: bytes):
+        self.body = body
+        self.pos = 0
+
+    def uint16(self) -> int:
+        if self.pos + 2 > len(self.body):
+            raise ProtocolError("Packet is too short.")
+        value, = struct.unpack_from('!H', self.body, self.pos)
+        self.pos += 2
+        return value
+
+    def byte(self) -> int:
+        if self.pos >= len(self.body):
+            raise ProtocolError("Packet is too short.")
+        self.pos += 1
+        return self.body[self.pos - 1]
+
+    def data(self) -> bytes:
+        length = self.uint16()
+        if self.pos + length > len(self.body):
+            raise ProtocolError("Packet is too short.")
+        self.pos += length
+        return self.body[self.pos - length:self.pos]
+
+    def string(self) -> str:
+        return self.data().decode('utf-8')
+
+    def rest(self) -> bytes:
+        rest = self.body[self.pos:]
+        self.pos = len(self.body)
+        return rest
+
+    def at_end(self) -> bool:
+        return self.pos >= len(self.body)
+
+
+class BrokerSession(object):
+    def __init__(self, broker, write, close):
+        """
+        I am the connection of one client to the broker.
+
+        :param broker: The broker.
+        :param write: Callable that sends bytes to the client.
+        :param close: Callable that closes the connection to the client.
+        """
+        self.broker = broker
+        self.write = write
+        self.close = close
+        self.reader = PacketReader()
+        self.client_id = None
+        self.subscriptions = {}  # Topic filter with the granted QoS.
+        self.unacknowledged = {}  # Packet id of QoS 1 messages sent, waiting for the PUBACK.
+        self.will = None
+        self._packet_id = 0
+
+    def data_received(self, data: bytes) -> None:
+        try:
+            for packet_type, flags, body in self.reader.feed(data):
+                with self.broker.lock:
+                    self.handle(packet_type, flags, body)
+        except (ProtocolError, UnicodeDecodeError):
+            self.close()
+
+    def handle(self, packet_type: int, flags: int, body: bytes) -> None:
+        reader = _BodyReader(body)
+        if self.client_id is None and packet_type != CONNECT:
+            raise ProtocolError("First packet is not a CONNECT.")
+        if packet_type == CONNECT:
+            self._connect(reader)
+        elif packet_type == PUBLISH:
+            self._publish(flags, reader)
+        elif packet_type == PUBACK:
+            self.unacknowledged.pop(reader.uint16(), None)
+        elif packet_type == PUBREL:
+            self.write(Packet(PUBCOMP, 0, struct.pack('!H', reader.uint16())))
+        elif packet_type == SUBSCRIBE:
+            self._subscribe(reader)
+        elif packet_type == UNSUBSCRIBE:
+            packet_id = reader.uint16()
+            while not reader.at_end():
+                self.subscriptions.pop(reader.string(), None)
+            self.write(Packet(UNSUBACK, 0, struct.pack('!H', packet_id)))
+        elif packet_type == PINGREQ:
+            self.write(Packet(PINGRESP, 0))
+        elif packet_type == DISCONNECT:
+            self.will = None
+            self.close()
+        elif packet_type not in (PUBREC, PUBCOMP):  # The broker never sends QoS 2, so these don't come.
+            raise ProtocolError("Unexpected packet type %d." % packet_type)
+
+    def _connect(self, reader: _BodyReader) -> None:
+        if self.client_id is not None:
+            raise ProtocolError("Second CONNECT.")
+        protocol_name = reader.string()
+        level = reader.byte()
+        if (protocol_name, level) not in (('MQTT', 4), ('MQIsdp', 3)):
+            self.write(Packet(CONNACK, 0, b'\x00\x01'))  # Unacceptable protocol version.
+            self.close()
+            return
+        connect_flags = reader.byte()
+        reader.uint16()  # Keepalive. Connections are never timed out.
+        self.client_id = reader.string()
+        if connect_flags & 4:
+            will_topic = reader.string()
+            self.will = (will_topic, reader.data(), (connect_flags >> 3) & 3, bool(connect_flags & 32))
+        self.broker.sessions.append(self)
+        self.write(Packet(CONNACK, 0, b'\x00\x00'))
+
+    def _publish(self, flags: int, reader: _BodyReader) -> None:
+        qos = (flags >> 1) & 3
+        topic = reader.string()
+        if '+' in topic or '#' in topic:
+            raise ProtocolError("Wildcard in the topic of a PUBLISH.")
+        packet_id = reader.uint16() if qos else None
+        self.broker.route(topic, reader.rest(), qos, bool(flags & 1))
+        if qos == 1:
+            self.write(Packet(PUBACK, 0, struct.pack('!H', packet_id)))
+        elif qos == 2:
+            self.write(Packet(PUBREC, 0, struct.pack('!H', packet_id)))
+
+    def _subscribe(self, reader: _BodyReader) -> None:
+        packet_id = reader.uint16()
+        granted = []
+        topic_filters = []
+        while not reader.at_end():
+            topic_filter = reader.string()
+            qos = min(reader.byte() & 3, 1)
+            self.subscriptions[topic_filter] = qos
+            topic_filters.append(topic_filter)
+            granted.append(qos)
+        self.write(Packet(SUBACK, 0, struct.pack('!H', packet_id) + bytes(granted)))
+        for topic, (payload, qos) in sorted(self.broker.retained.items()):
+            for topic_filter in topic_filters:
+                if TopicMatches(topic_filter, topic):
+                    self.deliver(topic, payload, min(qos, self.subscriptions[topic_filter]), retain=True)
+                    break
+
+    def qos_for(self, topic: str):
+        """
+        I return the QoS a message on topic is delivered with to this client. None when it's not subscribed to it.
+        """
+        matching = [qos for topic_filter, qos in self.subscriptions.items() if TopicMatches(topic_filter, topic)]
+        return max(matching) if matching else None
+
+    def deliver(self, topic: str, payload: bytes, qos: int, retain: bool=False) -> None:
+        body = EncodeString(topic)
+        if qos:
+            self._packet_id = self._packet_id % 65535 + 1
+            self.unacknowledged[self._packet_id] = topic
+            body += struct.pack('!H', self._packet_id)
+        self.write(Packet(PUBLISH, qos << 1 | int(retain), body + payload))
+
+    def connection_lost(self) -> None:
+        with self.broker.lock:
+            if self in self.broker.sessions:
+                self.broker.sessions.remove(self)
+            if self.will is not None:
+                will, self.will = self.will, None
+                self.broker.route(*will)
+
+
+class Broker(object):
+    def __init__(self):
+        """
+        I keep the retained messages and the clients that are connected, and pass messages between them.
+        """
+        self.lock = threading.RLock()
+        self.sessions = []
+        self.retained = {}  # Topic with the payload and QoS of the retained message.
+        self.messages = []  # Topic and payload of every message published, for the tests to look at.
+
+    def connect(self, write, close) -> BrokerSession:
+        return BrokerSession(self, write, close)
+
+    def route(self, topic: str, payload: bytes, qos: int, retain: bool) -> None:
+        with self.lock:
+            self.messages.append((topic, payload))
+            if retain:
+                if payload:
+                    self.retained[topic] = (payload, min(qos, 1))
+                else:
+                    self.retained.pop(topic, None)
+            for session in list(self.sessions):
+                granted = session.qos_for(topic)
+                if granted is not None:
+                    session.deliver(topic, payload, min(qos, granted))
+
+
+class BrokerProtocol(Protocol):
+    def connectionMade(self):
+        self.session = self.factory.broker.connect(self.transport.write, self.transport.loseConnection)
+
+    def dataReceived(self, data):
+        self.session.data_received(data)
+
+    def connectionLost(self, reason=None):
+        self.session.connection_lost()
+
+
+class BrokerFactory(Factory):
+    protocol = BrokerProtocol
+
+    def __init__(self, broker: Broker=None):
+        self.broker = Broker() if broker is None else broker
+
+
+def ConnectInMemory(broker_factory: BrokerFactory, client_protocol) -> iosim.IOPump:
+    """
+    I connect a twisted client protocol to the broker without a socket. Data only moves when the returned pump is
+    pumped, see PumpAll.
+    """
+    server_protocol = broker_factory.buildProtocol(IPv4Address('TCP', '127.0.0.1', 1883))
+    return iosim.connect(server_protocol, iosim.makeFakeServer(server_protocol),
+                         client_protocol, iosim.makeFakeClient(client_protocol))
+
+
+def PumpAll(pumps: list) -> None:
+    """
+    I move data over the in memory connections until none of them have any left.
+    """
+    while any([pump.pump() for pump in pumps]):
+        pass
+
+
+class _SocketHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        write_lock = threading.Lock()
+
+        def write(data):
+            with write_lock:
+                try:
+                    self.request.sendall(data)
+                except OSError:
+                    pass
+
+        def close():
+            try:
+                self.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+        session = self.server.broker.connect(write, close)
+        try:
+            while True:
+                try:
+                    data = self.request.recv(65536)
+                except OSError:
+                    break
+                if not data:
+                    break
+                session.data_received(data)
+        finally:
+            session.connection_lost()
+
+
+class ThreadedBroker(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, broker: Broker=None):
+        """
+        I serve a Broker on a free port of localhost, from a thread of my own. Use me as a context manager.
+        """
+        super().__init__(('127.0.0.1', 0), _SocketHandler)
+        self.broker = Broker() if broker is None else broker
+        self.port = self.server_address[1]
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
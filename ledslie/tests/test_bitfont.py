@@ -0,0 +1,277 @@
+import os
+
+import pytest
+
+from ledslie.bitfont import FontMapping, _FontMapping
+from ledslie.bitfont.compiled import LoadBitFont, MappedFont, WriteFontCache, ReadCacheHeader, FontCacheError, \
+    CachePath
+from ledslie.bitfont.font6x7 import font6x7
+from ledslie.bitfont.font8x8 import font8x8
+from ledslie.config import Config
+from ledslie.messages import FrameSequence, TextTripleLinesLayout
+from ledslie.processors.typesetter import MarkupLine, Typesetter
+
+TEST_BDF = """STARTFONT 2.1
+FONT -test-small-medium-r-normal--10-100-75-75-c-60-iso10646-1
+SIZE 10 75 75
+FONTBOUNDINGBOX 5 10 0 -2
+STARTPROPERTIES 2
+FONT_ASCENT 8
+FONT_DESCENT 2
+ENDPROPERTIES
+CHARS 4
+STARTCHAR question
+ENCODING 63
+SWIDTH 600 0
+DWIDTH 6 0
+BBX 3 3 1 5
+BITMAP
+E0
+20
+40
+ENDCHAR
+STARTCHAR I
+ENCODING 73
+SWIDTH 600 0
+DWIDTH 6 0
+BBX 1 8 2 0
+BITMAP
+80
+80
+80
+80
+80
+80
+80
+80
+ENDCHAR
+STARTCHAR g
+ENCODING 103
+SWIDTH 600 0
+DWIDTH 6 0
+BBX 4 6 0 -2
+BITMAP
+F0
+90
+90
+70
+10
+E0
+ENDCHAR
+STARTCHAR snowman
+ENCODING 9731
+SWIDTH 600 0
+DWIDTH 6 0
+BBX 5 5 0 0
+BITMAP
+F8
+F8
+F8
+F8
+F8
+ENDCHAR
+ENDFONT
+"""
+
+TALL_BDF = """STARTFONT 2.1
+FONT -test-tall-medium-r-normal--16-160-75-75-c-60-iso10646-1
+SIZE 16 75 75
+FONTBOUNDINGBOX 5 16 0 0
+STARTPROPERTIES 2
+FONT_ASCENT 16
+FONT_DESCENT 0
+ENDPROPERTIES
+CHARS 1
+STARTCHAR I
+ENCODING 73
+SWIDTH 600 0
+DWIDTH 6 0
+BBX 1 16 2 0
+BITMAP
+""" + "80\n" * 16 + """ENDCHAR
+ENDFONT
+"""
+
+
+@pytest.fixture
+def bdf_path(tmpdir):
+    path = os.path.join(str(tmpdir), "small.bdf")
+    with open(path, 'w') as f:
+        f.write(TEST_BDF)
+    return path
+
+
+class TestGenericFont(object):
+    def test_extent(self):
+        left, ink_width, advance = font8x8.extent("i")
+        assert ink_width < font8x8.width
+        assert advance == ink_width + font8x8.spacing
+        assert font8x8.extent("i")[2] < font8x8.extent("W")[2]
+        assert (0, 8, 8) == font8x8.extent("i", proportional=False)
+        assert font8x8.extent("?") == font8x8.extent("￿")  # Missing characters become a question mark.
+
+    def test_extent_blank(self):
+        assert (0, 0, 4) == font8x8.extent(" ")
+        assert (0, 0, 3) == font6x7.extent(" ")
+
+    def test_text_width(self):
+        assert 0 == font6x7.text_width("")
+        assert 3 * 6 == font6x7.text_width("iii", proportional=False)
+        assert font6x7.text_width("iii") < font6x7.text_width("WWW")
+        assert sum([font6x7.extent(c)[2] for c in "Hello"]) == font6x7.text_width("Hello")
+
+    def test_fit(self):
+        display_width = Config()['DISPLAY_WIDTH']
+        assert 18 == font8x8.fit("x" * 30, display_width, proportional=False)
+        assert 24 == font6x7.fit("x" * 30, display_width, proportional=False)
+        assert 5 == font8x8.fit("Hello", display_width)
+        text = "i" * 100
+        nr = font8x8.fit(text, display_width)
+        assert font8x8.text_width(text[:nr]) - font8x8.spacing <= display_width
+        assert font8x8.text_width(text[:nr+1]) - font8x8.spacing > display_width
+
+    def test_columns(self):
+        columns = font8x8.columns("i", scale=2, proportional=True)
+        assert 2 * font8x8.extent("i")[2] == len(columns)
+        assert all([16 == len(c) for c in columns])
+        assert 8 == len(font8x8.columns("i"))
+        assert columns is font8x8.columns("i", scale=2, proportional=True)  # Cached
+
+    def test_wrap(self):
+        assert ["Hello", "world"] == list(font8x8.wrap("Hello world", 6*8, proportional=False))
+        assert ["Hello world"] == list(font8x8.wrap("Hello world", 144, proportional=False))
+        assert ["Hello", "", "world"] == list(font8x8.wrap("Hello\n\nworld", 144))
+        assert [""] == list(font8x8.wrap("", 144))
+
+    def test_wrap_long_word(self):
+        lines = list(font8x8.wrap("a " + "x" * 20 + " b", 144, proportional=False))
+        assert ["a", "x" * 18, "xx b"] == lines
+
+    def test_wrap_fits(self):
+        text = "The quick brown fox jumps over the lazy dog. " * 50
+        for proportional in (True, False):
+            lines = list(font6x7.wrap(text, 144, proportional))
+            assert len(lines) > 1
+            for line in lines:
+                assert len(line) == font6x7.fit(line, 144, proportional)
+            assert text.split() == " ".join(lines).split()
+
+    def test_font_mapping(self):
+        assert FontMapping['8x8'] is font8x8
+        assert FontMapping['6x7'] is font6x7
+
+
+class TestMarkupLine(object):
+    def test_proportional(self):
+        line = "il" * 20
+        mono, prop = bytearray(), bytearray()
+        MarkupLine(mono, line, font8x8)
+        MarkupLine(prop, line, font8x8, proportional=True)
+        display_width = Config()['DISPLAY_WIDTH']
+        assert len(mono) == len(prop) == display_width * 8
+        assert prop != mono
+        assert font8x8.fit(line, display_width) > font8x8.fit(line, display_width, proportional=False)
+
+
+class TestCompiledFont(object):
+    def test_load_bdf(self, bdf_path, tmpdir):
+        font = LoadBitFont(bdf_path, str(tmpdir))
+        assert isinstance(font, MappedFont)
+        assert (6, 10) == (font.width, font.height)
+        assert os.path.exists(CachePath(bdf_path, str(tmpdir)))
+        assert [1 << 2] * 8 + [0, 0] == font[ord("I")]  # The I stands on the base line.
+        assert 0x0f == font[ord("g")][4]
+        assert 0x07 == font[ord("g")][-1]  # The g goes below the base line.
+        assert 0x1f == font[ord("\u2603")][3]  # Codepoints outside of 8 bit are kept.
+        assert font.glyph("x") == font[ord("?")]
+        assert ord("I") in font and ord("x") not in font
+        assert (2, 1, 2) == font.extent("I")
+        assert font.extent("?") == font.extent("x")
+        assert font.text_width("II") == 4
+
+    def test_cache_reused(self, bdf_path, tmpdir):
+        LoadBitFont(bdf_path, str(tmpdir))
+        cache_path = CachePath(bdf_path, str(tmpdir))
+        mtime = os.stat(cache_path).st_mtime_ns
+        LoadBitFont(bdf_path, str(tmpdir))
+        assert mtime == os.stat(cache_path).st_mtime_ns
+
+    def test_same_name(self, bdf_path, tmpdir):
+        other_path = os.path.join(str(tmpdir.mkdir("other")), "small.bdf")
+        with open(other_path, 'w') as f:
+            f.write(TALL_BDF)
+        cache_directory = str(tmpdir.mkdir("cache"))
+        assert CachePath(bdf_path, cache_directory) != CachePath(other_path, cache_directory)
+        assert 10 == LoadBitFont(bdf_path, cache_directory).height
+        assert 16 == LoadBitFont(other_path, cache_directory).height
+
+    def test_cache_directory_private(self, bdf_path, tmpdir):
+        cache_directory = str(tmpdir.join("new", "cache"))
+        LoadBitFont(bdf_path, cache_directory)
+        assert 0o700 == os.stat(cache_directory).st_mode & 0o777
+        os.chmod(cache_directory, 0o777)
+        with pytest.raises(FontCacheError):
+            LoadBitFont(bdf_path, cache_directory)
+
+    def test_builtin_roundtrip(self, tmpdir):
+        cache_path = os.path.join(str(tmpdir), "font6x7.lsbf")
+        WriteFontCache(font6x7, cache_path)
+        font = MappedFont(cache_path)
+        for codepoint in font6x7:
+            assert font6x7[codepoint] == font[codepoint]
+            assert font6x7.extent(chr(codepoint)) == font.extent(chr(codepoint))
+        line, mapped_line = bytearray(), bytearray()
+        MarkupLine(line, "Hello World", font6x7, proportional=True)
+        MarkupLine(mapped_line, "Hello World", font, proportional=True)
+        assert line == mapped_line
+
+    def test_not_a_cache(self, tmpdir):
+        path = os.path.join(str(tmpdir), "bogus.lsbf")
+        with open(path, 'wb') as f:
+            f.write(b"Not a font cache" * 4)
+        assert ReadCacheHeader(open(path, 'rb').read()) is None
+        with pytest.raises(FontCacheError):
+            MappedFont(path)
+
+    def test_font_mapping_installed(self, bdf_path, tmpdir, monkeypatch):
+        monkeypatch.setitem(Config(), 'BITFONT_DIRECTORIES', [str(tmpdir)])
+        monkeypatch.setitem(Config(), 'BITFONT_CACHE_DIRECTORY', str(tmpdir))
+        mapping = _FontMapping()
+        assert "small" in mapping
+        assert "8x8" in mapping.keys() and "small" in mapping.keys()
+        assert mapping["small"] is mapping["small"]
+        with pytest.raises(KeyError):
+            mapping["missing"]
+
+    def test_typeset_installed_font(self, bdf_path, tmpdir, monkeypatch):
+        monkeypatch.setitem(Config(), 'BITFONT_DIRECTORIES', [str(tmpdir)])
+        monkeypatch.setitem(Config(), 'BITFONT_CACHE_DIRECTORY', str(tmpdir))
+        monkeypatch.setattr("ledslie.processors.typesetter.FontMapping", _FontMapping())
+        msg = TextTripleLinesLayout()
+        msg.size = "small"
+        msg.lines = ["I", "g"]
+        seq = FrameSequence()
+        Typesetter(None, None).typeset_3lines(seq, msg)
+        assert 1 == len(seq)
+        assert Config()['DISPLAY_SIZE'] == len(seq[0])
+        msg.lines = ["I", "g", "I"]  # Only two lines of 10 high fit.
+        seq = FrameSequence()
+        Typesetter(None, None).typeset_3lines(seq, msg)
+        assert 1 < len(seq)
+
+    def test_typeset_tall_font(self, tmpdir, monkeypatch):
+        with open(os.path.join(str(tmpdir), "tall.bdf"), 'w') as f:
+            f.write(TALL_BDF)
+        monkeypatch.setitem(Config(), 'BITFONT_DIRECTORIES', [str(tmpdir)])
+        monkeypatch.setitem(Config(), 'BITFONT_CACHE_DIRECTORY', str(tmpdir))
+        monkeypatch.setattr("ledslie.processors.typesetter.FontMapping", _FontMapping())
+        font = LoadBitFont(os.path.join(str(tmpdir), "tall.bdf"), str(tmpdir))
+        assert [0] * 16 == font.glyph("x")  # No question mark in the font.
+        assert (0, 0, 3) == font.extent("x")
+        msg = TextTripleLinesLayout()
+        msg.size = "tall"
+        msg.lines = ["Ix"]
+        seq = FrameSequence()
+        Typesetter(None, None).typeset_3lines(seq, msg)
+        assert 1 == len(seq)
+        assert Config()['DISPLAY_SIZE'] == len(seq[0])
@@ -0,0 +1,106 @@
+import json
+import threading
+
+import paho.mqtt.client as paho
+from mqtt.client.factory import MQTTFactory
+from twisted.internet.task import Clock
+
+from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS
+from ledslie.processors.scheduler import Scheduler
+from ledslie.processors.typesetter import Typesetter
+from ledslie.tests.broker import ThreadedBroker, BrokerFactory, ConnectInMemory, PumpAll, PacketReader, Packet, \
+    EncodeLength, PUBLISH
+from ledslie.tests.fakes import FakeLEDScreen
+
+
+def make_protocol():
+    return MQTTFactory(profile=MQTTFactory.PUBLISHER | MQTTFactory.SUBSCRIBER).buildProtocol(None)
+
+
+class TestPackets(object):
+    def test_length(self):
+        assert b'\x00' == EncodeLength(0)
+        assert b'\x7f' == EncodeLength(127)
+        assert b'\x80\x01' == EncodeLength(128)
+        assert b'\xff\xff\x7f' == EncodeLength(2097151)
+
+    def test_reader(self):
+        reader = PacketReader()
+        packet = Packet(PUBLISH, 3, b'x' * 200)
+        assert [] == reader.feed(packet[:2])
+        assert [(PUBLISH, 3, b'x' * 200), (PUBLISH, 0, b'')] == reader.feed(packet[2:] + Packet(PUBLISH, 0))
+
+
+class TestTwistedClients(object):
+    def test_publish_subscribe(self):
+        broker_factory = BrokerFactory()
+        publisher, subscriber = make_protocol(), make_protocol()
+        pumps = [ConnectInMemory(broker_factory, publisher), ConnectInMemory(broker_factory, subscriber)]
+        received = []
+        subscriber.onPublish = lambda topic, payload, qos, dup, retain, msgId: received.append((topic, payload, qos))
+        publisher.connect("publisher", keepalive=0)
+        subscriber.connect("subscriber", keepalive=0)
+        PumpAll(pumps)
+        subscriber.subscribe("ledslie/sequences/1/+", 1)
+        PumpAll(pumps)
+        acknowledged = publisher.publish("ledslie/sequences/1/rain", bytearray(b'rain'), qos=1)
+        publisher.publish("ledslie/text", bytearray(b'other topic'), qos=0)
+        PumpAll(pumps)
+        assert acknowledged.called
+        assert [("ledslie/sequences/1/rain", bytearray(b'rain'), 1)] == received
+
+    def test_pipeline(self):
+        broker_factory = BrokerFactory()
+        clock = Clock()
+        typesetter = Typesetter(None, None)
+        scheduler = Scheduler(None, None)
+        scheduler.led_screen = FakeLEDScreen()
+        pumps = []
+        for service in (typesetter, scheduler):
+            service.reactor = clock
+            service._system_name = service.__class__.__name__
+            protocol = make_protocol()
+            pumps.append(ConnectInMemory(broker_factory, protocol))
+            service.connectToBroker(protocol)
+            PumpAll(pumps)
+        client = make_protocol()
+        pumps.append(ConnectInMemory(broker_factory, client))
+        client.connect("site", keepalive=0)
+        PumpAll(pumps)
+        client.publish(LEDSLIE_TOPIC_TYPESETTER_1LINE, json.dumps({'text': 'Hello', 'program': 'hello'}), qos=1)
+        PumpAll(pumps)
+        assert ['hello'] == scheduler.catalog.list_current_programs()
+        topics = [topic for topic, payload in broker_factory.broker.messages]
+        assert LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + 'hello' in topics
+
+
+class TestPaho(object):
+    def _client(self, broker, client_id):
+        client = paho.Client(paho.CallbackAPIVersion.VERSION2, client_id=client_id)
+        client.connect('127.0.0.1', broker.port)
+        client.loop_start()
+        return client
+
+    def test_retain_and_wildcards(self):
+        with ThreadedBroker() as broker:
+            publisher = self._client(broker, "publisher")
+            publisher.publish("ledslie/sequences/1/rain", b'rain', qos=1, retain=True).wait_for_publish(5)
+            received = []
+            got_two = threading.Event()
+            subscribed = threading.Event()
+
+            def on_message(client, userdata, message):
+                received.append((message.topic, message.payload, message.qos, message.retain))
+                if len(received) == 2:
+                    got_two.set()
+            subscriber = self._client(broker, "subscriber")
+            subscriber.on_message = on_message
+            subscriber.on_subscribe = lambda *args: subscribed.set()
+            subscriber.subscribe("ledslie/#", qos=1)
+            assert subscribed.wait(5)
+            publisher.publish("ledslie/text", b'hi', qos=1).wait_for_publish(5)
+            assert got_two.wait(5)
+            for client in (publisher, subscriber):
+                client.disconnect()
+                client.loop_stop()
+        assert [("ledslie/sequences/1/rain", b'rain', 1, True), ("ledslie/text", b'hi', 1, False)] == received
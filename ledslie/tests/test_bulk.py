@@ -0,0 +1,97 @@
+import base64
+
+import pytest
+
+from ledslie.interface import site
+from ledslie.interface.bulk import BulkItems, BulkError, PublishBatch
+
+
+class FakeMessageInfo(object):
+    def __init__(self, published=True, rc=0):
+        self.published = published
+        self.rc = rc
+        self.waited = None
+
+    def wait_for_publish(self, timeout=None):
+        self.waited = timeout
+        if self.rc:
+            raise RuntimeError("Message publish failed: %d" % self.rc)
+
+    def is_published(self):
+        return self.published
+
+
+class FakePahoClient(object):
+    def __init__(self, infos):
+        self.infos = list(infos)
+        self.published = []
+
+    def publish(self, topic, payload, qos, retain=False):
+        assert not any(info.waited is not None for info in self.infos_given()), "Waited before all were sent."
+        self.published.append((topic, payload, qos))
+        return self.infos[len(self.published) - 1]
+
+    def infos_given(self):
+        return self.infos[:len(self.published)]
+
+
+class FakeJobQueue(object):
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, program, func, *args):
+        self.submitted.append((program, args))
+        job = FakeMessageInfo()
+        job.id = "job%d" % len(self.submitted)
+        return job
+
+
+@pytest.fixture
+def site_client(monkeypatch):
+    site.app.config.from_object('ledslie.defaults')
+    monkeypatch.setattr(site.mqtt, 'client', FakePahoClient([FakeMessageInfo() for n in range(200)]))
+    monkeypatch.setattr(site, '_ingress_limits', None)
+    monkeypatch.setattr(site, '_upload_jobs', FakeJobQueue())
+    yield site.app.test_client()
+
+
+class TestBulk(object):
+    def test_items(self):
+        assert [{'type': 'text'}] == BulkItems([{'type': 'text'}], 2)
+        assert [{'type': 'text'}] == BulkItems({'programs': [{'type': 'text'}]}, 2)
+        with pytest.raises(BulkError):
+            BulkItems({'type': 'text'}, 2)
+        with pytest.raises(BulkError):
+            BulkItems(None, 2)
+        with pytest.raises(BulkError):
+            BulkItems([{}, {}, {}], 2)
+
+    def test_publish_batch(self):
+        infos = [FakeMessageInfo(), FakeMessageInfo(rc=4), FakeMessageInfo(published=False)]
+        client = FakePahoClient(infos)
+        results = PublishBatch(client, [("a", "1"), ("b", "2"), ("c", "3")], 1, 5)
+        assert [("a", "1", 1), ("b", "2", 1), ("c", "3", 1)] == client.published
+        assert results[0] is None
+        assert "failed" in results[1]
+        assert "Not acknowledged" in results[2]
+        assert all(info.waited <= 5 for info in infos)
+
+    def test_more_programs_than_burst(self, site_client):
+        items = [{'type': 'text', 'program': 'bulk%d' % n, 'text': 'Hello', 'duration': '5000', 'font_size': '0'}
+                 for n in range(21)]
+        assert 21 > site.app.config['SITE_LIMIT_CLIENT_BURST']
+        response = site_client.post('/programs', json=items)
+        assert 200 == response.status_code
+        assert ['published'] * 21 == [result['status'] for result in response.get_json()['results']]
+        response = site_client.post('/programs', json=items)
+        assert 429 == response.status_code  # The burst is used up, until it has filled up again.
+        assert int(response.headers['Retry-After']) > 1
+
+    def test_dither_boolean(self, site_client):
+        image = base64.b64encode(b"GIF89a").decode()
+        items = [{'type': 'gif', 'program': 'gif%d' % nr, 'f': image, 'dither': dither}
+                 for nr, dither in enumerate([True, False, "on", 1])]
+        response = site_client.post('/programs', json=items)
+        assert 200 == response.status_code
+        assert ['queued'] * 4 == [result['status'] for result in response.get_json()['results']]
+        assert [True, False, True, True] == [args[-1] for program, args in site._upload_jobs.submitted]
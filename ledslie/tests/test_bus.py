@@ -0,0 +1,128 @@
+import json
+
+from twisted.internet.task import Clock
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, \
+    LEDSLIE_TOPIC_CHUNKS_PROGRAMS
+from ledslie.messages import FrameSequence, TextSingleLineLayout, Frame
+from ledslie.processors.allinone import HostService
+from ledslie.processors.bus import TopicMatches, TopicBus, BusProtocol, BusBridge
+from ledslie.processors.scheduler import Scheduler
+from ledslie.processors.typesetter import Typesetter
+from ledslie.tests.fakes import FakeMqttProtocol, FakeLEDScreen
+
+
+def test_topic_matches():
+    assert TopicMatches('ledslie/sequences/1/+', 'ledslie/sequences/1/rain')
+    assert not TopicMatches('ledslie/sequences/1/+', 'ledslie/sequences/1')
+    assert not TopicMatches('ledslie/sequences/1/+', 'ledslie/sequences/1/rain/extra')
+    assert TopicMatches('ledslie/error/#', 'ledslie/error')
+    assert TopicMatches('ledslie/error/#', 'ledslie/error/scheduler')
+    assert TopicMatches('ledslie/text', 'ledslie/text')
+    assert not TopicMatches('ledslie/text', 'ledslie/texts')
+
+
+class TestTopicBus(object):
+    def test_objects_handed_over(self, monkeypatch):
+        def no_serialize(self):
+            raise AssertionError("Serialized within the process.")
+        monkeypatch.setattr(FrameSequence, 'serialize', no_serialize)
+        clock = Clock()
+        bus = TopicBus(clock)
+        typesetter = Typesetter(None, None)
+        typesetter.reactor = clock
+        HostService(typesetter, bus)
+        scheduler = Scheduler(None, None)
+        scheduler.reactor = clock
+        scheduler.led_screen = FakeLEDScreen()
+        HostService(scheduler, bus)
+        clock.advance(0)
+        layout = TextSingleLineLayout()
+        layout.text = "Hello"
+        layout.program = "hello"
+        bus.publish(LEDSLIE_TOPIC_TYPESETTER_1LINE, layout)
+        clock.advance(0)  # The typesetter gets the layout.
+        clock.advance(0)  # The scheduler gets the sequence.
+        assert ['hello'] == scheduler.catalog.list_current_programs()
+
+    def test_not_to_sender(self):
+        clock = Clock()
+        bus = TopicBus(clock)
+        first, second = BusProtocol(bus), BusProtocol(bus)
+        received = []
+        for protocol in (first, second):
+            protocol.subscribe('ledslie/#')
+            protocol.onPublish = lambda *args, protocol=protocol: received.append((protocol, args[1]))
+        first.publish('ledslie/text', "Hi")
+        clock.advance(0)
+        assert [(second, b"Hi")] == received
+
+
+class TestBusBridge(object):
+    def test_echo_dropped(self):
+        clock = Clock()
+        bus = TopicBus(clock)
+        bridge = BusBridge(None, None, reactor=clock)
+        bridge.protocol = FakeMqttProtocol()
+        topic_filter = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS
+        bridge.attach(bus, [topic_filter], [topic_filter])
+        local = BusProtocol(bus)
+        local.subscribe(topic_filter)
+        received = []
+        local.onPublish = lambda topic, payload, *args: received.append(payload)
+        topic = topic_filter[:-1] + "rain"
+        sequence = json.dumps([[], {}]).encode()
+        local.publish(topic, sequence)
+        clock.advance(0)
+        assert [(topic, bytearray(sequence))] == bridge.protocol._published_messages
+        bridge.onPublish(topic, sequence, 1, False, False, 1)  # The broker sends it back.
+        clock.advance(0)
+        assert [] == received
+        bridge.onPublish(topic, b'', 1, False, False, 2)  # From outside the process.
+        clock.advance(0)
+        assert [b''] == received
+
+    def test_chunks_echo_dropped(self, monkeypatch):
+        monkeypatch.setitem(Config(), 'SEQUENCE_CHUNK_BYTES', 1)
+        clock = Clock()
+        bus = TopicBus(clock)
+        bridge = BusBridge(None, None, reactor=clock)
+        bridge.protocol = FakeMqttProtocol()
+        bridge.attach(bus, [LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_CHUNKS_PROGRAMS],
+                      [LEDSLIE_TOPIC_SEQUENCES_PROGRAMS])
+        local = BusProtocol(bus)
+        local.subscribe(LEDSLIE_TOPIC_CHUNKS_PROGRAMS)
+        received = []
+        local.onPublish = lambda topic, payload, *args: received.append(payload)
+        sequence = FrameSequence()
+        for level in range(3):
+            sequence.add_frame(Frame(bytearray([level]) * Config()['DISPLAY_SIZE'], 100))
+        local.publish(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "gif", sequence)
+        clock.advance(0)
+        published = bridge.protocol._published_messages
+        assert [LEDSLIE_TOPIC_CHUNKS_PROGRAMS[:-1] + "gif"] * 3 == [topic for topic, payload in published]
+        for topic, payload in published:
+            bridge.onPublish(topic, payload, 1, False, False, 1)  # The broker sends the chunks back.
+        clock.advance(0)
+        assert [] == received
+
+    def test_exported_as_published(self):
+        clock = Clock()
+        bus = TopicBus(clock)
+        scheduler = Scheduler(None, None)
+        scheduler.reactor = clock
+        scheduler.led_screen = FakeLEDScreen()
+        HostService(scheduler, bus)
+        bridge = BusBridge(None, None, reactor=clock)
+        bridge.protocol = FakeMqttProtocol()
+        bridge.attach(bus, [], [LEDSLIE_TOPIC_SEQUENCES_PROGRAMS])
+        clock.advance(0)
+        sequence = FrameSequence()
+        sequence.add_frame(Frame(bytearray(Config()['DISPLAY_SIZE']), 5000))
+        BusProtocol(bus).publish(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "still", sequence)
+        clock.advance(0)
+        assert ['still'] == scheduler.catalog.list_current_programs()  # Animated as a still by the scheduler.
+        [(topic, payload)] = bridge.protocol._published_messages
+        exported = FrameSequence().load(payload)
+        assert [5000] == [frame.duration for frame in exported.frames]
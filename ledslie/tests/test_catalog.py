@@ -79,6 +79,23 @@ class TestCatalog(object):
         catalog.now = lambda: 30+Config()["PROGRAM_RETIREMENT_AGE"]
         assert bytearray(b"Bar2") == next(f_iter).raw()[0:4]  # Still exists, because "Second" was updated.
 
+    def test_retired_program_returns(self):
+        catalog = Catalog()
+        catalog.now = lambda: 10
+        self._create_and_add_sequence(catalog, "First", ["Foo"])
+        self._create_and_add_sequence(catalog, "Second", ["Bar"], valid_time=30)
+        f_iter = catalog.frames_iter()
+        assert bytearray(b"Bar") == next(f_iter).raw()[0:3]
+        assert bytearray(b"Foo") == next(f_iter).raw()[0:3]
+        catalog.now = lambda: 50
+        assert bytearray(b"Bar") == next(f_iter).raw()[0:3]  # Second now gets retired.
+        assert "Second" not in catalog
+        assert bytearray(b"Foo") == next(f_iter).raw()[0:3]
+        self._create_and_add_sequence(catalog, "Second", ["Baz"])  # Sent again, so it's shown again.
+        assert "Second" in catalog
+        assert bytearray(b"Baz") == next(f_iter).raw()[0:3]
+        assert bytearray(b"Foo") == next(f_iter).raw()[0:3]
+
     def test_valid_for(self):
         catalog = Catalog()
         f_iter = catalog.frames_iter()
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+from twisted.internet.task import Clock
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_CHUNKS_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, \
+    LEDSLIE_TOPIC_CHUNKS_UNNAMED, LEDSLIE_TOPIC_SEQUENCES_UNNAMED
+from ledslie.messages import FrameSequence, Frame, SequencePayloads
+from ledslie.processors.animate import AnimateHorizontalScroll
+from ledslie.processors.chunks import ChunkAssembler, ChunkError
+from ledslie.processors.scheduler import Scheduler
+from ledslie.tests.fakes import FakeMqttProtocol, FakeLEDScreen
+
+
+def make_sequence(nr_of_frames):
+    seq = FrameSequence()
+    for nr in range(nr_of_frames):
+        seq.add_frame(Frame(bytearray([nr]) * Config()['DISPLAY_SIZE'], 100))
+    seq.prio = 'high'
+    return seq
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    frame_bytes = len(json.dumps(make_sequence(1).serialize().decode()))
+    monkeypatch.setitem(Config(), 'SEQUENCE_CHUNK_BYTES', 3 * frame_bytes)
+
+
+@pytest.fixture
+def assembler():
+    dropped = []
+    chunks = ChunkAssembler(Clock(), Config(), lambda program, reason: dropped.append(program))
+    chunks.dropped = dropped
+    return chunks
+
+
+def test_small_sequence_is_whole():
+    topic = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "small"
+    seq = make_sequence(2)
+    assert [(topic, seq.serialize())] == SequencePayloads(topic, seq)
+
+
+def test_chunks_in_any_order(small_chunks, assembler):
+    seq = make_sequence(10)
+    payloads = SequencePayloads(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "big", seq)
+    assert 3 <= len(payloads)
+    assert {LEDSLIE_TOPIC_CHUNKS_PROGRAMS[:-1] + "big"} == {topic for topic, payload in payloads}
+    chunks = [payload for topic, payload in payloads]
+    for chunk in [chunks[0], chunks[2], chunks[1], chunks[1]] + chunks[3:-1]:
+        assert assembler.add("big", chunk) is None
+    assert 0 < assembler.nr_of_bytes
+    result = assembler.add("big", chunks[-1])
+    assert [frame.raw() for frame in seq] == [frame.raw() for frame in result]
+    assert 'high' == result.prio
+    assert 0 == assembler.nr_of_bytes
+
+
+def test_unnamed_and_strip(monkeypatch, assembler):
+    width, height = Config()['DISPLAY_WIDTH'], Config()['DISPLAY_HEIGHT']
+    seq = FrameSequence()
+    AnimateHorizontalScroll(seq, bytearray([nr % 256 for nr in range(width * 3 * height)]), width * 3)
+    monkeypatch.setitem(Config(), 'SEQUENCE_CHUNK_BYTES', 200)  # The first chunk has the whole strip.
+    payloads = SequencePayloads(LEDSLIE_TOPIC_SEQUENCES_UNNAMED, seq)
+    assert 1 < len(payloads) and LEDSLIE_TOPIC_CHUNKS_UNNAMED == payloads[0][0]
+    results = [assembler.add(None, payload) for topic, payload in payloads]
+    assert [frame.raw() for frame in seq] == [frame.raw() for frame in results[-1]]
+
+
+def test_timeout_and_replace(small_chunks, assembler):
+    chunks = [payload for topic, payload in SequencePayloads(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "x",
+                                                             make_sequence(10))]
+    newer = [payload for topic, payload in SequencePayloads(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "x",
+                                                            make_sequence(10))]
+    assembler.add("x", chunks[0])
+    assembler.add("x", newer[0])
+    assert ["x"] == assembler.dropped
+    assembler.reactor.advance(Config()['SEQUENCE_CHUNK_TIMEOUT'])
+    assert ["x", "x"] == assembler.dropped
+    assert not assembler.transfers
+    with pytest.raises(ChunkError):
+        assembler.add("x", make_sequence(1).serialize())
+
+
+def test_memory_cap(small_chunks, monkeypatch, assembler):
+    chunks = [payload for topic, payload in SequencePayloads(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "x",
+                                                             make_sequence(10))]
+    assembler.max_bytes = len(chunks[0]) + 10
+    assembler.add("first", chunks[0])
+    assembler.add("second", chunks[0])
+    assert ["first"] == assembler.dropped  # The oldest goes.
+    assembler.add("second", chunks[1])
+    assert ["first", "second"] == assembler.dropped  # Too large by itself.
+
+
+def test_scheduler_reassembles(small_chunks):
+    sched = Scheduler(None, None)
+    sched.reactor = sched.chunks.reactor = Clock()
+    sched.led_screen = FakeLEDScreen()
+    sched.protocol = FakeMqttProtocol()
+    seq = make_sequence(10)
+    for topic, payload in SequencePayloads(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "big", seq):
+        assert "big" not in sched.catalog
+        sched.onPublish(topic, payload, qos=1, dup=False, retain=False, msgId=0)
+    assert 10 == len(sched.catalog.get_program("big"))
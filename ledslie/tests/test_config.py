@@ -0,0 +1,52 @@
+import pytest
+
+from ledslie.config import Config, Settings, CheckConfig, ReloadConfig, SubscribeConfig, UnsubscribeConfig, \
+    ConfigError, _LoadConfig
+
+
+def test_derived_from_override(tmpdir, monkeypatch):
+    config_file = tmpdir.join("ledslie.cfg")
+    config_file.write("DISPLAY_WIDTH = 96\nMQTT_BROKER_URL = 'broker.example'\n")
+    monkeypatch.setenv('LEDSLIE_CONFIG', str(config_file))
+    config = _LoadConfig(envvar_silent=False)
+    assert 96 * config['DISPLAY_HEIGHT'] == config['DISPLAY_SIZE']
+    assert 'tcp:broker.example:1883' == config['MQTT_BROKER_CONN_STRING']
+
+
+def test_check():
+    config = dict(Config())
+    assert [] == CheckConfig(config)
+    config.update(DISPLAY_DEFAULT_DELAY=2.5, DISPLAY_WIDTH="144", DEBUG=1, TICKER_MAX_ITEMS=True)
+    assert ["DEBUG is a int, not a bool", "DISPLAY_WIDTH is a str, not a int",
+            "TICKER_MAX_ITEMS is a bool, not a int"] == CheckConfig(config)
+    config.update(DISPLAY_WIDTH=0, DEBUG=False, TICKER_MAX_ITEMS=10, PUBLISH_WINDOW=20)
+    assert ["DISPLAY_WIDTH must be a whole number above 0", "PUBLISH_WINDOW must be between 1 and 16"] == \
+        CheckConfig(config)
+
+
+def test_settings(monkeypatch):
+    settings = Settings()
+    assert settings is Settings()
+    assert Config()['DISPLAY_WIDTH'] == settings.DISPLAY_WIDTH
+    with pytest.raises(AttributeError):
+        settings.DISPLAY_WIDTH = 10
+    monkeypatch.setitem(Config(), 'DISPLAY_HEIGHT', 8)
+    changed = Settings()
+    assert changed is not settings
+    assert 8 * changed.DISPLAY_WIDTH == changed.DISPLAY_SIZE
+    assert 7 * changed.DISPLAY_WIDTH == changed.DISPLAY_LAST_ROW_START
+
+
+def test_reload():
+    changes = []
+    SubscribeConfig(changes.append)
+    try:
+        assert {'DISPLAY_DEFAULT_DELAY'} == ReloadConfig({'DISPLAY_DEFAULT_DELAY': 1234})
+        assert 1234 == Settings().DISPLAY_DEFAULT_DELAY
+        with pytest.raises(ConfigError):
+            ReloadConfig({'DISPLAY_DEFAULT_DELAY': "long"})
+        assert 1234 == Config()['DISPLAY_DEFAULT_DELAY']
+        ReloadConfig()
+        assert [{'DISPLAY_DEFAULT_DELAY'}, {'DISPLAY_DEFAULT_DELAY'}] == changes
+    finally:
+        UnsubscribeConfig(changes.append)
@@ -0,0 +1,69 @@
+import io
+import json
+
+from PIL import Image
+
+from ledslie.config import Config
+from ledslie.interface.dashboard import ProgramBoard
+from ledslie.messages import FrameSequence, Frame
+
+
+def sequence_payload(*levels, prio=None):
+    seq = FrameSequence()
+    seq.prio = prio
+    for level in levels:
+        seq.add_frame(Frame(bytearray([level]) * Config()['DISPLAY_SIZE'], 100))
+    return bytes(seq.serialize())
+
+
+class TestProgramBoard(object):
+    def test_sequences(self):
+        board = ProgramBoard(72)
+        board.now = lambda: 1000
+        assert board.on_sequence("clock", sequence_payload(255, 0))
+        assert not board.on_sequence("clock", sequence_payload(255, 0))  # Same as before, not decoded again.
+        [(name, info)] = board.programs()
+        assert ("clock", 2, 200) == (name, info.frames, info.duration)
+        assert 1000 + Config()['PROGRAM_RETIREMENT_AGE'] == info.valid_until
+        image_data, digest = board.thumbnail("clock")
+        assert (72, 12) == Image.open(io.BytesIO(image_data)).size
+        assert board.on_sequence("clock", sequence_payload(0))
+        assert digest != board.thumbnail("clock")[1]
+        board.on_sequence("clock", b"")
+        assert [] == board.programs()
+        assert board.thumbnail("clock") is None
+
+    def test_live_programs(self):
+        board = ProgramBoard(72)
+        board.now = lambda: 1000
+        board.on_sequence("clock", sequence_payload(1))
+        board.on_sequence("alert", sequence_payload(1, prio='alert'))
+        board.on_programs(json.dumps(["rain"]).encode())
+        assert [("alert", True), ("rain", None)] == [(name, info and info.is_alert) for name, info in board.programs()]
+        board.now = lambda: 1000 + Config()['PROGRAM_RETIREMENT_AGE'] + 1
+        assert [("rain", None)] == board.programs()
+
+    def test_broken_sequence(self):
+        board = ProgramBoard(72)
+        assert not board.on_sequence("broken", b"[[], {}]")
+        assert not board.on_sequence("broken", b"{]")
+        assert [] == board.programs()
+
+    def test_chunked_sequence(self):
+        board = ProgramBoard(72)
+        board.now = lambda: 1000
+        seq = FrameSequence()
+        for level in range(4):
+            seq.add_frame(Frame(bytearray([level]) * Config()['DISPLAY_SIZE'], 100))
+        chunks = seq.serialize_chunks(1, 'transfer')
+        assert 4 == len(chunks)
+        assert not any([board.on_chunk("gif", bytes(chunk)) for chunk in chunks[:-1]])
+        assert [] == board.programs()
+        assert board.on_chunk("gif", bytes(chunks[-1]))
+        [(name, info)] = board.programs()
+        assert ("gif", 4, 400) == (name, info.frames, info.duration)
+        assert not board.on_chunk("gif", b"{]")
+        board.on_chunk("gif", bytes(chunks[0]))
+        board.on_sequence("gif", sequence_payload(1))  # A whole sequence replaces the chunks on their way.
+        assert not any([board.on_chunk("gif", bytes(chunk)) for chunk in chunks[1:]])
+        assert 1 == board.programs()[0][1].frames
@@ -0,0 +1,91 @@
+import pytest
+
+from twisted.internet.task import Clock
+from twisted.logger import Logger
+
+from ledslie.config import Config
+from ledslie.content.generic import GenericContent
+from ledslie.content.host import ContentHost, RUNNING, FAILED, STOPPED
+from ledslie.definitions import LEDSLIE_ERROR
+from ledslie.messages import FrameSequence, Frame
+from ledslie.processors.bus import TopicBus
+from ledslie.tests.fakes import FakeMqttProtocol
+from ledslie.tracing import StartTrace, STAGE_SITE, STAGE_CONTENT
+
+
+class TickContent(GenericContent):
+    def __init__(self, endpoint, factory, reactor=None):
+        self.log = Logger(self.__class__.__name__)
+        super().__init__(endpoint, factory, reactor)
+
+    def onBrokerConnected(self):
+        self.repeating.repeat(self.tick, 1)
+
+    def tick(self):
+        self.publish('ledslie/test/tick', b'tick')
+
+
+class BrokenContent(TickContent):
+    def tick(self):
+        raise RuntimeError("Broken on purpose.")
+
+
+class TestContentHost(object):
+    @pytest.fixture
+    def host(self, monkeypatch):
+        monkeypatch.setitem(Config(), 'STATS_INTERVAL', 0)
+        monkeypatch.setitem(Config(), 'CONTENT_HOST_MAX_FAILURES', 3)
+        clock = Clock()
+        host = ContentHost(None, None, reactor=clock)
+        host.protocol = FakeMqttProtocol()
+        host._offline = False
+        host.load(TopicBus(clock), [__name__ + '.TickContent', __name__ + '.BrokenContent',
+                                    'ledslie.content.nothing.NothingContent'])
+        yield host
+        host.stop_plugins()
+
+    def published(self, host, topic):
+        return [message for message_topic, message in host.protocol._published_messages if message_topic == topic]
+
+    def test_failures_contained(self, host):
+        assert FAILED == host.plugins['NothingContent'].state
+        for second in range(5):
+            host.reactor.advance(1)
+        assert RUNNING == host.plugins['TickContent'].state
+        assert 5 <= len(self.published(host, 'ledslie/test/tick'))
+        broken = host.plugins['BrokenContent']
+        assert STOPPED == broken.state
+        assert 3 == broken.failures
+        assert [] == broken.clock.pending_calls()
+        errors = self.published(host, LEDSLIE_ERROR + "/contenthost")
+        assert 2 == len(errors)
+        assert errors[1].startswith(b"Plugin: BrokenContent: stopped after 3 failures in a row")
+
+    def test_usage(self, host):
+        host.reactor.advance(1)
+        host.reactor.advance(1)
+        usage = host.metrics.snapshot()['plugins']
+        assert ['TickContent', 'BrokenContent', 'NothingContent'] == list(usage)
+        assert 0 == usage['TickContent']['failures']
+        assert 2 <= usage['TickContent']['messages_sent']
+        assert 0 < usage['TickContent']['calls']
+        assert 2 == usage['BrokenContent']['failures']
+        assert 1 == usage['TickContent']['pending_calls']
+        assert 'host_cpu_seconds' in host.plugins['TickContent'].service.metrics.snapshot()
+
+
+def test_publish_trace(monkeypatch):
+    monkeypatch.setitem(Config(), 'TRACE_SAMPLE_RATE', 1)
+    content = TickContent(None, None, reactor=Clock())
+    content.protocol = FakeMqttProtocol()
+    content._offline = False
+    traced, untraced = FrameSequence(), FrameSequence()
+    for seq in traced, untraced:
+        seq.add_frame(Frame(bytearray(Config()['DISPLAY_SIZE']), 100))
+    traced.trace = StartTrace(STAGE_SITE)
+    content.publish('ledslie/sequences/1/traced', traced)
+    content.publish('ledslie/sequences/1/untraced', untraced)
+    stages = [[stage for stage, when in FrameSequence().load(payload).trace['stamps']]
+              for topic, payload in content.protocol._published_messages]
+    assert [[STAGE_SITE], [STAGE_CONTENT]] == stages  # A trace that was started is kept.
+    assert untraced.trace is None
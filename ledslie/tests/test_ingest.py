@@ -0,0 +1,95 @@
+import io
+
+import pytest
+from PIL import Image, features
+
+from ledslie.config import Config
+from ledslie.interface.conditioning import Linearize, ConditionFrames
+from ledslie.interface.ingest import IngestFrames, SequenceSummary, UnsupportedImage, ImageTooLarge
+
+
+RED, GREEN = (255, 0, 0), (0, 130, 0)  # Different colors, both the same shade of gray on the display.
+
+
+def animation(colors, file_format='GIF', durations=None, size=(144, 24), mode="L"):
+    frames = [Image.new(mode, size, color) for color in colors]
+    durations = [100] * len(colors) if durations is None else durations
+    fp = io.BytesIO()
+    frames[0].save(fp, format=file_format, save_all=True, append_images=frames[1:], duration=durations, loop=0)
+    fp.seek(0)
+    return fp
+
+
+class TestIngest(object):
+    def test_gif(self):
+        sequence, nr_of_source_frames = IngestFrames(animation([0, 255, 0]))
+        assert 3 == nr_of_source_frames
+        assert 3 == len(sequence)
+        assert 300 == sequence.duration
+        for frame in sequence:
+            assert Config()['DISPLAY_SIZE'] == len(frame.raw())
+
+    def test_resize(self):
+        sequence, nr = IngestFrames(animation([255], size=(20, 10)))
+        assert Config()['DISPLAY_SIZE'] == len(sequence[0].raw())
+
+    def test_fold_same_frames(self):
+        colors = [RED, GREEN, (255, 255, 255), RED, GREEN, RED]
+        fp = animation(colors, file_format='PNG', durations=[100, 200, 100, 100, 100, 50], mode="RGB")
+        sequence, nr_of_source_frames = IngestFrames(fp)
+        assert 6 == nr_of_source_frames
+        assert [300, 100, 250] == [f.duration for f in sequence]
+
+    def test_apng(self):
+        sequence, nr = IngestFrames(animation([0, 128, 255], file_format='PNG'))
+        assert 3 == len(sequence)
+
+    @pytest.mark.skipif(not features.check('webp'), reason="Pillow has no WebP support")
+    def test_webp(self):
+        sequence, nr = IngestFrames(animation([0, 255], file_format='WEBP'))
+        assert 2 == len(sequence)
+
+    def test_not_an_image(self):
+        with pytest.raises(UnsupportedImage):
+            IngestFrames(io.BytesIO(b"This is not an image"))
+
+    def test_too_many_frames(self, monkeypatch):
+        monkeypatch.setitem(Config(), 'INGEST_MAX_FRAMES', 2)
+        with pytest.raises(ImageTooLarge):
+            IngestFrames(animation([0, 255, 0]))
+
+    def test_too_many_bytes(self, monkeypatch):
+        monkeypatch.setitem(Config(), 'INGEST_MAX_BYTES', 2 * Config()['DISPLAY_SIZE'])
+        IngestFrames(animation([RED, GREEN, RED, (0, 0, 0)], 'PNG', mode="RGB"))  # Folds into two frames.
+        with pytest.raises(ImageTooLarge):
+            IngestFrames(animation([0, 255, 0]))
+
+    def test_too_many_pixels(self, monkeypatch):
+        monkeypatch.setitem(Config(), 'INGEST_MAX_PIXELS', 100)
+        with pytest.raises(ImageTooLarge):
+            IngestFrames(animation([0]))
+
+    def test_summary(self):
+        sequence, nr_of_source_frames = IngestFrames(animation([RED, GREEN, (0, 0, 0)], 'PNG', mode="RGB"))
+        payload = sequence.serialize()
+        summary = SequenceSummary(sequence, [payload], nr_of_source_frames)
+        assert {'frames': 2, 'source_frames': 3, 'duration': 300, 'bytes': len(payload), 'chunks': 1} == summary
+
+
+class TestConditioning(object):
+    def test_area_average_in_linear_light(self):
+        width, height = Config()['DISPLAY_WIDTH'], Config()['DISPLAY_HEIGHT']
+        checkers = Image.frombytes("L", (width * 2, height * 2),
+                                   bytes([255 * ((x + y) % 2) for y in range(height * 2) for x in range(width * 2)]))
+        image_data = ConditionFrames([Linearize(checkers)], dither=False)[0]
+        assert {2 * round(127 * 0.5 ** (1 / 2.2))} == set(image_data)  # Half the light, not half the level.
+
+    def test_levels_kept(self):
+        levels = [Linearize(Image.new("L", (10, 10), level)) for level in (0, 100, 254)]
+        assert [0, 100, 254] == [frame[0] for frame in ConditionFrames(levels, dither=False)]
+
+    def test_dither(self):
+        image_data = ConditionFrames([Linearize(Image.new("L", (10, 10), 101))], dither=True)[0]
+        assert {100, 102} == set(image_data)  # Between the two levels the panel can show.
+        assert 101 == pytest.approx(sum(image_data) / len(image_data), abs=0.5)
+        assert image_data == ConditionFrames([Linearize(Image.new("L", (10, 10), 101))], dither=True)[0]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+from ledslie.interface.ingest import UnsupportedImage
+from ledslie.interface.jobs import JobQueue, Job, QueueFull
+
+
+class TestJobQueue(object):
+    def test_job_done(self):
+        queue = JobQueue(1, 2, 60)
+
+        def work(job, value):
+            job.set_progress(3)
+            return value * 2
+        job = queue.submit("MyProgram", work, 21)
+        assert job.wait(5)
+        assert Job.DONE == job.state
+        assert {'job': job.id, 'program': "MyProgram", 'state': 'done', 'frames_read': 3, 'result': 42} == job.status()
+        assert job is queue.get(job.id)
+        assert queue.get("unknown") is None
+        queue.shutdown()
+
+    def test_job_failed(self):
+        queue = JobQueue(1, 2, 60)
+
+        def bad_image(job):
+            raise UnsupportedImage("Not an image")
+
+        def broken(job):
+            raise KeyError("oops")
+        job = queue.submit("MyProgram", bad_image)
+        assert job.wait(5)
+        assert Job.FAILED == job.state
+        assert "Not an image" == job.status()['error']
+        job = queue.submit("MyProgram", broken)
+        assert job.wait(5)
+        assert "Internal error" == job.status()['error']  # Details stay in the log.
+        queue.shutdown()
+
+    def test_queue_full(self):
+        queue = JobQueue(1, 2, 60)
+        release = threading.Event()
+
+        def blocked(job):
+            release.wait(5)
+        jobs = [queue.submit("MyProgram", blocked), queue.submit("MyProgram", blocked)]
+        with pytest.raises(QueueFull):
+            queue.submit("MyProgram", blocked)
+        release.set()
+        for job in jobs:
+            assert job.wait(5)
+        queue.submit("MyProgram", blocked)  # Room again.
+        queue.shutdown()
+
+    def test_forget_finished(self):
+        queue = JobQueue(1, 2, 60)
+        queue.now = lambda: 1000
+        job = queue.submit("MyProgram", lambda job: None)
+        assert job.wait(5)
+        queue.now = lambda: 1061
+        queue.submit("MyProgram", lambda job: None).wait(5)
+        assert queue.get(job.id) is None
+        queue.shutdown()
@@ -0,0 +1,56 @@
+import pytest
+
+from ledslie.config import Config
+from ledslie.interface.limits import TokenBucket, RateLimiter, IngressLimits, LimitExceeded
+
+
+class TestLimits(object):
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=2, burst=4, now=0)
+        assert all([bucket.take(1, now=0) for n in range(4)])
+        assert not bucket.take(1, now=0)
+        assert 0.5 == bucket.wait_time(1)
+        assert bucket.take(1, now=0.5)
+        assert bucket.take(4, now=10)  # Never more than burst.
+        assert not bucket.take(1, now=10)
+        assert bucket.take(9, now=12)  # More than burst takes a full bucket.
+        assert not bucket.take(1, now=12)
+
+    def test_rate_limiter_forgets(self):
+        limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+        assert 0.0 == limiter.take("a", 1, now=0)
+        assert 1.0 == limiter.take("a", 1, now=0)
+        limiter.take("b", 1, now=0)
+        limiter.take("c", 1, now=0)
+        assert 2 == len(limiter)
+        assert 0.0 == limiter.take("a", 1, now=0)  # Forgotten, so starts with a full bucket.
+
+    def test_ingress(self):
+        config = dict(Config())
+        config.update(SITE_LIMIT_CLIENT_RATE=1, SITE_LIMIT_CLIENT_BURST=3, SITE_LIMIT_PROGRAM_RATE=1,
+                      SITE_LIMIT_PROGRAM_BURST=1, SITE_LIMIT_MAX_TEXT_LENGTH=5)
+        limits = IngressLimits(config)
+        limits.now = lambda: 100
+        limits.check("1.2.3.4", programs=["a"])
+        with pytest.raises(LimitExceeded) as exc_info:
+            limits.check("1.2.3.4", programs=["a"])
+        assert 'program' == exc_info.value.reason
+        limits.check("1.2.3.4", programs=["b"])  # The refused request took nothing from the client.
+        limits.check("1.2.3.4", programs=["c"])
+        with pytest.raises(LimitExceeded) as exc_info:
+            limits.check("1.2.3.4", programs=["d"])
+        assert 'client' == exc_info.value.reason
+        assert 1.0 == exc_info.value.retry_after
+        limits.check("5.6.7.8", programs=["d"])  # Other clients are not affected.
+        with pytest.raises(LimitExceeded) as exc_info:
+            limits.check("5.6.7.8", texts=["Too long"])
+        assert 'size' == exc_info.value.reason
+        assert {'accepted': 4, 'client': 1, 'bytes': 0, 'program': 1, 'size': 1} == limits.stats()
+
+    def test_due_stats(self):
+        limits = IngressLimits(Config())
+        limits.now = lambda: 100
+        assert limits.due_stats() is not None
+        assert limits.due_stats() is None
+        limits.now = lambda: 100 + Config()['SITE_LIMIT_STATS_INTERVAL']
+        assert limits.due_stats() is not None
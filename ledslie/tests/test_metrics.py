@@ -0,0 +1,63 @@
+import json
+
+from twisted.internet.task import Clock
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_STATS_BASE, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS
+from ledslie.messages import SerializeFrame
+from ledslie.metrics import Registry
+from ledslie.processors.scheduler import Scheduler
+from ledslie.tests.fakes import FakeMqttProtocol, FakeLEDScreen
+
+
+class TestRegistry(object):
+    def test_metrics(self):
+        registry = Registry()
+        registry.counter('received').inc()
+        registry.counter('received').inc(2)
+        registry.gauge('queue').set(4)
+        registry.gauge('size', lambda: 42)
+        histogram = registry.histogram('render', (0.01, 0.1))
+        histogram.observe(0.005)
+        histogram.observe(0.05)
+        histogram.observe(3)
+        with histogram.time():
+            pass
+        stats = json.loads(registry.serialize().decode())
+        assert 3 == stats['received']
+        assert 4 == stats['queue']
+        assert 42 == stats['size']
+        assert 4 == stats['render']['count']
+        assert 3 == stats['render']['max']
+        assert [[0.01, 2], [0.1, 1], [None, 1]] == stats['render']['buckets']
+
+    def test_failing_gauge(self):
+        registry = Registry()
+        registry.gauge('broken', lambda: 1 / 0)
+        registry.counter('ok').inc()
+        assert {'ok': 1} == registry.snapshot()
+
+
+class TestVitalStats(object):
+    def test_publish_vital_stats(self):
+        sched = Scheduler(None, None)
+        sched.reactor = Clock()
+        sched.led_screen = FakeLEDScreen()
+        sched.protocol = FakeMqttProtocol()
+        image_size = Config()['DISPLAY_SIZE']
+        sequence = json.dumps([[[SerializeFrame(b'1' * image_size), {}]], {}]).encode()
+        sched._onPublish(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + 'test', sequence, 1, False, False, 0)
+        sched.start_vital_stats()
+        interval = Config()['STATS_INTERVAL']
+        sched.reactor.advance(interval)
+        sched.reactor.advance(interval + 0.5)  # Called late.
+        published = [message for topic, message in sched.protocol._published_messages
+                     if topic == LEDSLIE_TOPIC_STATS_BASE + 'Scheduler']
+        assert 2 == len(published)
+        stats = json.loads(bytes(published[-1]).decode())
+        assert 1 == stats['messages_received']
+        assert 1 == stats['programs']
+        assert image_size * 2 <= stats['catalog_bytes']  # A still is animated to several frames.
+        assert 0 == stats['serial_backlog']
+        assert 1 == stats['reactor_lag']['count']
+        assert 0.5 == stats['reactor_lag']['max']
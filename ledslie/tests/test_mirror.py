@@ -0,0 +1,73 @@
+import base64
+import json
+import zlib
+
+from ledslie.config import Config
+from ledslie.interface.mirror import MirrorHub
+from ledslie.processors.mirror import MirrorEncoder, MirrorDecoder, MIRROR_KEYFRAME, MIRROR_DELTA
+
+
+def image(**rows):
+    width = Config()['DISPLAY_WIDTH']
+    data = bytearray(Config()['DISPLAY_SIZE'])
+    for row_nr, value in rows.items():
+        row_nr = int(row_nr[1:])
+        data[row_nr * width:(row_nr + 1) * width] = bytes([value]) * width
+    return data
+
+
+def event_rows(event):
+    assert event.startswith("event: rows\ndata: ")
+    return {int(nr): base64.b64decode(row) for nr, row in json.loads(event.split("data: ")[1]).items()}
+
+
+class TestMirrorEncoding(object):
+    def test_row_delta(self):
+        encoder = MirrorEncoder(keyframe_interval=2)
+        decoder = MirrorDecoder()
+        keyframe = encoder.encode(image(r0=1))
+        assert MIRROR_KEYFRAME == zlib.decompress(keyframe)[0]
+        assert Config()['DISPLAY_HEIGHT'] == len(decoder.decode(keyframe))
+        assert encoder.encode(image(r0=1)) is None  # Nothing changed.
+        delta = encoder.encode(image(r0=1, r5=7))
+        assert MIRROR_DELTA == zlib.decompress(delta)[0]
+        assert len(delta) < len(keyframe)
+        assert [5] == list(decoder.decode(delta).keys())
+        assert image(r0=1, r5=7) == decoder.image
+        assert MIRROR_DELTA == zlib.decompress(encoder.encode(image(r1=1)))[0]
+        assert MIRROR_KEYFRAME == zlib.decompress(encoder.encode(image(r2=1)))[0]  # After keyframe_interval deltas.
+
+    def test_wait_for_keyframe(self):
+        encoder = MirrorEncoder(keyframe_interval=1)
+        encoder.encode(image(r0=1))
+        delta = encoder.encode(image(r0=2))
+        decoder = MirrorDecoder()
+        assert decoder.decode(delta) is None
+        assert {} == decoder.rows()
+        decoder.decode(encoder.encode(image(r0=3)))
+        assert image(r0=3) == decoder.image
+
+
+class TestMirrorHub(object):
+    def test_watch(self):
+        encoder = MirrorEncoder(keyframe_interval=10)
+        hub = MirrorHub(max_watchers=2, backlog=1)
+        hub.on_mirror(encoder.encode(image(r0=1)))
+        events = hub.watch(keepalive=0.01)
+        assert image(r0=1)[:Config()['DISPLAY_WIDTH']] == event_rows(next(events))[0]
+        hub.on_mirror(encoder.encode(image(r0=1, r3=3)))
+        assert [3] == list(event_rows(next(events)).keys())
+        assert ": keep-alive\n\n" == next(events)
+        events.close()
+        assert 0 == len(hub)
+
+    def test_slow_watcher_catches_up(self):
+        encoder = MirrorEncoder(keyframe_interval=10)
+        hub = MirrorHub(max_watchers=2, backlog=1)
+        hub.on_mirror(encoder.encode(image()))
+        events = hub.watch(keepalive=0.01)
+        next(events)
+        hub.on_mirror(encoder.encode(image(r1=1)))
+        hub.on_mirror(encoder.encode(image(r2=2)))  # Doesn't fit the backlog anymore.
+        assert [1] == list(event_rows(next(events)).keys())
+        assert Config()['DISPLAY_HEIGHT'] == len(event_rows(next(events)))  # The whole display.
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+from twisted.internet.task import Clock
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_PLANNER, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, \
+    LEDSLIE_TOPIC_TYPESETTER_1LINE
+from ledslie.messages import ScheduledProgram
+from ledslie.processors.planner import Planner, PlanStore
+from ledslie.tests.fakes import FakeMqttProtocol
+
+
+def schedule(**kwargs):
+    plan_data = {'payload': '[[], {}]', 'start': 1000, 'end': 2000}
+    plan_data.update(kwargs)
+    return json.dumps(plan_data).encode()
+
+
+class TestScheduledProgram(object):
+    def test_load(self):
+        plan = ScheduledProgram().load(schedule(every=86400), 'news')
+        assert 'news' == plan.program
+        assert LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + 'news' == plan.topic
+        assert 86400 == plan.every
+
+    def test_invalid(self):
+        assert ScheduledProgram().load(b'not json', 'news') is None
+        assert ScheduledProgram().load(schedule(end=500), 'news') is None
+        assert ScheduledProgram().load(schedule(every=600), 'news') is None  # Repeats before it ends.
+        assert ScheduledProgram().load(schedule(topic='ledslie/alert/1/spacealert'), 'news') is None
+        assert ScheduledProgram().load(schedule(program='other'), 'news') is None
+        layout = json.dumps({'text': 'Hi', 'program': 'other'})
+        assert ScheduledProgram().load(schedule(topic=LEDSLIE_TOPIC_TYPESETTER_1LINE, payload=layout), 'news') is None
+
+    def test_occurrence(self):
+        plan = ScheduledProgram().load(schedule(every=3000, until=7500), 'news')
+        assert (1000, 2000) == plan.occurrence(0)
+        assert (1000, 2000) == plan.occurrence(1500)
+        assert (4000, 5000) == plan.occurrence(2000)
+        assert (7000, 8000) == plan.occurrence(6000)
+        assert plan.occurrence(8000) is None
+        once = ScheduledProgram().load(schedule(), 'news')
+        assert once.occurrence(2000) is None
+
+
+class TestPlanStore(object):
+    def test_heap(self, tmp_path):
+        store = PlanStore(str(tmp_path / 'plans.json'))
+        store.due('a', 30)
+        store.due('b', 10)
+        store.due('a', 20)  # Replaces the earlier time of a.
+        assert 10 == store.next_time()
+        assert ['b', 'a'] == store.pop_due(25)
+        assert store.next_time() is None
+
+    def test_save_load(self, tmp_path):
+        store = PlanStore(str(tmp_path / 'plans.json'))
+        store.plans['news'] = ScheduledProgram().load(schedule(every=86400), 'news')
+        store.plans['news'].active = True
+        store.save()
+        loaded = PlanStore(store.path)
+        loaded.load()
+        assert ['news'] == list(loaded.plans)
+        assert loaded.plans['news'].active
+        assert 86400 == loaded.plans['news'].every
+
+
+class TestPlanner(object):
+    @pytest.fixture
+    def planner(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(Config(), 'PLANNER_STORE', str(tmp_path / 'plans.json'))
+        clock = Clock()
+        p = Planner(None, None, reactor=clock)
+        p.protocol = FakeMqttProtocol()
+        p.onBrokerConnected()
+        return p
+
+    def send(self, planner, payload, program='news'):
+        planner.onPublish(LEDSLIE_TOPIC_PLANNER[:-1] + program, payload, qos=1, dup=False, retain=False, msgId=0)
+
+    def test_lifecycle(self, planner):
+        clock = planner.reactor
+        topic = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + 'news'
+        refresh = Config()['PLANNER_REFRESH_INTERVAL']
+        self.send(planner, schedule(start=1000, end=1000 + 2 * refresh + 100, every=86400))
+        assert [] == planner.protocol._published_messages
+        clock.advance(1000)
+        assert [(topic, b'[[], {}]')] == planner.protocol._published_messages
+        clock.advance(refresh)  # Published again before the scheduler retires it.
+        clock.advance(refresh)
+        assert 3 == len(planner.protocol._published_messages)
+        clock.advance(100)  # Time is over, it's removed.
+        assert (topic, b'') == planner.protocol._published_messages[-1]
+        clock.advance(86400 - 2 * refresh - 100)  # Shown again the next day.
+        assert (topic, b'[[], {}]') == planner.protocol._published_messages[-1]
+
+    def test_cancel(self, planner):
+        topic = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + 'news'
+        self.send(planner, schedule(start=0))
+        assert (topic, b'[[], {}]') == planner.protocol._published_messages[-1]
+        self.send(planner, b'')
+        assert (topic, b'') == planner.protocol._published_messages[-1]
+        assert {} == planner.store.plans
+        assert planner.timer is None
+
+    def test_survives_restart(self, planner):
+        self.send(planner, schedule(start=50))
+        restarted = Planner(None, None, reactor=planner.reactor)
+        restarted.protocol = FakeMqttProtocol()
+        restarted.onBrokerConnected()
+        assert ['news'] == list(restarted.store.plans)
+        planner.reactor.advance(50)
+        assert 1 == len(restarted.protocol._published_messages)
+
+    def test_invalid_reported(self, planner):
+        self.send(planner, b'{}')
+        topic, message = planner.protocol._published_messages[-1]
+        assert topic.startswith('ledslie/error')
+        assert {} == planner.store.plans
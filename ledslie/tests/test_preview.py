@@ -0,0 +1,50 @@
+import io
+
+from PIL import Image
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_3LINES, LEDSLIE_TOPIC_TYPESETTER_1LINE
+from ledslie.interface.preview import PreviewTypesetter, RenderPreview, PreviewCache, PreviewDigest
+from ledslie.messages import TextTripleLinesLayout, TextSingleLineLayout, FrameSequence, Frame
+
+
+class TestPreview(object):
+    def test_typeset_3lines(self):
+        msg = TextTripleLinesLayout()
+        msg.lines = ["One", "Two", "Three"]
+        seq = PreviewTypesetter().typeset(LEDSLIE_TOPIC_TYPESETTER_3LINES, msg.serialize())
+        assert 1 == len(seq)
+        data, mimetype = RenderPreview(seq, 2)
+        assert 'image/png' == mimetype
+        image = Image.open(io.BytesIO(data))
+        assert (Config()['DISPLAY_WIDTH'] * 2, Config()['DISPLAY_HEIGHT'] * 2) == image.size
+
+    def test_typeset_marquee(self):
+        msg = TextSingleLineLayout()
+        msg.text = "A text that is much too long to fit on the display."
+        seq = PreviewTypesetter().typeset(LEDSLIE_TOPIC_TYPESETTER_1LINE, msg.serialize())
+        data, mimetype = RenderPreview(seq, 1)
+        assert 'image/gif' == mimetype
+        assert len(seq) == Image.open(io.BytesIO(data)).n_frames
+
+    def test_render_keeps_leds_sharp(self):
+        image_data = bytearray(Config()['DISPLAY_SIZE'])
+        image_data[0] = 0xff
+        seq = FrameSequence()
+        seq.add_frame(Frame(image_data, 100))
+        image = Image.open(io.BytesIO(RenderPreview(seq, 3)[0]))
+        assert [255, 255, 255, 0] == [image.getpixel((x, 2)) for x in range(4)]
+
+    def test_digest(self):
+        assert PreviewDigest("a", "bc") == PreviewDigest("a", b"bc")
+        assert PreviewDigest("a", "bc") != PreviewDigest("ab", "c")
+
+    def test_cache(self):
+        cache = PreviewCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        assert 1 == cache.get("a")  # a is now most recently used.
+        cache.put("c", 3)
+        assert 2 == len(cache)
+        assert cache.get("b") is None
+        assert 1 == cache.get("a")
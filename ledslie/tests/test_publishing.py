@@ -0,0 +1,118 @@
+import pytest
+
+from twisted.internet.defer import Deferred
+from twisted.internet.task import Clock
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_MIRROR
+from ledslie.metrics import Registry
+from ledslie.processors.service import GenericProcessor
+from ledslie.publishing import PublishQueue, PublishDropped
+from ledslie.tests.fakes import FakeMqttProtocol
+
+
+class FakeBroker(object):
+    def __init__(self):
+        self.ready = True
+        self.sent = []  # Tuples of topic, message and the Deferred that acknowledges it.
+
+    def send(self, topic, message, qos, retain):
+        d = Deferred()
+        self.sent.append((topic, message, d))
+        return d
+
+    def ack(self, nr=0, result=None):
+        self.sent.pop(nr)[2].callback(result)
+
+
+class TestPublishQueue(object):
+    @pytest.fixture
+    def broker(self):
+        return FakeBroker()
+
+    @pytest.fixture
+    def queue(self, broker, monkeypatch):
+        monkeypatch.setitem(Config(), 'PUBLISH_WINDOW', 2)
+        monkeypatch.setitem(Config(), 'PUBLISH_QUEUE_MAX', 3)
+        monkeypatch.setitem(Config(), 'PUBLISH_COALESCE_TOPICS', ['ledslie/sequences/1/+'])
+        self.metrics = Registry()
+        return PublishQueue(broker.send, lambda: broker.ready, Clock(), self.metrics, Config())
+
+    def test_window(self, queue, broker):
+        acked = []
+        for nr in range(3):
+            queue.put('ledslie/typesetter/1/1line', b'%d' % nr, qos=1).addCallback(acked.append)
+        assert [b'0', b'1'] == [message for topic, message, d in broker.sent]
+        assert 1 == len(queue)
+        queue.reactor.advance(0.5)
+        broker.ack(0, 'first')
+        assert ['first'] == acked
+        assert [b'1', b'2'] == [message for topic, message, d in broker.sent]
+        stats = self.metrics.snapshot()
+        assert 0 == stats['publish_queue'] and 2 == stats['publish_in_flight']
+        assert 1 == stats['publish_ack_latency']['count'] and 0.5 == stats['publish_ack_latency']['max']
+
+    def test_coalesce(self, queue, broker):
+        broker.ready = False
+        acked = []
+        queue.put('ledslie/sequences/1/rain', b'old').addCallback(acked.append)
+        queue.put('ledslie/typesetter/1/1line', b'text')
+        queue.put('ledslie/sequences/1/rain', b'new').addCallback(acked.append)
+        assert 2 == len(queue)
+        broker.ready = True
+        queue.pump()
+        assert [b'text', b'new'] == [message for topic, message, d in broker.sent]  # After what came in between.
+        broker.ack(1, 'done')
+        assert ['done', 'done'] == acked
+        assert 1 == self.metrics.snapshot()['publish_coalesced']
+
+    def test_coalesce_after_chunks(self, queue, broker, monkeypatch):
+        monkeypatch.setattr(queue, 'window', 10)
+        broker.ready = False
+        queue.put('ledslie/sequences/1/rain', b'1')
+        queue.put('ledslie/chunks/1/rain', b'2, first chunk')
+        queue.put('ledslie/chunks/1/rain', b'2, last chunk')
+        queue.put('ledslie/sequences/1/rain', b'3')
+        broker.ready = True
+        queue.pump()
+        sent = [message for topic, message, d in broker.sent]
+        assert [b'2, first chunk', b'2, last chunk', b'3'] == sent  # The newest version comes last.
+
+    def test_mirror_kept(self, broker):
+        queue = PublishQueue(broker.send, lambda: broker.ready, Clock(), Registry(), Config())
+        broker.ready = False
+        queue.put(LEDSLIE_TOPIC_MIRROR, b'keyframe')
+        queue.put(LEDSLIE_TOPIC_MIRROR, b'delta')  # Needs the keyframe to make sense.
+        broker.ready = True
+        queue.pump()
+        assert [b'keyframe', b'delta'] == [message for topic, message, d in broker.sent]
+
+    def test_full(self, queue, broker):
+        broker.ready = False
+        failures = []
+        queue.put('ledslie/typesetter/1/1line', b'0').addErrback(failures.append)
+        for nr in range(1, 4):
+            queue.put('ledslie/typesetter/1/1line', b'%d' % nr)
+        assert 3 == len(queue)
+        assert failures[0].check(PublishDropped)
+        assert 1 == self.metrics.snapshot()['publish_dropped']
+
+    def test_restart(self, queue, broker):
+        for nr in range(3):
+            queue.put('ledslie/typesetter/1/1line', b'%d' % nr, qos=1)
+        lost = broker.sent[:]
+        del broker.sent[:]
+        queue.restart()  # Connected again, the ones on their way on the old connection don't count.
+        assert [b'2'] == [message for topic, message, d in broker.sent]
+        lost[0][2].callback(None)
+        assert 1 == queue.in_flight
+
+
+def test_processor_waits_for_connection():
+    processor = GenericProcessor(None, None, reactor=Clock())
+    d = processor.publish('ledslie/error/test', b"waiting")
+    assert 1 == len(processor.publish_queue)
+    processor.protocol = FakeMqttProtocol()
+    processor.publish_queue.restart()
+    assert [('ledslie/error/test', bytearray(b"waiting"))] == processor.protocol._published_messages
+    assert d.called
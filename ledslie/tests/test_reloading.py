@@ -0,0 +1,74 @@
+import pytest
+
+from twisted.internet.task import Clock
+
+from ledslie.config import Config, ConfigError, SubscribeConfig, UnsubscribeConfig
+from ledslie.definitions import LEDSLIE_TOPIC_CONFIG, LEDSLIE_ERROR
+from ledslie.processors.scheduler import Scheduler
+from ledslie.reloading import ReloadFromMessage, ReloadFromFile, RepeatingCalls
+from ledslie.tests.fakes import FakeMqttProtocol
+
+
+@pytest.fixture
+def reloaded():
+    yield
+    ReloadFromMessage(b'')
+
+
+def test_reload_from_message(reloaded):
+    assert {'DISPLAY_DEFAULT_DELAY'} == ReloadFromMessage(b'{"DISPLAY_DEFAULT_DELAY": 4321}')
+    assert 4321 == Config()['DISPLAY_DEFAULT_DELAY']
+    assert set() == ReloadFromFile()  # The settings of the message stay on top.
+    assert 4321 == Config()['DISPLAY_DEFAULT_DELAY']
+    assert {'DISPLAY_DEFAULT_DELAY'} == ReloadFromMessage(b'{}')
+    assert 4321 != Config()['DISPLAY_DEFAULT_DELAY']
+
+
+@pytest.mark.parametrize('payload', [b'not json', b'[1, 2]', b'{"NO_SUCH_SETTING": 1}', b'{"lower": 1}',
+                                     b'{"DISPLAY_DEFAULT_DELAY": "long"}', b'{"PUBLISH_WINDOW": 100}'])
+def test_reload_from_message_wrong(payload):
+    before = dict(Config())
+    with pytest.raises(ConfigError):
+        ReloadFromMessage(payload)
+    assert before == dict(Config())
+
+
+def test_repeating_calls(monkeypatch):
+    clock = Clock()
+    calls = []
+
+    def call():
+        calls.append(clock.seconds())
+    monkeypatch.setitem(Config(), 'STATS_INTERVAL', 10)
+    repeating = RepeatingCalls(clock)
+    repeating.repeat(call, lambda: Config()['STATS_INTERVAL'])
+    repeating.repeat(call, 1)  # Already repeated.
+    assert 1 == len(calls)
+    clock.advance(10)
+    assert 2 == len(calls)
+    monkeypatch.setitem(Config(), 'STATS_INTERVAL', 2)
+    repeating.reschedule()
+    clock.advance(2)
+    assert 3 == len(calls)
+    repeating.stop()
+    clock.advance(10)
+    assert 3 == len(calls)
+
+
+def test_processor_reloads(reloaded):
+    sched = Scheduler(None, None)
+    sched.reactor = Clock()
+    sched.protocol = FakeMqttProtocol()
+    sched._offline = False
+    SubscribeConfig(sched.config_changed)
+    try:
+        sched._onPublish(LEDSLIE_TOPIC_CONFIG, b'{"MIRROR_KEYFRAME_INTERVAL": 3, "SEQUENCE_CHUNK_TIMEOUT": 5}',
+                         qos=1, dup=False, retain=True, msgId=1)
+        assert 3 == sched.mirror_encoder.keyframe_interval
+        assert 5 == sched.chunks.timeout
+        sched._onPublish(LEDSLIE_TOPIC_CONFIG, b'{"SEQUENCE_CHUNK_TIMEOUT": "soon"}',
+                         qos=1, dup=False, retain=True, msgId=2)
+        assert LEDSLIE_ERROR + "/config" == sched.protocol._published_messages[-1][0]
+        assert 5 == sched.chunks.timeout
+    finally:
+        UnsubscribeConfig(sched.config_changed)
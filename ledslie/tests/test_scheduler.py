@@ -2,13 +2,17 @@ import pytest
 
 import json
 
+from twisted.internet.task import Clock
+
 import ledslie.processors.scheduler
 from ledslie.config import Config
-from ledslie.definitions import LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, ALERT_PRIO_STRING
+from ledslie.definitions import LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, ALERT_PRIO_STRING, \
+    LEDSLIE_TOPIC_MIRROR
 from ledslie.messages import FrameSequence, SerializeFrame, Frame
-from ledslie.processors.scheduler import Scheduler
+from ledslie.processors.scheduler import Scheduler, LEDScreen, FrameException
 from ledslie.tests.fakes import FakeMqttProtocol, FakeLogger, FakeLEDScreen
-from ledslie.processors.animate import AnimateStill
+from ledslie.processors.animate import AnimateStill, AnimateHorizontalScroll
+from ledslie.processors.mirror import MirrorDecoder
 
 
 class TestScheduler(object):
@@ -142,3 +146,52 @@ class TestScheduler(object):
         seq.add_frame(Frame(img_data, None))
         animated_seq = AnimateStill(seq[1])
         assert Config()['DISPLAY_DEFAULT_DELAY'] == sum([frame.duration for frame in animated_seq.frames])
+
+    def test_marquee_sequence(self, sched):
+        width, height = Config()['DISPLAY_WIDTH'], Config()['DISPLAY_HEIGHT']
+        strip_width = width + 10
+        strip = bytearray()
+        for row in range(height):
+            strip.extend(range(strip_width))
+        seq = FrameSequence()
+        AnimateHorizontalScroll(seq, strip, strip_width)
+        loaded = FrameSequence().load(seq.serialize())
+        assert len(seq) == len(loaded)
+        assert bytes(range(width)) == loaded[0].raw()[0:width]
+        assert bytes(range(10, strip_width)) == loaded[-1].raw()[-width:]
+        topic = LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "marquee"
+        sched.onPublish(topic, seq.serialize(), qos=0, dup=False, retain=False, msgId=0)
+        sched.send_next_frame()
+        assert Config()['DISPLAY_SIZE'] == len(sched.led_screen._published_frames[-1].raw())
+
+    def test_marquee_sequence_wrong(self, sched):
+        width, height = Config()['DISPLAY_WIDTH'], Config()['DISPLAY_HEIGHT']
+        payload = json.dumps([[[None, {'duration': 100, 'offset': 20}]],
+                              {'strip': {'data': SerializeFrame(bytearray(width * height)), 'width': width}}])
+        assert FrameSequence().load(payload.encode()) is None  # Offset is outside of the strip.
+
+    def test_mirror_throttled(self, sched):
+        sched.reactor = Clock()
+        frame = Frame(bytearray(Config()['DISPLAY_SIZE']), 100)
+        sched.mirror_frame(frame)
+        sched.reactor.advance(0)
+        assert [LEDSLIE_TOPIC_MIRROR] == [topic for topic, msg in sched.protocol._published_messages]
+        changed = Frame(bytearray([0xff]) * Config()['DISPLAY_SIZE'], 100)
+        for f in [changed, frame, changed]:
+            sched.mirror_frame(f)  # Faster than MIRROR_MAX_FPS, only the last is published.
+        sched.reactor.advance(0.1)
+        assert 1 == len(sched.protocol._published_messages)
+        sched.reactor.advance(1 / Config()['MIRROR_MAX_FPS'])
+        assert 2 == len(sched.protocol._published_messages)
+        decoder = MirrorDecoder()
+        for topic, payload in sched.protocol._published_messages:
+            decoder.decode(payload)
+        assert changed.raw() == decoder.image
+
+    def test_prepare_image(self):
+        image_data = bytearray(range(256)) * int(Config()['DISPLAY_SIZE'] / 256)
+        image_data.extend(bytearray(Config()['DISPLAY_SIZE'] - len(image_data)))
+        prepared = LEDScreen()._prepare_image(image_data)
+        assert bytearray([b >> 1 for b in image_data]) + bytearray([0x80]) == prepared
+        with pytest.raises(FrameException):
+            LEDScreen()._prepare_image(image_data[1:])
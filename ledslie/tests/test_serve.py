@@ -0,0 +1,40 @@
+from ledslie.config import Config
+from ledslie.interface.broker import SiteMqtt
+from ledslie.interface.serve import ServerOptions
+
+
+class FakePahoClient(object):
+    def __init__(self):
+        self.callbacks = {}
+        self.subscribed = []
+
+    def message_callback_add(self, topic, handler):
+        self.callbacks[topic] = handler
+
+    def subscribe(self, topic):
+        self.subscribed.append(topic)
+
+
+class TestServe(object):
+    def test_server_options(self):
+        options = ServerOptions(Config())
+        assert 'gthread' == options['worker_class']
+        assert Config()['SITE_THREADS'] == options['threads']
+        assert Config()['SITE_KEEPALIVE'] == options['keepalive']
+
+    def test_topics_subscribed_on_connect(self):
+        mqtt = SiteMqtt()
+
+        @mqtt.on_topic("ledslie/test")
+        def handler(client, userdata, message):
+            pass
+        client = FakePahoClient()
+        mqtt._on_connect(client, None, None, type('ReasonCode', (), {'is_failure': False})(), None)
+        assert ["ledslie/test"] == client.subscribed
+        mqtt.client = client
+
+        @mqtt.on_topic("ledslie/other")
+        def other_handler(client, userdata, message):
+            pass
+        assert other_handler == client.callbacks["ledslie/other"]
+        assert ["ledslie/test", "ledslie/other"] == client.subscribed
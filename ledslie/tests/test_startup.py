@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import ledslie
+from ledslie.config import Config
+from ledslie.startup import ParseImportTimes, ImportBreakdown, ImportTarget, SERVICES
+
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       200 |        200 | site
+import time:      1000 |       1000 | ledslie
+import time:       300 |        300 |     twisted.python
+import time:      4000 |       4300 |   twisted.internet.reactor
+import time:      2000 |       2000 |   ledslie.config
+import time:       500 |       6800 | ledslie.processors.scheduler
+"""
+
+
+def test_breakdown():
+    imports = ParseImportTimes(IMPORTTIME)
+    assert ('twisted.python', 2, 0.0003, 0.0003) == imports[2]
+    seconds, children = ImportBreakdown(imports, 'ledslie.processors.scheduler')
+    assert 0.0068 == seconds
+    assert [('twisted.internet.reactor', 0.0043), ('ledslie.config', 0.002)] == children
+    with pytest.raises(KeyError):
+        ImportBreakdown(imports, 'ledslie.processors.typesetter')
+
+
+def test_target(monkeypatch):
+    monkeypatch.setitem(Config(), 'STARTUP_IMPORT_TARGETS', {'typesetter': 0.8})
+    assert 0.8 == ImportTarget('typesetter')
+    assert Config()['STARTUP_IMPORT_TARGET'] == ImportTarget('scheduler')
+
+
+def test_heavy_imports_wait(tmpdir):
+    """
+    Importing the services doesn't load what they only need later, and doesn't change the working directory.
+    """
+    script = ("import os, sys\n"
+              "import %s\n"
+              "print(os.getcwd())\n"
+              "print(' '.join(sorted(set(sys.modules) & {'flask', 'treq', 'bs4', 'jsonpath_rw', 'pytz', 'astral'})))\n"
+              % ", ".join(sorted(SERVICES.values())))
+    root = os.path.dirname(os.path.dirname(ledslie.__file__))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + sys.path))
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=str(tmpdir), env=env,
+                                     universal_newlines=True)
+    cwd, loaded = output.split('\n')[:2]
+    assert os.path.realpath(str(tmpdir)) == os.path.realpath(cwd)
+    assert '' == loaded
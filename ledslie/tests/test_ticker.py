@@ -0,0 +1,108 @@
+import json
+
+import pytest
+from twisted.logger import Logger
+
+import ledslie.processors.scheduler
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_TICKER_PROGRAMS, LEDSLIE_ERROR
+from ledslie.messages import TickerLayout
+from ledslie.processors.scheduler import Scheduler
+from ledslie.processors.ticker import Ticker
+from ledslie.tests.fakes import FakeMqttProtocol, FakeLEDScreen
+
+
+def ticker_layout(items, replace=True, **kwargs):
+    layout = dict(items=items, replace=replace, **kwargs)
+    return json.dumps(layout).encode()
+
+
+class TestTicker(object):
+    @pytest.fixture
+    def ticker(self):
+        return Ticker().update(TickerLayout().load(ticker_layout(["Foo", "Bar"])))
+
+    def test_frames(self, ticker):
+        frames = list(ticker)
+        assert len(ticker) == len(frames)
+        for frame in frames:
+            assert Config()['DISPLAY_SIZE'] == len(frame.raw())
+        assert frames[0].raw() != frames[-1].raw()
+        assert ticker.duration >= sum([f.duration for f in frames])
+
+    def test_continues(self, ticker):
+        """I test that the ticker continues where it stopped the previous time it was shown."""
+        frames = list(ticker)
+        assert frames[-1].raw() == ticker.last().raw()
+        first = ticker.first()
+        assert first.raw() != ticker.last().raw()
+        assert first.raw() == ticker.first().raw()  # Asking again doesn't move the ticker.
+        frames = list(ticker)
+        assert first.raw() == frames[0].raw()
+        assert frames[-1].raw() == ticker.last().raw()
+
+    def test_constant_memory(self, ticker):
+        ticker.update(TickerLayout().load(ticker_layout(["Long item " * 1000])))
+        frames = iter(ticker)
+        next(frames)
+        assert len(ticker._window) == Config()['DISPLAY_SIZE']
+
+    def test_update_append(self, ticker):
+        ticker.update(TickerLayout().load(ticker_layout(["Quux"], replace=False)))
+        assert ["Foo", "Bar", "Quux"] == ticker.items
+        ticker.update(TickerLayout().load(ticker_layout(["Only"])))
+        assert ["Only"] == ticker.items
+
+    def test_max_items(self, ticker):
+        items = [str(i) for i in range(Config()['TICKER_MAX_ITEMS'] + 5)]
+        ticker.update(TickerLayout().load(ticker_layout(items, replace=False)))
+        assert Config()['TICKER_MAX_ITEMS'] == len(ticker.items)
+        assert items[-1] == ticker.items[-1]
+
+    def test_empty(self):
+        ticker = Ticker()
+        frame = next(iter(ticker))
+        assert bytearray(Config()['DISPLAY_SIZE']) == frame.raw()
+
+
+class TestSchedulerTicker(object):
+    @pytest.fixture
+    def sched(self):
+        s = Scheduler(None, None)
+        s.led_screen = FakeLEDScreen()
+        s.protocol = FakeMqttProtocol()
+        return s
+
+    def test_ticker_program(self, sched):
+        topic = LEDSLIE_TOPIC_TICKER_PROGRAMS[:-1] + "news"
+        sched.onPublish(topic, ticker_layout(["Foo"]), qos=1, dup=False, retain=False, msgId=0)
+        ticker = sched.catalog.get_program("news")
+        assert isinstance(ticker, Ticker)
+        sched.send_next_frame()
+        assert 1 == len(sched.led_screen._published_frames)
+        sched.onPublish(topic, ticker_layout(["Bar"], replace=False), qos=1, dup=False, retain=False, msgId=0)
+        assert ticker is sched.catalog.get_program("news")  # The running ticker got updated.
+        assert ["Foo", "Bar"] == ticker.items
+        sched.onPublish(topic, b"", qos=1, dup=False, retain=False, msgId=0)
+        assert "news" not in sched.catalog
+
+    def test_ticker_wrong(self, sched, monkeypatch):
+        monkeypatch.setattr(ledslie.processors.scheduler, 'log', Logger())  # Other tests raise on errors.
+        sched._offline = False
+        topic = LEDSLIE_TOPIC_TICKER_PROGRAMS[:-1] + "news"
+        sched.onPublish(topic, ticker_layout(["Foo"], size="nosuchfont"), qos=1, dup=False, retain=False, msgId=0)
+        sched.onPublish(topic, ticker_layout(["Foo"], duration=1), qos=1, dup=False, retain=False, msgId=0)
+        assert "news" not in sched.catalog
+        errors = [message for message_topic, message in sched.protocol._published_messages
+                  if message_topic == LEDSLIE_ERROR + "/scheduler"]
+        assert 2 == len(errors)
+        assert b"nosuchfont" in errors[0]
+
+    def test_ticker_one_frame(self, sched):
+        topic = LEDSLIE_TOPIC_TICKER_PROGRAMS[:-1] + "news"
+        duration = Ticker().frame_delay * 1.5
+        sched.onPublish(topic, ticker_layout(["Foo"], duration=duration), qos=1, dup=False, retain=False, msgId=0)
+        ticker = sched.catalog.get_program("news")
+        assert isinstance(ticker, Ticker) and 1 == len(ticker)
+        sched.send_next_frame()
+        assert 1 == len(sched.led_screen._published_frames)
@@ -0,0 +1,83 @@
+import json
+
+from twisted.internet.task import Clock
+
+from ledslie.config import Config
+from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_1LINE, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS
+from ledslie.messages import FrameSequence, Frame, TextSingleLineLayout
+from ledslie.tracing import StartTrace, Stamp, CheckTrace, StageLatencies, STAGE_SITE, STAGE_TYPESETTER, \
+    STAGE_RENDERED
+from ledslie.processors.scheduler import Scheduler
+from ledslie.processors.typesetter import Typesetter
+from ledslie.tests.fakes import FakeMqttProtocol, FakeLEDScreen
+
+
+def test_stage_latencies():
+    trace = Stamp(Stamp(StartTrace(STAGE_SITE, 10.0), STAGE_TYPESETTER, 10.5), STAGE_RENDERED, 10.75)
+    assert [('site_typesetter', 0.5), ('typesetter_rendered', 0.25), ('total', 0.75)] == StageLatencies(trace)
+    assert [] == StageLatencies(StartTrace(STAGE_SITE, 10.0))
+
+
+def test_sampling(monkeypatch):
+    monkeypatch.setitem(Config(), 'TRACE_SAMPLE_RATE', 0)
+    assert StartTrace(STAGE_SITE) is None
+    assert Stamp(None, STAGE_TYPESETTER) is None
+
+
+def test_check_trace():
+    trace = StartTrace(STAGE_SITE)
+    assert trace is CheckTrace(trace)
+    assert CheckTrace(None) is None
+    assert CheckTrace("trace") is None
+    assert CheckTrace({'id': 'a', 'stamps': [['site', 'yesterday']]}) is None
+    assert CheckTrace({'id': 'a', 'stamps': [['site', 1.0]] * 21}) is None
+    assert CheckTrace({'id': 'a', 'stamps': [['site', 1.0], ['made_up', 2.0]]}) is None
+    assert CheckTrace({'id': 'a', 'stamps': [[['site'], 1.0]]}) is None
+
+
+def test_trace_travels_in_messages():
+    trace = StartTrace(STAGE_SITE, 10.0)
+    layout = TextSingleLineLayout().load(json.dumps({'text': "Hi", 'trace': trace}).encode())
+    assert trace == layout.trace
+    seq = FrameSequence()
+    seq.add_frame(Frame(bytearray(Config()['DISPLAY_SIZE']), 100))
+    assert 'trace' not in json.loads(seq.serialize().decode())[1]
+    seq.trace = Stamp(layout.trace, STAGE_TYPESETTER, 11.0)
+    assert seq.trace == FrameSequence().load(seq.serialize()).trace
+
+
+def test_pipeline_latencies():
+    typesetter = Typesetter(None, None)
+    typesetter.protocol = FakeMqttProtocol()
+    payload = json.dumps({'text': "Hi", 'program': 'traced', 'trace': StartTrace(STAGE_SITE)})
+    typesetter.onPublish(LEDSLIE_TOPIC_TYPESETTER_1LINE, payload.encode(), qos=0, dup=False, retain=False, msgId=0)
+    topic, sequence = typesetter.protocol._published_messages[-1]
+    stamps = FrameSequence().load(sequence).trace['stamps']
+    assert [STAGE_SITE, STAGE_TYPESETTER, STAGE_RENDERED] == [stage for stage, when in stamps]
+
+    sched = Scheduler(None, None)
+    sched.reactor = Clock()
+    sched.led_screen = FakeLEDScreen()
+    sched.protocol = FakeMqttProtocol()
+    sched.onPublish(topic, sequence, qos=0, dup=False, retain=False, msgId=0)
+    sched.send_next_frame()
+    sched.send_next_frame()
+    stats = sched.metrics.snapshot()
+    for name in ['site_typesetter', 'typesetter_rendered', 'rendered_scheduler', 'scheduler_serial', 'total']:
+        assert 1 == stats['latency_' + name]['count']
+
+
+def test_made_up_stages():
+    sched = Scheduler(None, None)
+    sched.reactor = Clock()
+    sched.led_screen = FakeLEDScreen()
+    sched.protocol = FakeMqttProtocol()
+    seq = FrameSequence()
+    seq.add_frame(Frame(bytearray(Config()['DISPLAY_SIZE']), 100))
+    sequence = json.loads(seq.serialize().decode())
+    sequence[1]['trace'] = {'id': 'a', 'stamps': [['made', 1.0], ['up', 2.0]]}
+    sched.onPublish(LEDSLIE_TOPIC_SEQUENCES_PROGRAMS[:-1] + "made", json.dumps(sequence).encode(), qos=0, dup=False,
+                    retain=False, msgId=0)
+    sched.send_next_frame()
+    sched.send_next_frame()
+    assert [] == [name for name in sched.metrics.snapshot() if name.startswith('latency_')]
@@ -5,8 +5,8 @@ from pytest import fail
 
 import ledslie.processors.typesetter
 from ledslie.definitions import LEDSLIE_TOPIC_TYPESETTER_SIMPLE_TEXT, LEDSLIE_TOPIC_TYPESETTER_1LINE, \
-    LEDSLIE_TOPIC_TYPESETTER_3LINES, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED
-from ledslie.messages import TextSingleLineLayout, TextTripleLinesLayout, FrameSequence
+    LEDSLIE_TOPIC_TYPESETTER_3LINES, LEDSLIE_TOPIC_SEQUENCES_PROGRAMS, LEDSLIE_TOPIC_SEQUENCES_UNNAMED, LEDSLIE_TOPIC_ALERT
+from ledslie.messages import TextSingleLineLayout, TextTripleLinesLayout, FrameSequence, TextAlertLayout
 from ledslie.processors.service import Config
 from ledslie.processors.typesetter import Typesetter
 from ledslie.tests.fakes import FakeMqttProtocol, FakeLogger
@@ -162,3 +162,74 @@ class TestTypesetter(object):
             fail("Should not get here.")
         except KeyError:
             pass
+
+    def test_typeset_1line_marquee(self, tsetter):
+        """
+        I test that a text too long for the display becomes a marquee of views on a single strip.
+        """
+        topic = LEDSLIE_TOPIC_TYPESETTER_1LINE
+        msg = TextSingleLineLayout()
+        msg.text = 'This text is far too long to fit on the display in one go.'
+        msg.program = 'marquee'
+        tsetter.onPublish(topic, msg.serialize(), qos=0, dup=False, retain=False, msgId=0)
+        seq_topic, seq_data = tsetter.protocol._published_messages[-1]
+        seq = FrameSequence().load(seq_data)
+        assert len(seq) > 2
+        assert seq.strip_width > Config()['DISPLAY_WIDTH']
+        assert len(seq.strip) == seq.strip_width * Config()['DISPLAY_HEIGHT']
+        assert seq[0].raw() != seq[-1].raw()
+        for f in seq.frames:
+            assert len(f.raw()) == Config()['DISPLAY_SIZE']
+        assert seq[0].duration == Config()['TYPESETTER_MARQUEE_HOLD']
+
+    def test_typeset_1line_no_marquee(self, tsetter):
+        msg = TextSingleLineLayout()
+        msg.text = 'This text is far too long to fit on the display in one go.'
+        msg.marquee = False
+        seq = FrameSequence()
+        image = tsetter.typeset_single_line(seq, msg, 20)
+        assert seq.is_empty()
+        assert len(image) == Config()['DISPLAY_SIZE']
+
+    def test_typeset_simple_text_long(self, tsetter):
+        topic = LEDSLIE_TOPIC_TYPESETTER_SIMPLE_TEXT
+        payload = b"Hello world! This is a long message that used to be cut off at thirty bytes."
+        tsetter.onPublish(topic, payload, qos=0, dup=False, retain=False, msgId=0)
+        seq_topic, seq_data = tsetter.protocol._published_messages[-1]
+        seq = FrameSequence().load(seq_data)
+        assert len(seq) > 1
+        assert seq.strip is not None
+
+    def test_typeset_3lines_wrap(self, tsetter):
+        seq = FrameSequence()
+        msg = TextTripleLinesLayout()
+        msg.lines = ["Short", "A paragraph too long for one line."]
+        msg.wrap = True
+        tsetter.typeset_3lines(seq, msg)
+        assert 1 == len(seq)
+        msg.wrap = False
+        no_wrap_seq = FrameSequence()
+        tsetter.typeset_3lines(no_wrap_seq, msg)
+        assert seq[0].raw() != no_wrap_seq[0].raw()
+
+    def test_typeset_3lines_long_text(self, tsetter):
+        """I test that long texts scroll through all the lines."""
+        seq = FrameSequence()
+        msg = TextTripleLinesLayout()
+        msg.lines = ["Line %d" % nr for nr in range(100)]
+        tsetter.typeset_3lines(seq, msg)
+        assert (100 - 3) * 8 + 1 == len(seq)
+        for f in seq.frames:
+            assert len(f) == Config()['DISPLAY_SIZE']
+        assert 100 * 8 * Config()['DISPLAY_WIDTH'] == len(seq.strip)  # The frames are views on the lines.
+        loaded = FrameSequence().load(seq.serialize())
+        assert len(seq.serialize()) < 2 * len(seq.strip) + 100 * len(seq)
+        assert [f.raw() for f in seq.frames[::97]] == [f.raw() for f in loaded.frames[::97]]
+        assert seq[-1].raw() == loaded[-1].raw()
+
+    def test_typeset_alert_wrap(self, tsetter):
+        msg = TextAlertLayout()
+        msg.who = "me"
+        msg.text = "Something is going on in the space, come and have a look right now!"
+        seq = tsetter.typeset_alert(LEDSLIE_TOPIC_ALERT + "spacealert", msg)
+        assert len(seq) > 5  # The text doesn't fit and scrolls.
@@ -48,6 +48,17 @@ class TestCircularBuffer(object):
             pytest.fail("Should have raised ValueError")
         except ValueError: pass
 
+    def test_remove_forgets_id(self):
+        cb = CircularBuffer()
+        one_id = cb.add('One')
+        two_id = cb.add('Two')
+        cb.remove('One')
+        assert one_id not in cb
+        assert two_id in cb
+        cb.remove_by_id(two_id)
+        assert two_id not in cb
+        assert 0 == len(cb)
+
     def test_update(self):
         cb = CircularBuffer(['One'])
         assert 1 == len(cb)
@@ -0,0 +1,87 @@
+#     Ledslie, a community information display
+#     Copyright (C) 2018  Chotee@openended.eu
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU Affero General Public License as published
+#     by the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU Affero General Public License for more details.
+#
+#     You should have received a copy of the GNU Affero General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# ===========
+#
+# I follow a program from where it's made to the serial port of the display. A trace is a dict with an id and a list of
+# stamps, each the name of a stage and the time the program passed it. It travels in the "trace" field of layouts and
+# sequences, and every stage adds its stamp. The scheduler adds the last stamp when the first frame of the program is
+# written to the serial port, and counts the time between the stages in its metrics.
+#
+# The stamps are taken from the clock of each service, so they only add up when the services run on the same host.
+
+import random
+import time
+import uuid
+
+from ledslie.config import Config
+
+STAGE_SITE = 'site'
+STAGE_CONTENT = 'content'
+STAGE_TYPESETTER = 'typesetter'
+STAGE_RENDERED = 'rendered'
+STAGE_SCHEDULER = 'scheduler'
+STAGE_SERIAL = 'serial'
+STAGES = (STAGE_SITE, STAGE_CONTENT, STAGE_TYPESETTER, STAGE_RENDERED, STAGE_SCHEDULER, STAGE_SERIAL)
+
+
+def StartTrace(stage: str, when: float=None) -> dict:
+    """
+    I return a new trace with the first stamp for stage, when TRACE_SAMPLE_RATE says this one is traced. None otherwise.
+    """
+    if random.random() >= Config()['TRACE_SAMPLE_RATE']:
+        return None
+    return {'id': uuid.uuid4().hex[:16], 'stamps': [[stage, time.time() if when is None else when]]}
+
+
+def Stamp(trace, stage: str, when: float=None):
+    """
+    I add a stamp for stage to trace, and return it. Nothing happens when there is no trace.
+    """
+    if trace is not None:
+        trace['stamps'].append([stage, time.time() if when is None else when])
+    return trace
+
+
+def CheckTrace(trace):
+    """
+    I return trace when it looks like a trace, None otherwise. Only the STAGES are accepted, as the latency metrics are
+    named after them.
+    """
+    if not isinstance(trace, dict) or not isinstance(trace.get('id'), str):
+        return None
+    stamps = trace.get('stamps')
+    if not isinstance(stamps, list) or len(stamps) > 20:
+        return None
+    for stamp in stamps:
+        if not (isinstance(stamp, list) and len(stamp) == 2 and stamp[0] in STAGES
+                and isinstance(stamp[1], (int, float))):
+            return None
+    return trace
+
+
+def StageLatencies(trace: dict) -> list:
+    """
+    I return the seconds between the stages of trace, as tuples of a name like 'site_typesetter' and the seconds. The
+    last is the time from the first to the last stamp, named 'total'.
+    """
+    stamps = trace['stamps']
+    latencies = []
+    for (stage, when), (next_stage, next_when) in zip(stamps, stamps[1:]):
+        latencies.append(("%s_%s" % (stage, next_stage), max(0, next_when - when)))
+    if len(stamps) > 1:
+        latencies.append(('total', max(0, stamps[-1][1] - stamps[0][1])))
+    return latencies